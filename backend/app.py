@@ -1,70 +1,631 @@
+import hmac
 import json  
-from fastapi import FastAPI, HTTPException
-from pydantic import BaseModel
-from typing import Dict
-from database import init_pool, create_tables, get_conn, release_conn  
-from rules import hybrid_predict  
+import math
+import threading
+import time
+from anyio import from_thread
+from fastapi import FastAPI, Header, HTTPException, Query
+from fastapi.responses import JSONResponse, PlainTextResponse
+from pydantic import BaseModel, ValidationError
+from typing import Any, Dict, List, Optional
+from database import pool_stats, QUERY_FIELDS
+from rules import hybrid_predict, hybrid_predict_batch, enrich_features, enrich_features_batch
+from rules import cascade_stats, fired_to_mask, reload_rules, watch_rules
+import rules
+from batcher import MicroBatcher
+from result_cache import ResultCache, request_hash
+from write_behind import WriteBehindWriter
+from shadow import ShadowScorer
+from storage import open_storage
+from feature_codec import FeatureLayout
+from http_metrics import RequestMetricsMiddleware, timed_handler
+from metrics import REGISTRY, stage_timer
+import model_loader
+import config
 
 app = FastAPI(title="Hybrid Fraud Detection Backend")
+app.add_middleware(RequestMetricsMiddleware,
+                   stage_routes={"/transactions": "single", "/transactions/batch": "batch"})
+
+batcher = MicroBatcher(
+    lambda X: model_loader.scorer.predict(X),
+    max_batch_size=config.MICROBATCH_MAX_SIZE,
+    max_wait_ms=config.MICROBATCH_MAX_WAIT_MS
+)
+
+result_cache = ResultCache(
+    max_entries=config.RESULT_CACHE_MAX_ENTRIES,
+    ttl_seconds=config.RESULT_CACHE_TTL_SECONDS,
+    max_bytes=int(config.RESULT_CACHE_MAX_MB * 1024 * 1024)
+)
+
+storage = open_storage(config.STORAGE_BACKEND, config.SQLITE_PATH, config.MEMORY_STORE_MAX_ROWS)
+
+writer = WriteBehindWriter(
+    storage.bulk_insert,
+    spool_dir=config.WRITE_BEHIND_SPOOL_DIR,
+    max_queue=config.WRITE_BEHIND_QUEUE_SIZE,
+    batch_size=config.WRITE_BEHIND_BATCH_SIZE,
+    flush_interval_ms=config.WRITE_BEHIND_FLUSH_MS,
+    retry_interval_s=config.WRITE_BEHIND_RETRY_SECONDS
+) if config.WRITE_BEHIND_ENABLED else None
+
+shadow = ShadowScorer(
+    storage.insert_shadow,
+    max_queue=config.SHADOW_QUEUE_SIZE,
+    workers=config.SHADOW_WORKERS,
+    batch_size=config.SHADOW_BATCH_SIZE,
+    sample_rate=config.SHADOW_SAMPLE_RATE
+) if config.SHADOW_MODELS else None
+
+VALIDATE_STAGE = stage_timer("validate", "batch")
+PERSIST_STAGE = {"single": stage_timer("persist", "single"), "batch": stage_timer("persist", "batch")}
+
+def _persist(row):
+    """Store one decision row; returns its id, or None when queued for write-behind."""
+    t0 = time.perf_counter()
+    try:
+        if writer is not None:
+            writer.submit(row)
+            return None
+        return storage.insert_decision(row)
+    finally:
+        PERSIST_STAGE["single"].observe(time.perf_counter() - t0)
+
+def _persist_many(rows):
+    t0 = time.perf_counter()
+    try:
+        if writer is not None:
+            for row in rows:
+                writer.submit(row)
+            return [None] * len(rows)
+        return storage.insert_many(rows)
+    finally:
+        PERSIST_STAGE["batch"].observe(time.perf_counter() - t0)
+
+def _register_metrics():
+    """Expose the components' own counters and histograms on /metrics."""
+    import database
+    from rules import tier_counts, TIER_FALLBACK
+
+    for tier, counter in tier_counts.items():
+        REGISTRY.register_counter("fraud_decisions_total", "Decisions per cascade tier",
+                                  lambda c=counter: c.value, tier=tier)
+    REGISTRY.register_counter("fraud_model_fallbacks_total",
+                              "Requests scored with ml_probability 0.0 because the model call failed",
+                              lambda: tier_counts[TIER_FALLBACK].value)
+
+    for name in ("hits", "misses", "evictions", "expirations"):
+        REGISTRY.register_counter(f"result_cache_{name}_total", f"Result cache {name}",
+                                  lambda c=getattr(result_cache, name): c.value)
+    REGISTRY.gauge("result_cache_entries", "Entries in the result cache", lambda: len(result_cache))
+
+    def pool_value(attr):
+        def read():
+            pool = database.pool
+            if pool is None:
+                return None
+            value = getattr(pool, attr)
+            return value.value if hasattr(value, "value") else value
+        return read
+
+    def pool_leaked():
+        # Checked at scrape time too, so a leak shows up without checkouts or /db/pool/stats
+        pool = database.pool
+        if pool is None:
+            return None
+        pool.check_leaks()
+        return pool.leaked.value
+
+    for attr in ("checkouts", "timeouts", "discarded"):
+        REGISTRY.register_counter(f"db_pool_{attr}_total", f"Connection pool {attr}", pool_value(attr))
+    REGISTRY.register_counter("db_pool_leaked_total", "Connection pool leaked", pool_leaked)
+    REGISTRY.gauge("db_pool_size", "Open connections", pool_value("size"))
+    REGISTRY.gauge("db_pool_max_size", "Connection limit", pool_value("maxconn"))
+    REGISTRY.gauge("db_pool_in_use", "Connections checked out", pool_value("in_use"))
+    REGISTRY.register_histogram("db_pool_wait_seconds", "Time to check out a connection",
+                                lambda: database.pool and database.pool.wait_ms, scale=0.001)
+
+    if config.MICROBATCH_ENABLED:
+        REGISTRY.register_histogram("microbatch_size", "Rows per micro-batch", batcher.batch_sizes)
+        REGISTRY.register_histogram("microbatch_queue_wait_seconds", "Queue wait before scoring",
+                                    batcher.queue_wait_ms, scale=0.001)
+    if writer is not None:
+        REGISTRY.register_histogram("write_behind_flush_seconds", "Write-behind flush latency",
+                                    writer.flush_ms, scale=0.001)
+        for name in ("rows_written", "rows_spooled", "rows_replayed", "queue_overflows"):
+            REGISTRY.register_counter(f"write_behind_{name}_total", f"Write-behind {name}",
+                                      lambda c=getattr(writer, name): c.value)
+        REGISTRY.gauge("write_behind_queue_depth", "Rows waiting to be flushed", lambda: writer.queue_depth)
+    if shadow is not None:
+        REGISTRY.register_counter("shadow_submitted_total", "Request copies queued for challengers",
+                                  lambda: shadow.submitted.value)
+        REGISTRY.register_counter("shadow_dropped_total", "Request copies dropped (queue full)",
+                                  lambda: shadow.dropped.value)
+        REGISTRY.gauge("shadow_queue_depth", "Request copies waiting for challengers", lambda: shadow.queue_depth)
+
+_register_metrics()
+
+def _batched_predict(scorer):
+    # Called from the sync route's worker thread; waits on the event loop's batcher
+    return lambda X: from_thread.run(batcher.submit, X, scorer.predict)
 
 class TxIn(BaseModel):
     user_id: int
     tx_id: str
     time_step: int
-    features: Dict[str, float]
+    # May be omitted (or partial) for tx_ids in the feature store (FEATURE_STORE_PATH)
+    features: Dict[str, float] = {}
+    # tx_ids this transaction spends from (graph edges parent -> tx_id, GRAPH_PATH)
+    parents: Optional[List[str]] = None
+
+class TxBatchIn(BaseModel):
+    # Items are validated one by one so a bad item cannot reject the whole batch
+    transactions: List[Any]
+
+def _ml_value(ml_prob):
+    # None when the cascade decided without the full model (stored as NULL)
+    if ml_prob is None or math.isnan(ml_prob):
+        return None
+    return float(ml_prob)
+
+def _require_ready():
+    # Only blocks in FAST_START mode while the model is still loading
+    if not model_loader.ready.wait(config.READY_WAIT_SECONDS):
+        raise HTTPException(status_code=503, detail="Model is still loading",
+                            headers={"Retry-After": "5"})
+
+def _check_features(tx):
+    if not tx.features and (rules.feature_store is None or tx.tx_id not in rules.feature_store):
+        raise ValueError("features are required unless tx_id is in the feature store")
+
+def _cache_key(tx):
+    return (tx.tx_id, request_hash(tx.user_id, tx.time_step, tx.features, tx.parents))
+
+_layout = (None, None)     # (scorer, FeatureLayout) for COMPACT_STORAGE
+
+def _feature_layout():
+    global _layout
+    scorer = model_loader.scorer
+    if _layout[0] is not scorer:
+        _layout = (scorer, FeatureLayout.from_scorer(scorer) if scorer.n_features else None)
+    return _layout[1]
+
+def _decision_row(tx, req_hash, ml_prob, rule_score, fired, fraud, decided_by):
+    """Build the INSERT parameters for one scored transaction."""
+    status = "REJECTED" if fraud else "APPROVED"
+    layout = _feature_layout() if config.COMPACT_STORAGE else None
+    if layout is not None:
+        packed, features = layout.encode(tx.features)
+        fired_json, version = None, layout.version
+    else:
+        packed, features = None, json.dumps(tx.features)
+        fired_json, version = json.dumps(fired), None
+    return (
+        tx.user_id, 
+        tx.tx_id, 
+        tx.time_step,
+        features,
+        _ml_value(ml_prob),
+        float(rule_score),
+        float(rule_score),        # Assuming total score is current score
+        fired_json,
+        bool(fraud),
+        status,
+        decided_by,
+        req_hash,
+        packed,
+        version,
+        fired_to_mask(fired)
+    )
 
 @app.on_event("startup")
 def startup():
-    """Initialize DB pool and ensure tables exist on startup"""
-    init_pool()
-    create_tables()
+    """Open the storage backend (DB pool and tables for Postgres) on startup"""
+    if config.FAST_START and not model_loader.ready.is_set():
+        threading.Thread(target=model_loader.initialize, name="model-init", daemon=True).start()
+    storage.start()
+    if writer is not None:
+        writer.start()
+    if shadow is not None:
+        threading.Thread(target=shadow.start, args=(config.SHADOW_MODELS,),
+                         name="shadow-init", daemon=True).start()
+    if rules.tx_graph is not None:
+        rules.tx_graph.start()
+    if rules.user_state is not None and config.USER_STATE_SNAPSHOT:
+        restored = rules.user_state.load(config.USER_STATE_SNAPSHOT)
+        if restored:
+            print(f"User state: restored {restored} users from {config.USER_STATE_SNAPSHOT}")
+    if config.RULES_WATCH_SECONDS > 0:
+        threading.Thread(target=watch_rules, args=(config.RULES_WATCH_SECONDS,),
+                         name="rules-watch", daemon=True).start()
+
+@app.on_event("startup")
+async def start_batcher():
+    if config.MICROBATCH_ENABLED:
+        await batcher.start()
+
+@app.on_event("shutdown")
+async def stop_batcher():
+    await batcher.stop()
+
+@app.on_event("shutdown")
+def stop_writer():
+    if shadow is not None:
+        shadow.stop()
+    if writer is not None:
+        writer.stop()
+    storage.close()
+
+@app.on_event("shutdown")
+def save_user_state():
+    if rules.user_state is not None and config.USER_STATE_SNAPSHOT:
+        saved = rules.user_state.save(config.USER_STATE_SNAPSHOT)
+        print(f"User state: saved {saved} users to {config.USER_STATE_SNAPSHOT}")
+
+@app.on_event("shutdown")
+def save_graph():
+    if rules.tx_graph is not None:
+        rules.tx_graph.stop()
+        if config.GRAPH_SNAPSHOT:
+            saved = rules.tx_graph.save(config.GRAPH_SNAPSHOT)
+            print(f"Graph: saved {saved} nodes to {config.GRAPH_SNAPSHOT}")
 
 @app.post("/transactions")
+@timed_handler
 def process_transaction(tx: TxIn):
+    try:
+        _check_features(tx)
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+
+    # Retries of an already-scored request are answered from the cache
+    key = _cache_key(tx)
+    cached = result_cache.get(key)
+    if cached is not None:
+        return {**cached, "cached": True}
+
+    _require_ready()
     try:
         # 1. Run the Hybrid Model (XGBoost + Rules)
-        # Returns: ml_prob (float), rule_score (float), fired (dict), fraud (bool)
-        ml_prob, rule_score, fired, fraud = hybrid_predict(tx.features, tx.time_step)
+        # Returns: ml_prob (float or None), rule_score (float), fired (dict),
+        # fraud (bool), decided_by (cascade tier). The model is read once so a
+        # concurrent swap cannot change it halfway through the request.
+        scorer = model_loader.scorer
+        predict = _batched_predict(scorer) if batcher.running else None
+        # Enriched once, so shadow challengers see exactly what the champion scored
+        features = enrich_features(tx.features, tx.time_step, tx.user_id, tx.tx_id, tx.parents)
+        ml_prob, rule_score, fired, fraud, decided_by = hybrid_predict(
+            features, tx.time_step, predict, scorer
+        )
         
         status = "REJECTED" if fraud else "APPROVED"
 
-        # 2. Persist to PostgreSQL
-        conn = get_conn()
-        cur = conn.cursor()
-        
-        cur.execute("""
-            INSERT INTO transactions
-            (user_id, tx_id, time_step, features, ml_probability, rule_score, 
-            total_rule_score, fired_rules, final_decision, status)
-            VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
-            RETURNING id;
-        """, (
-            tx.user_id, 
-            tx.tx_id, 
-            tx.time_step,
-            json.dumps(tx.features),  
-            float(ml_prob),           
-            float(rule_score),
-            float(rule_score),        # Assuming total score is current score
-            json.dumps(fired),
-            bool(fraud),
-            status
-        ))
-
-        new_id = cur.fetchone()[0]
-        conn.commit()
-        cur.close()
-        release_conn(conn)
-
-        return {
+        # 2. Persist to PostgreSQL (a repeat of a stored request returns the stored id;
+        # in write-behind mode the row is queued and id is None)
+        new_id = _persist(
+            _decision_row(tx, key[1], ml_prob, rule_score, fired, fraud, decided_by)
+        )
+        if shadow is not None:
+            shadow.submit([(tx.tx_id, key[1], features, tx.time_step, fired_to_mask(fired),
+                            rule_score, ml_prob, fraud)])
+
+        response = {
             "id": new_id,
             "fraud": fraud,
             "status": status,
-            "ml_probability": ml_prob,
-            "rule_score": rule_score,
-            "fired_rules": fired
+            "ml_probability": _ml_value(ml_prob),
+            "rule_score": float(rule_score),    # as stored and as /transactions/batch returns it
+            "fired_rules": fired,
+            "decided_by": decided_by,
+            "model_version": scorer.version
         }
+        result_cache.put(key, response)
+        return {**response, "cached": False}
 
     except Exception as e:
         print(f"Error processing transaction: {e}")
-        raise HTTPException(status_code=500, detail=str(e))
\ No newline at end of file
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.post("/transactions/batch")
+@timed_handler
+def process_transaction_batch(batch: TxBatchIn):
+    """
+    Score N transactions with one rule-engine pass, one model call and one INSERT.
+    Results are returned in input order; invalid items get an "error" entry.
+    """
+    results = [None] * len(batch.transactions)
+    valid_pos, valid_txs = [], []
+    t0 = time.perf_counter()
+
+    # 1. Validate each item on its own
+    for i, item in enumerate(batch.transactions):
+        try:
+            if not isinstance(item, dict):
+                raise ValueError("transaction must be a JSON object")
+            tx = TxIn(**item)
+            _check_features(tx)
+            valid_txs.append(tx)
+            valid_pos.append(i)
+        except (ValidationError, ValueError) as e:
+            results[i] = {"index": i, "error": str(e)}
+    VALIDATE_STAGE.observe(time.perf_counter() - t0)
+
+    # 2. Answer repeats from the cache and score each distinct request once
+    keys = [_cache_key(tx) for tx in valid_txs]
+    responses, first_seen = {}, {}
+    for j, key in enumerate(keys):
+        if key in responses or key in first_seen:
+            continue
+        hit = result_cache.get(key)
+        if hit is not None:
+            responses[key] = hit
+        else:
+            first_seen[key] = j
+
+    if first_seen:
+        _require_ready()
+        todo = list(first_seen.values())
+        scorer = model_loader.scorer
+        try:
+            # 3. Run the Hybrid Model once over the remaining batch
+            time_steps = [valid_txs[j].time_step for j in todo]
+            features_list = enrich_features_batch(
+                [valid_txs[j].features for j in todo],
+                time_steps,
+                user_ids=[valid_txs[j].user_id for j in todo],
+                tx_ids=[valid_txs[j].tx_id for j in todo],
+                parents_list=[valid_txs[j].parents for j in todo]
+            )
+            ml_probs, rule_scores, fired_list, frauds, tiers = hybrid_predict_batch(
+                features_list, time_steps, scorer
+            )
+
+            # 4. Persist all decisions in one round trip
+            rows = [
+                _decision_row(valid_txs[j], keys[j][1], ml_probs[k], rule_scores[k],
+                              fired_list[k], frauds[k], tiers[k])
+                for k, j in enumerate(todo)
+            ]
+            new_ids = _persist_many(rows)
+            if shadow is not None:
+                shadow.submit([
+                    (valid_txs[j].tx_id, keys[j][1], features_list[k], valid_txs[j].time_step,
+                     fired_to_mask(fired_list[k]), rule_scores[k], ml_probs[k], bool(frauds[k]))
+                    for k, j in enumerate(todo)
+                ])
+
+        except Exception as e:
+            print(f"Error processing transaction batch: {e}")
+            raise HTTPException(status_code=500, detail=str(e))
+
+        for k, j in enumerate(todo):
+            fraud = bool(frauds[k])
+            response = {
+                "id": new_ids[k],
+                "fraud": fraud,
+                "status": "REJECTED" if fraud else "APPROVED",
+                "ml_probability": _ml_value(ml_probs[k]),
+                "rule_score": float(rule_scores[k]),
+                "fired_rules": fired_list[k],
+                "decided_by": tiers[k],
+                "model_version": scorer.version
+            }
+            result_cache.put(keys[j], response)
+            responses[keys[j]] = response
+
+    for j, i in enumerate(valid_pos):
+        results[i] = {
+            "index": i,
+            "tx_id": valid_txs[j].tx_id,
+            **responses[keys[j]],
+            "cached": first_seen.get(keys[j]) != j
+        }
+
+    return {"results": results}
+
+# Features are large; callers ask for them explicitly
+DEFAULT_QUERY_FIELDS = (
+    "id,tx_id,user_id,time_step,ml_probability,rule_score,final_decision,"
+    "status,decided_by,fired_rules,created_at"
+)
+
+@app.get("/transactions")
+async def list_transactions(
+    time_step_min: Optional[int] = None,
+    time_step_max: Optional[int] = None,
+    user_id: Optional[int] = None,
+    tx_id: Optional[str] = None,
+    status: Optional[str] = Query(None, pattern="^(APPROVED|REJECTED|PENDING)$"),
+    ml_min: Optional[float] = Query(None, ge=0, le=1),
+    ml_max: Optional[float] = Query(None, ge=0, le=1),
+    rules_all: Optional[int] = Query(None, ge=0, lt=128, description="Bitmask (R1 = 1): all of these rules fired"),
+    rules_any: Optional[int] = Query(None, ge=0, lt=128, description="Bitmask (R1 = 1): any of these rules fired"),
+    fields: str = DEFAULT_QUERY_FIELDS,
+    limit: int = Query(config.QUERY_DEFAULT_LIMIT, ge=1, le=config.QUERY_MAX_LIMIT),
+    cursor: Optional[int] = Query(None, description="next_cursor of the previous page")
+):
+    """
+    Stored decisions, newest first. Filters combine with AND; `fields` is a
+    comma-separated subset of the columns. Page with the returned next_cursor.
+    """
+    wanted = [f.strip() for f in fields.split(",") if f.strip()]
+    unknown = sorted(set(wanted) - set(QUERY_FIELDS))
+    if unknown or not wanted:
+        raise HTTPException(status_code=400,
+                            detail=f"Unknown fields {unknown}; choose from {', '.join(QUERY_FIELDS)}")
+
+    filters = {
+        "time_step_min": time_step_min, "time_step_max": time_step_max,
+        "user_id": user_id, "tx_id": tx_id, "status": status,
+        "ml_min": ml_min, "ml_max": ml_max,
+        "rules_all": rules_all, "rules_any": rules_any
+    }
+    try:
+        rows, next_cursor = await storage.query_async(wanted, filters, limit, cursor)
+    except Exception as e:
+        print(f"Error querying transactions: {e}")
+        raise HTTPException(status_code=503, detail=str(e))
+    return {"items": rows, "count": len(rows), "next_cursor": next_cursor}
+
+@app.get("/metrics", response_class=PlainTextResponse)
+def prometheus_metrics():
+    """Prometheus text exposition: per-stage latency, request/error counts, pool and component stats."""
+    return PlainTextResponse(REGISTRY.render(), media_type="text/plain; version=0.0.4")
+
+@app.get("/rules")
+def current_rules():
+    """The active rule definitions (from RULES_PATH) and their version."""
+    return rules.ruleset.describe()
+
+@app.post("/rules/reload")
+def reload_rule_file(x_admin_token: Optional[str] = Header(None)):
+    """Recompile RULES_PATH and swap it in without a restart; on error the current rules stay."""
+    _require_admin(x_admin_token)
+    try:
+        ruleset = reload_rules()
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=f"Rules not reloaded: {e}")
+    return {"reloaded": True, "version": ruleset.version}
+
+# --- Model registry / hot swap ---
+def _require_admin(token):
+    # Admin endpoints stay closed until ADMIN_TOKEN is configured
+    if not config.ADMIN_TOKEN:
+        raise HTTPException(status_code=403, detail="Admin endpoints are disabled; set ADMIN_TOKEN to enable them")
+    if token is None or not hmac.compare_digest(token.encode(), config.ADMIN_TOKEN.encode()):
+        raise HTTPException(status_code=401, detail="Missing or wrong X-Admin-Token")
+
+class ModelSwapIn(BaseModel):
+    version: str
+
+def _run_swap(version):
+    try:
+        model_loader.swap_model(version)
+    except Exception:
+        pass        # already logged and recorded in swap_status
+
+@app.post("/admin/model/swap", status_code=202)
+def swap_model(req: ModelSwapIn, x_admin_token: Optional[str] = Header(None)):
+    """
+    Load a registered version in the background and switch to it once it
+    is warm. Scoring continues on the current model meanwhile; poll
+    GET /admin/model for the outcome.
+    """
+    _require_admin(x_admin_token)
+    try:
+        model_loader.registry.get(req.version)
+    except KeyError as e:
+        raise HTTPException(status_code=404, detail=str(e.args[0]))
+    if model_loader.swap_in_progress():
+        raise HTTPException(status_code=409, detail="A model swap is already in progress")
+    threading.Thread(target=_run_swap, args=(req.version,), name="model-swap", daemon=True).start()
+    return {"accepted": True, "target": req.version, "current": model_loader.scorer.version}
+
+@app.get("/admin/model")
+def current_model(x_admin_token: Optional[str] = Header(None)):
+    """The version being served, its registry metadata and the last swap's status."""
+    _require_admin(x_admin_token)
+    scorer = model_loader.scorer
+    meta = {k: v for k, v in scorer.meta.items() if k != "feature_names"}
+    return {"version": scorer.version, "n_features": scorer.n_features, "meta": meta,
+            "swap": dict(model_loader.swap_status)}
+
+@app.get("/admin/models")
+def registered_models(x_admin_token: Optional[str] = Header(None)):
+    """Registered versions, newest first; `active` marks the one loaded at startup."""
+    _require_admin(x_admin_token)
+    active = model_loader.registry.active()
+    return {"models": [
+        {**{k: v for k, v in meta.items() if k != "feature_names"}, "active": meta["version"] == active}
+        for meta in model_loader.registry.versions()
+    ]}
+
+@app.get("/ready")
+def readiness():
+    """Readiness probe: 200 once the model is loaded and warmed up, 503 before (or if loading failed)."""
+    loaded = model_loader.scorer.predict_fn is not None
+    body = {"ready": model_loader.ready.is_set() and loaded, "model_loaded": loaded,
+            "model_version": model_loader.scorer.version, **model_loader.startup_timings}
+    return JSONResponse(body, status_code=200 if body["ready"] else 503)
+
+@app.get("/batcher/stats")
+def batcher_stats():
+    """Batch-size and queue-wait histograms for tuning the micro-batcher."""
+    if not config.MICROBATCH_ENABLED:
+        return {"enabled": False}
+    return batcher.stats()
+
+@app.get("/cascade/stats")
+def cascade_statistics():
+    """Decisions per cascade tier and the fraction of model calls avoided."""
+    return cascade_stats()
+
+@app.get("/write-behind/stats")
+def write_behind_statistics():
+    """Queue depth, flush latency and spool size of write-behind persistence."""
+    if writer is None:
+        return {"enabled": False}
+    return writer.stats()
+
+@app.get("/db/pool/stats")
+def db_pool_statistics():
+    """Connection pool size, in-use/idle counts, wait times and leaked checkouts."""
+    return pool_stats()
+
+@app.get("/storage/stats")
+def storage_statistics():
+    """Configured storage backend and its row count (or pool stats for Postgres)."""
+    return storage.stats()
+
+@app.get("/shadow/report")
+def shadow_report():
+    """Challenger vs champion: decision/model agreement, score deltas, dropped copies and CPU cost."""
+    if shadow is None:
+        return {"enabled": False}
+    return shadow.stats()
+
+@app.get("/shadow/scores")
+def shadow_scores(tx_id: str):
+    """Stored challenger scores for one transaction, next to the champion's."""
+    try:
+        return {"tx_id": tx_id, "scores": storage.shadow_scores(tx_id)}
+    except Exception as e:
+        raise HTTPException(status_code=503, detail=f"Shadow scores unavailable: {e}")
+
+@app.get("/user-state/stats")
+def user_state_statistics():
+    """Users tracked for velocity features, evictions and memory held."""
+    if rules.user_state is None:
+        return {"enabled": False}
+    return rules.user_state.stats()
+
+@app.get("/feature-store/stats")
+def feature_store_statistics():
+    """Rows, mapped size and hit rate of the online feature store (FEATURE_STORE_PATH)."""
+    if rules.feature_store is None:
+        return {"enabled": False}
+    return rules.feature_store.stats()
+
+@app.get("/graph/stats")
+def graph_statistics():
+    """Nodes and edges of the serving transaction graph (GRAPH_PATH)."""
+    if rules.tx_graph is None:
+        return {"enabled": False}
+    return {"enabled": True, **rules.tx_graph.stats()}
+
+@app.get("/graph/{tx_id}")
+def graph_neighbors(tx_id: str):
+    """A transaction's in/out neighbors and its current nbr_* features."""
+    if rules.tx_graph is None:
+        raise HTTPException(status_code=404, detail="Transaction graph is not enabled (GRAPH_PATH)")
+    features = rules.tx_graph.lookup(tx_id)
+    if features is None:
+        raise HTTPException(status_code=404, detail=f"Unknown transaction {tx_id!r}")
+    parents, children = rules.tx_graph.neighbors(tx_id)
+    return {"tx_id": tx_id, "parents": parents, "children": children, "features": features}
+
+@app.get("/cache/stats")
+def cache_statistics():
+    """Size, hit/miss and eviction counters of the idempotent result cache."""
+    return result_cache.stats()
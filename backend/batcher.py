@@ -0,0 +1,126 @@
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+from metrics import Histogram
+
+BATCH_SIZE_BUCKETS = (1, 2, 4, 8, 16, 32, 64, 128, 256, 512)
+QUEUE_WAIT_MS_BUCKETS = (0.1, 0.25, 0.5, 1, 2, 5, 10, 25, 50, 100)
+
+class MicroBatcher:
+    """
+    Dynamic batching in front of the model.
+
+    Concurrent callers submit float32 rows; the batcher stacks them into one
+    matrix once `max_batch_size` rows are queued or the oldest row has waited
+    `max_wait_ms`, scores it with a single `predict_fn` call on a dedicated
+    thread, and resolves each caller with its own slice of the result.
+    A caller may pass its own predict_fn (the model it started with, across
+    a hot swap); rows are only stacked with rows for the same function.
+    """
+
+    def __init__(self, predict_fn, max_batch_size=64, max_wait_ms=2.0):
+        self.predict_fn = predict_fn
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000.0
+
+        self.batch_sizes = Histogram(BATCH_SIZE_BUCKETS)
+        self.queue_wait_ms = Histogram(QUEUE_WAIT_MS_BUCKETS)
+
+        self._queue = None
+        self._task = None
+        self._executor = None
+
+    @property
+    def running(self):
+        return self._task is not None and not self._task.done()
+
+    async def start(self):
+        self._queue = asyncio.Queue()
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="microbatch")
+        self._task = asyncio.get_running_loop().create_task(self._run())
+        print(f"Micro-batcher started (max_batch_size={self.max_batch_size}, "
+              f"max_wait_ms={self.max_wait * 1000:g}).")
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
+
+    async def submit(self, X, predict_fn=None):
+        """Queue an (n, n_features) matrix and wait for its n probabilities."""
+        fut = asyncio.get_running_loop().create_future()
+        await self._queue.put((X, time.perf_counter(), fut, predict_fn or self.predict_fn))
+        return await fut
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            first = await self._queue.get()
+            items = [first]
+            rows = first[0].shape[0]
+            deadline = loop.time() + self.max_wait
+
+            # Collect until the batch is full or the oldest item hits max_wait
+            while rows < self.max_batch_size:
+                try:
+                    item = self._queue.get_nowait()
+                except asyncio.QueueEmpty:
+                    timeout = deadline - loop.time()
+                    if timeout <= 0:
+                        break
+                    try:
+                        item = await asyncio.wait_for(self._queue.get(), timeout)
+                    except asyncio.TimeoutError:
+                        break
+                items.append(item)
+                rows += item[0].shape[0]
+
+            await self._score(loop, items, rows)
+
+    async def _score(self, loop, items, rows):
+        now = time.perf_counter()
+        for _, enqueued, _, _ in items:
+            self.queue_wait_ms.observe((now - enqueued) * 1000.0)
+        self.batch_sizes.observe(rows)
+
+        groups = {}
+        for item in items:
+            groups.setdefault(item[3], []).append(item)
+        for predict_fn, group in groups.items():
+            await self._score_group(loop, predict_fn, group)
+
+    async def _score_group(self, loop, predict_fn, items):
+        try:
+            X = items[0][0] if len(items) == 1 else np.vstack([x for x, _, _, _ in items])
+            probs = await loop.run_in_executor(self._executor, predict_fn, X)
+        except Exception as e:
+            for _, _, fut, _ in items:
+                if not fut.done():
+                    fut.set_exception(e)
+            return
+
+        start = 0
+        for x, _, fut, _ in items:
+            end = start + x.shape[0]
+            if not fut.done():
+                fut.set_result(probs[start:end])
+            start = end
+
+    def stats(self):
+        return {
+            "enabled": True,
+            "running": self.running,
+            "max_batch_size": self.max_batch_size,
+            "max_wait_ms": self.max_wait * 1000.0,
+            "queue_depth": self._queue.qsize() if self._queue is not None else 0,
+            "batch_size": self.batch_sizes.snapshot(),
+            "queue_wait_ms": self.queue_wait_ms.snapshot()
+        }
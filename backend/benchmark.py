@@ -0,0 +1,257 @@
+"""
+Microbenchmarks for the scoring hot path, with a baseline for regression checks.
+
+Each benchmark is timed per batch size (1 .. 1M rows by default; row-at-a-time
+APIs stop at their `max_rows`, their per-row cost is already flat there).
+A case repeats until it has run for --min-time seconds (at least 3 times) and
+records the best and median wall time per call and the best time per row.
+
+    python benchmark.py --save-baseline benchmark_baseline.json
+    python benchmark.py --baseline benchmark_baseline.json --tolerance 0.15
+    python benchmark.py --only rules --sizes 1,1000,100000
+
+With --baseline the script exits 1 when any case's best time is more than
+--tolerance slower than the baseline's (best-of-N is the least noisy
+statistic; rerun on the same machine the baseline was recorded on).
+"""
+import argparse
+import json
+import os
+import platform
+import statistics
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(os.path.dirname(HERE))    # hybrid_pipeline lives in the repo root (after backend, whose config.py wins)
+
+DEFAULT_SIZES = (1, 100, 10000, 1000000)
+RULE_COLUMNS = ("feat_3", "feat_4", "feat_10", "feat_15", "feat_20", "feat_100")
+
+def _frame(n, seed=0):
+    """n synthetic transactions with the rule inputs spread around every threshold."""
+    rng = np.random.default_rng(seed)
+    return pd.DataFrame({
+        "feat_3": rng.choice([10.0, 1000.0, 60000.0], n),
+        "feat_4": rng.choice([0.0, 0.5], n),
+        "feat_10": rng.uniform(0, 20, n),
+        "feat_15": rng.uniform(0, 5, n),
+        "feat_20": rng.uniform(0.5, 2, n),
+        "feat_100": rng.uniform(0, 1, n),
+        "time_step": rng.integers(1, 50, n)
+    })
+
+def _records(df):
+    feats = df[list(RULE_COLUMNS)].to_dict("records")
+    return feats, df["time_step"].tolist()
+
+# --- Benchmarks: setup(n) -> state, run(state) ---
+def _setup_scalar(n):
+    return _records(_frame(n))
+
+def bench_evaluate_rules(state):
+    import rules
+    feats, steps = state
+    for f, t in zip(feats, steps):
+        rules.evaluate_rules(f, t)
+
+def _setup_columns(n):
+    df = _frame(n)
+    return {c: df[c].to_numpy(dtype=float) for c in df}
+
+def bench_evaluate_rules_batch(cols):
+    import rules
+    rules.evaluate_rules_batch(cols)
+
+def bench_hybrid_predict(state):
+    import rules
+    feats, steps = state
+    for f, t in zip(feats, steps):
+        rules.hybrid_predict(f, t)
+
+def bench_hybrid_predict_batch(state):
+    import rules
+    rules.hybrid_predict_batch(*state)
+
+def _setup_users(n):
+    from user_state import UserVelocityStore
+    feats, steps = _records(_frame(n))
+    users = np.random.default_rng(1).integers(0, max(n // 4, 1), n).tolist()
+    store = UserVelocityStore(window=5, max_users=max(n // 8, 1), max_seen=max(n // 2, 1))
+    return store, users, steps, [f["feat_3"] for f in feats], [f"tx-{i}" for i in range(n)]
+
+def bench_user_state_observe(state):
+    store, users, steps, amounts, tx_ids = state
+    for u, t, a, tx_id in zip(users, steps, amounts, tx_ids):
+        store.observe(u, t, a, tx_id)
+
+def _setup_graph(n):
+    from tx_graph import TxGraph
+    rng = np.random.default_rng(2)
+    src, dst = rng.integers(0, n, 3 * n), rng.integers(0, n, 3 * n)
+    graph = TxGraph(range(n), src, dst, _frame(n)[list(RULE_COLUMNS)].to_numpy(), RULE_COLUMNS)
+    return graph, [str(i) for i in rng.integers(0, n, n)]
+
+def bench_tx_graph_lookup(state):
+    graph, ids = state
+    for tx_id in ids:
+        graph.lookup(tx_id)
+
+def _setup_store(n):
+    import shutil
+    import tempfile
+    import weakref
+    import feature_store
+    tmp = tempfile.mkdtemp(prefix="bench-store-")
+    path = os.path.join(tmp, "store")
+    matrix = np.random.default_rng(3).normal(size=(n, 165)).astype(np.float32)
+    feature_store.build(path, range(n), matrix, feature_store.ELLIPTIC_COLUMNS)
+    ids = [str(i) for i in np.random.default_rng(4).integers(0, n, n)]
+    store = feature_store.FeatureStore(path)
+    weakref.finalize(store, shutil.rmtree, tmp, True)   # removed when run_suite drops the state
+    return store, ids, _records(_frame(n))[0]
+
+def bench_feature_store_merge(state):
+    store, ids, feats = state
+    for tx_id, features in zip(ids, feats):
+        store.merge(tx_id, features)
+
+def _setup_frame(n):
+    return _frame(n)
+
+def bench_hybrid_predict_columns(df):
+    import rules
+    rules.hybrid_predict_columns(df)
+
+def _setup_matrix(n):
+    import model_loader
+    X = np.zeros((n, model_loader.scorer.n_features), dtype=np.float32)
+    X[:, :6] = _frame(n)[list(RULE_COLUMNS)].to_numpy()
+    return X
+
+def bench_model_predict(X):
+    import model_loader
+    model_loader.scorer.predict(X)
+
+def bench_rule_engine_feature_generation(df):
+    import hybrid_pipeline
+    hybrid_pipeline.rule_engine_feature_generation(df.copy())
+
+def _setup_model_path(_n):
+    import config
+    return os.path.join(HERE, config.MODEL_PATH)
+
+def bench_load_model(path):
+    import model_loader
+    model_loader.load_model(path)
+
+# name -> (setup, run, max_rows); max_rows None = not size-dependent (run once per suite)
+BENCHMARKS = {
+    "rules.evaluate_rules": (_setup_scalar, bench_evaluate_rules, 100000),
+    "rules.evaluate_rules_batch": (_setup_columns, bench_evaluate_rules_batch, 1000000),
+    "rules.hybrid_predict": (_setup_scalar, bench_hybrid_predict, 1000),
+    "rules.hybrid_predict_batch": (_setup_scalar, bench_hybrid_predict_batch, 100000),
+    "rules.hybrid_predict_columns": (_setup_frame, bench_hybrid_predict_columns, 1000000),
+    "user_state.observe": (_setup_users, bench_user_state_observe, 100000),
+    "feature_store.merge": (_setup_store, bench_feature_store_merge, 100000),
+    "tx_graph.lookup": (_setup_graph, bench_tx_graph_lookup, 100000),
+    "model.predict": (_setup_matrix, bench_model_predict, 1000000),
+    "hybrid_pipeline.rule_engine_feature_generation":
+        (_setup_frame, bench_rule_engine_feature_generation, 1000000),
+    "model_loader.load_model": (_setup_model_path, bench_load_model, None)
+}
+
+def time_case(run, state, min_time, min_repeats=3):
+    times = []
+    start = time.perf_counter()
+    while len(times) < min_repeats or time.perf_counter() - start < min_time:
+        t0 = time.perf_counter()
+        run(state)
+        times.append(time.perf_counter() - t0)
+    return times
+
+def run_suite(sizes, only=None, min_time=0.5):
+    import contextlib
+    import io
+    import model_loader
+
+    if not model_loader.ready.is_set():
+        model_loader.initialize()
+
+    results = {}
+    for name, (setup, run, max_rows) in BENCHMARKS.items():
+        if only and not any(o in name for o in only):
+            continue
+        case_sizes = [None] if max_rows is None else [n for n in sizes if n <= max_rows]
+        for n in case_sizes:
+            state = setup(n or 1)
+            with contextlib.redirect_stdout(io.StringIO()):   # load_model prints per call
+                run(state)                                     # warm-up (imports, caches)
+                times = time_case(run, state, min_time)
+            key = name if n is None else f"{name}[{n}]"
+            best = min(times)
+            results[key] = {
+                "rows": n,
+                "repeats": len(times),
+                "best_s": best,
+                "median_s": statistics.median(times),
+                "best_us_per_row": best / n * 1e6 if n else None
+            }
+            per_row = f"{results[key]['best_us_per_row']:10.3f} us/row" if n else ""
+            print(f"  {key:<58} best {best * 1000:10.3f} ms  median "
+                  f"{results[key]['median_s'] * 1000:10.3f} ms  {per_row}")
+            del state
+    return results
+
+def compare(results, baseline, tolerance):
+    """Cases slower than baseline * (1 + tolerance), as printable lines."""
+    regressions = []
+    for key, res in results.items():
+        old = baseline["results"].get(key)
+        if old is None:
+            continue
+        ratio = res["best_s"] / old["best_s"] if old["best_s"] else 1.0
+        if ratio > 1.0 + tolerance:
+            regressions.append(f"{key}: {old['best_s'] * 1000:.3f} ms -> {res['best_s'] * 1000:.3f} ms "
+                               f"({ratio - 1:+.0%})")
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description="Scoring hot-path microbenchmarks.")
+    parser.add_argument("--sizes", default=",".join(map(str, DEFAULT_SIZES)))
+    parser.add_argument("--only", default=None, help="Comma-separated substrings of benchmark names")
+    parser.add_argument("--min-time", type=float, default=0.5, help="Seconds per case")
+    parser.add_argument("--save-baseline", default=None, help="Write the results to this file")
+    parser.add_argument("--baseline", default=None, help="Compare against this file")
+    parser.add_argument("--tolerance", type=float, default=0.15, help="Allowed slowdown, 0.15 = 15%%")
+    args = parser.parse_args()
+
+    sizes = [int(s) for s in args.sizes.split(",")]
+    only = args.only.split(",") if args.only else None
+    print(f"Benchmarks (sizes {sizes}):")
+    results = run_suite(sizes, only, args.min_time)
+
+    report = {
+        "machine": {"python": platform.python_version(), "platform": platform.platform(),
+                    "processor": platform.processor(), "cpus": os.cpu_count()},
+        "results": results
+    }
+    if args.save_baseline:
+        with open(args.save_baseline, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"\nBaseline written to {args.save_baseline}")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline, args.tolerance)
+        if regressions:
+            print(f"\nRegressions beyond {args.tolerance:.0%}:\n  " + "\n  ".join(regressions))
+            sys.exit(1)
+        print(f"\nNo regressions beyond {args.tolerance:.0%} against {args.baseline}.")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,182 @@
+"""
+Offline bulk scoring of Elliptic-format transaction files.
+
+Reads a CSV or Parquet file in chunks, applies the rule meta-features and
+the hybrid model on a process pool (the model is loaded once per worker),
+and streams ml_probability, rule_score, fired_mask, final_decision and
+status to the output file in input order. At most `2 x workers` chunks are
+in flight, so peak memory depends on --chunk-size, not on the input size.
+
+    python bulk_score.py elliptic_txs_features.csv scores.csv --elliptic-raw
+    python bulk_score.py transactions.parquet scores.parquet --workers 8
+"""
+import argparse
+import os
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+# Column layout of the headerless elliptic_txs_features.csv
+ELLIPTIC_COLUMNS = ["txId", "time_step"] + [f"feat_{i}" for i in range(165)]
+ID_COLUMNS = ("txId", "tx_id")
+
+def _is_parquet(path):
+    return path.lower().endswith((".parquet", ".pq"))
+
+def read_chunks(path, chunk_size, elliptic_raw=False):
+    """Yield DataFrames of at most chunk_size rows from a CSV or Parquet file."""
+    if _is_parquet(path):
+        try:
+            import pyarrow.parquet as pq
+        except ImportError:
+            raise SystemExit("Parquet input needs pyarrow: pip install pyarrow")
+        for batch in pq.ParquetFile(path).iter_batches(batch_size=chunk_size):
+            yield batch.to_pandas()
+        return
+
+    if elliptic_raw:
+        dtypes = {name: np.float32 for name in ELLIPTIC_COLUMNS[2:]}
+        dtypes.update(txId=str, time_step=np.int32)
+        reader = pd.read_csv(path, header=None, names=ELLIPTIC_COLUMNS,
+                             chunksize=chunk_size, dtype=dtypes)
+    else:
+        reader = pd.read_csv(path, chunksize=chunk_size)
+    yield from reader
+
+class ResultWriter:
+    """Appends scored chunks to a CSV or Parquet file as they arrive."""
+
+    def __init__(self, path):
+        self.path = path
+        self._parquet = _is_parquet(path)
+        self._writer = None
+        self._wrote_header = False
+
+    def write(self, df):
+        if self._parquet:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+            table = pa.Table.from_pandas(df, preserve_index=False)
+            if self._writer is None:
+                self._writer = pq.ParquetWriter(self.path, table.schema)
+            self._writer.write_table(table)
+        else:
+            df.to_csv(self.path, mode="a" if self._wrote_header else "w",
+                      header=not self._wrote_header, index=False)
+            self._wrote_header = True
+
+    def close(self):
+        if self._writer is not None:
+            self._writer.close()
+
+# --- Worker side ---
+def _init_worker(model_path, model_backend, threads_per_worker):
+    # Must run before xgboost / model_loader are imported in this process
+    os.environ["OMP_NUM_THREADS"] = str(threads_per_worker)
+    if model_path:
+        os.environ["MODEL_PATH"] = model_path
+    if model_backend:
+        os.environ["MODEL_BACKEND"] = model_backend
+    import model_loader
+    if not model_loader.ready.is_set():
+        model_loader.initialize()   # once per worker, even when FAST_START is set
+
+def _score_chunk(df):
+    import rules
+
+    t0 = time.process_time()
+    ml_probs, rule_scores, masks, is_fraud = rules.hybrid_predict_columns(df)
+
+    out = pd.DataFrame({
+        "ml_probability": ml_probs,
+        "rule_score": rule_scores.astype(np.int16),
+        "fired_mask": masks,
+        "final_decision": is_fraud,
+        "status": np.where(is_fraud, "REJECTED", "APPROVED")
+    })
+    for id_col in ID_COLUMNS:
+        if id_col in df:
+            out.insert(0, id_col, df[id_col].to_numpy())
+            break
+    return out, time.process_time() - t0
+
+# --- Driver ---
+def bulk_score(input_path, output_path, workers=None, chunk_size=50000,
+               elliptic_raw=False, model_path=None, model_backend=None,
+               threads_per_worker=1):
+    """Score input_path into output_path; returns a throughput summary dict."""
+    workers = workers or os.cpu_count() or 1
+    max_in_flight = 2 * workers
+    writer = ResultWriter(output_path)
+    pending = deque()
+    rows = 0
+    cpu_seconds = 0.0
+
+    def drain_one():
+        nonlocal rows, cpu_seconds
+        out, cpu = pending.popleft().result()
+        writer.write(out)
+        rows += len(out)
+        cpu_seconds += cpu
+
+    t0 = time.perf_counter()
+    with ProcessPoolExecutor(
+        max_workers=workers,
+        initializer=_init_worker,
+        initargs=(model_path, model_backend, threads_per_worker)
+    ) as pool:
+        try:
+            for chunk in read_chunks(input_path, chunk_size, elliptic_raw):
+                if "time_step" not in chunk:
+                    raise SystemExit("Input is missing the required 'time_step' column")
+                pending.append(pool.submit(_score_chunk, chunk))
+                # Bounded window keeps memory flat and output in input order
+                while len(pending) >= max_in_flight:
+                    drain_one()
+            while pending:
+                drain_one()
+        finally:
+            writer.close()
+    elapsed = time.perf_counter() - t0
+
+    return {
+        "rows": rows,
+        "seconds": elapsed,
+        "workers": workers,
+        "rows_per_sec": rows / elapsed if elapsed else 0.0,
+        "rows_per_sec_per_core": rows / elapsed / workers if elapsed else 0.0,
+        "rows_per_cpu_sec": rows / cpu_seconds if cpu_seconds else 0.0
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="Bulk-score an Elliptic-format transaction file.")
+    parser.add_argument("input", help="CSV or Parquet file (.parquet/.pq)")
+    parser.add_argument("output", help="CSV or Parquet file for the scores")
+    parser.add_argument("--workers", type=int, default=None, help="Processes (default: all cores)")
+    parser.add_argument("--chunk-size", type=int, default=50000, help="Rows per chunk")
+    parser.add_argument("--elliptic-raw", action="store_true",
+                        help="Input is the headerless elliptic_txs_features.csv layout")
+    parser.add_argument("--model", default=None, help="Model file (default: MODEL_PATH)")
+    parser.add_argument("--model-backend", choices=["xgboost", "numpy"], default=None)
+    parser.add_argument("--threads-per-worker", type=int, default=1)
+    args = parser.parse_args()
+
+    summary = bulk_score(
+        args.input, args.output,
+        workers=args.workers,
+        chunk_size=args.chunk_size,
+        elliptic_raw=args.elliptic_raw,
+        model_path=args.model,
+        model_backend=args.model_backend,
+        threads_per_worker=args.threads_per_worker
+    )
+    print(f"Scored {summary['rows']:,} rows in {summary['seconds']:.2f}s with "
+          f"{summary['workers']} workers: {summary['rows_per_sec']:,.0f} rows/s total, "
+          f"{summary['rows_per_sec_per_core']:,.0f} rows/s per core "
+          f"({summary['rows_per_cpu_sec']:,.0f} rows per worker CPU-second).")
+
+if __name__ == "__main__":
+    main()
@@ -10,20 +10,128 @@ DB_PASSWORD = os.getenv("DB_PASSWORD", "your_password")
 DB_PORT = int(os.getenv("DB_PORT", 5432))
 
 MODEL_PATH = os.getenv("MODEL_PATH", "elliptic_xgb_hybrid_model.json")
+# "xgboost" (stock booster) or "numpy" (tree_model.TreeEnsemble, no xgboost import)
+MODEL_BACKEND = os.getenv("MODEL_BACKEND", "xgboost")
+
+# Model registry (model_registry.py): versioned artifacts + metadata. The
+# backend loads MODEL_VERSION, else the registry's ACTIVE version, else
+# MODEL_PATH; POST /admin/model/swap switches versions without a restart
+MODEL_REGISTRY_DIR = os.getenv("MODEL_REGISTRY_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "model_registry"))
+MODEL_VERSION = os.getenv("MODEL_VERSION", "")
+# /admin/* and POST /rules/reload require this as the X-Admin-Token header;
+# unset (the default) disables them
+ADMIN_TOKEN = os.getenv("ADMIN_TOKEN", "")
+
+# Fast start: load + warm the model in the background after the server is up;
+# /ready reports when it is done and scoring requests wait up to READY_WAIT_SECONDS.
+# Pair with a binary artifact (python model_loader.py <model>.json) for MODEL_PATH.
+FAST_START = os.getenv("FAST_START", "0") == "1"
+READY_WAIT_SECONDS = float(os.getenv("READY_WAIT_SECONDS", 30))
+WARMUP_ITERATIONS = int(os.getenv("WARMUP_ITERATIONS", 3))
+WARMUP_BATCH_SIZE = int(os.getenv("WARMUP_BATCH_SIZE", 64))
 
 # Hybrid Model Thresholds
 ML_THRESHOLD = 0.5
 RULE_THRESHOLD = 40
 
-# Rule engine thresholds
-TH_HIGH_VALUE = 50000
-TH_ZERO_FEE = 0.0
-TH_EARLY_STEP = 5
-TH_LOW_VALUE = 50
-TH_AGGREGATE = 0.8
-TH_VELOCITY = 10.0
-TH_STRUCTURAL = 2.0
-
-# Rule weights
-W_R1, W_R2, W_R3, W_R4 = 15, 10, 5, 10
-W_R5, W_R6, W_R7 = 15, 5, 10
+# Cascade mode: "off" (always run the full model), "rules" (skip the model
+# when the rule score alone rejects) or "rules+fast" (also decide with the
+# first CASCADE_FAST_TREES trees when that score is outside the LOW/HIGH band;
+# tune the band offline, prefix scores are not calibrated to the full model)
+CASCADE_MODE = os.getenv("CASCADE_MODE", "off")
+CASCADE_FAST_TREES = int(os.getenv("CASCADE_FAST_TREES", 50))
+CASCADE_FAST_LOW = float(os.getenv("CASCADE_FAST_LOW", 0.02))
+CASCADE_FAST_HIGH = float(os.getenv("CASCADE_FAST_HIGH", 0.98))
+
+# Rule definitions (thresholds, weights, derived ratios) live in rules.yaml;
+# RULES_WATCH_SECONDS > 0 reloads the file when it changes (POST /rules/reload
+# reloads on demand)
+RULES_PATH = os.getenv("RULES_PATH", os.path.join(os.path.dirname(os.path.abspath(__file__)), "rules.yaml"))
+RULES_WATCH_SECONDS = float(os.getenv("RULES_WATCH_SECONDS", 0))
+
+# Shadow scoring (shadow.py): challenger models (registry versions or model
+# paths, comma-separated) score sampled copies of live requests on
+# SHADOW_WORKERS background threads; copies are dropped while
+# SHADOW_QUEUE_SIZE are already waiting
+SHADOW_MODELS = [m.strip() for m in os.getenv("SHADOW_MODELS", "").split(",") if m.strip()]
+SHADOW_SAMPLE_RATE = float(os.getenv("SHADOW_SAMPLE_RATE", 1.0))
+SHADOW_WORKERS = int(os.getenv("SHADOW_WORKERS", 1))
+SHADOW_QUEUE_SIZE = int(os.getenv("SHADOW_QUEUE_SIZE", 1000))
+SHADOW_BATCH_SIZE = int(os.getenv("SHADOW_BATCH_SIZE", 256))
+
+# Per-user streaming velocity (user_state.py): counts and amount sums
+# (USER_STATE_AMOUNT_FEATURE) over each user's last USER_STATE_WINDOW
+# time_steps, kept in memory for the USER_STATE_MAX_USERS most recently
+# active users and snapshotted to USER_STATE_SNAPSHOT on shutdown. The last
+# USER_STATE_SEEN_TX tx_ids are remembered so a retry is not counted twice
+USER_STATE_ENABLED = os.getenv("USER_STATE_ENABLED", "0") == "1"
+USER_STATE_WINDOW = int(os.getenv("USER_STATE_WINDOW", 5))
+USER_STATE_MAX_USERS = int(os.getenv("USER_STATE_MAX_USERS", 100000))
+USER_STATE_SEEN_TX = int(os.getenv("USER_STATE_SEEN_TX", 100000))
+USER_STATE_AMOUNT_FEATURE = os.getenv("USER_STATE_AMOUNT_FEATURE", "feat_3")
+USER_STATE_SNAPSHOT = os.getenv("USER_STATE_SNAPSHOT", "user_state.npz")
+
+# Online feature store (feature_store.py): directory built by
+# `python feature_store.py build <elliptic_txs_features.csv>`. Requests for a
+# stored tx_id are scored on its full vector, overlaid with the request's
+# features; `features` may then be omitted. Empty disables it
+FEATURE_STORE_PATH = os.getenv("FEATURE_STORE_PATH", "")
+
+# Transaction graph (tx_graph.py): GRAPH_PATH is the elliptic_tx_graph.npz
+# written by hybrid_pipeline.py; scored transactions join it (edges from the
+# request's `parents`) and get the nbr_* neighbor features. Empty disables it.
+# Pending additions are compacted in the background every GRAPH_COMPACT_EDGES;
+# beyond GRAPH_MAX_NODES the oldest scored transactions are evicted (0: no
+# cap). The graph is snapshotted to GRAPH_SNAPSHOT on shutdown and restored
+# on start while GRAPH_PATH is unchanged
+GRAPH_PATH = os.getenv("GRAPH_PATH", "")
+GRAPH_COMPACT_EDGES = int(os.getenv("GRAPH_COMPACT_EDGES", 10000))
+GRAPH_MAX_NODES = int(os.getenv("GRAPH_MAX_NODES", 1000000))
+GRAPH_SNAPSHOT = os.getenv("GRAPH_SNAPSHOT", "tx_graph_snapshot.npz")
+
+# Micro-batching of concurrent /transactions model calls (off by default)
+MICROBATCH_ENABLED = os.getenv("MICROBATCH_ENABLED", "0") == "1"
+MICROBATCH_MAX_SIZE = int(os.getenv("MICROBATCH_MAX_SIZE", 64))
+MICROBATCH_MAX_WAIT_MS = float(os.getenv("MICROBATCH_MAX_WAIT_MS", 2.0))
+
+# Idempotent (tx_id, request hash) result cache for client retries; 0 entries disables it
+RESULT_CACHE_MAX_ENTRIES = int(os.getenv("RESULT_CACHE_MAX_ENTRIES", 100000))
+RESULT_CACHE_TTL_SECONDS = float(os.getenv("RESULT_CACHE_TTL_SECONDS", 600))
+RESULT_CACHE_MAX_MB = float(os.getenv("RESULT_CACHE_MAX_MB", 64))
+
+# Write-behind persistence: decisions are queued and flushed in batches by a
+# background thread; while the DB is unreachable they go to WRITE_BEHIND_SPOOL_DIR
+WRITE_BEHIND_ENABLED = os.getenv("WRITE_BEHIND_ENABLED", "0") == "1"
+WRITE_BEHIND_QUEUE_SIZE = int(os.getenv("WRITE_BEHIND_QUEUE_SIZE", 10000))
+WRITE_BEHIND_BATCH_SIZE = int(os.getenv("WRITE_BEHIND_BATCH_SIZE", 500))
+WRITE_BEHIND_FLUSH_MS = float(os.getenv("WRITE_BEHIND_FLUSH_MS", 50))
+WRITE_BEHIND_RETRY_SECONDS = float(os.getenv("WRITE_BEHIND_RETRY_SECONDS", 5))
+WRITE_BEHIND_SPOOL_DIR = os.getenv("WRITE_BEHIND_SPOOL_DIR", "spool")
+
+# transactions is range-partitioned on time_step: PARTITION_WIDTH steps per
+# partition, created PARTITIONS_AHEAD partitions before they are needed
+PARTITION_WIDTH = int(os.getenv("PARTITION_WIDTH", 10))
+PARTITIONS_AHEAD = int(os.getenv("PARTITIONS_AHEAD", 2))
+
+# Database connection pool: DB_POOL_MAX=0 sizes it to the worker threads
+# plus DB_POOL_EXTRA; callers wait up to DB_POOL_TIMEOUT_SECONDS for a connection
+DB_POOL_MAX = int(os.getenv("DB_POOL_MAX", 0))
+DB_POOL_EXTRA = int(os.getenv("DB_POOL_EXTRA", 4))
+DB_POOL_TIMEOUT_SECONDS = float(os.getenv("DB_POOL_TIMEOUT_SECONDS", 10))
+DB_POOL_LEAK_SECONDS = float(os.getenv("DB_POOL_LEAK_SECONDS", 60))
+
+# Compact storage: features as packed float32 bytea in the model's column
+# order (+ a layout version) and fired rules only as the fired_mask bitmask
+COMPACT_STORAGE = os.getenv("COMPACT_STORAGE", "0") == "1"
+
+# GET /transactions query API
+QUERY_DEFAULT_LIMIT = int(os.getenv("QUERY_DEFAULT_LIMIT", 100))
+QUERY_MAX_LIMIT = int(os.getenv("QUERY_MAX_LIMIT", 1000))
+QUERY_TIMEOUT_MS = int(os.getenv("QUERY_TIMEOUT_MS", 5000))
+
+# Where decisions are stored (storage.py): "postgres", "sqlite" (one local
+# file at SQLITE_PATH, no database server) or "memory" (ring buffer of the
+# last MEMORY_STORE_MAX_ROWS decisions, for load tests and benchmarks)
+STORAGE_BACKEND = os.getenv("STORAGE_BACKEND", "postgres")
+MEMORY_STORE_MAX_ROWS = int(os.getenv("MEMORY_STORE_MAX_ROWS", 100000))
+SQLITE_PATH = os.getenv("SQLITE_PATH", "transactions.sqlite3")
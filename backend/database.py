@@ -1,55 +1,587 @@
+import io
+import json
+import threading
 import psycopg2
-from psycopg2.pool import SimpleConnectionPool
-import config  
+from psycopg2.extras import execute_values
+from db_pool import ConnectionPool, AsyncPool
+import config
+import feature_codec
 
 pool = None
+async_pool = None
 
-def init_pool():
-    global pool
+def pool_size():
+    """
+    DB_POOL_MAX, or one connection per worker thread (AnyIO's thread
+    limiter, which runs the sync routes) plus DB_POOL_EXTRA for background
+    threads. Connections are opened on demand up to this size.
+    """
+    if config.DB_POOL_MAX > 0:
+        return config.DB_POOL_MAX
     try:
-        pool = SimpleConnectionPool(
+        from anyio import to_thread
+        threads = int(to_thread.current_default_thread_limiter().total_tokens)
+    except Exception:
+        threads = 40    # AnyIO's default; used outside a running event loop
+    return threads + config.DB_POOL_EXTRA
+
+def _connect():
+    return psycopg2.connect(
+        host=config.DB_HOST,
+        database=config.DB_NAME,
+        user=config.DB_USER,
+        password=config.DB_PASSWORD,
+        port=config.DB_PORT
+    )
+
+def init_pool(maxconn=None):
+    global pool, async_pool
+    try:
+        pool = ConnectionPool(
+            _connect,
             minconn=1,
-            maxconn=10,
-            host=config.DB_HOST,
-            database=config.DB_NAME,
-            user=config.DB_USER,
-            password=config.DB_PASSWORD,
-            port=config.DB_PORT
-        )
-        print("Database connection pool created.")
+            maxconn=maxconn or pool_size(),
+            timeout=config.DB_POOL_TIMEOUT_SECONDS,
+            leak_seconds=config.DB_POOL_LEAK_SECONDS
+        )
+        async_pool = AsyncPool(pool)
+        print(f"Database connection pool created (max {pool.maxconn} connections).")
     except Exception as e:
         print(f"Error creating connection pool: {e}")
 
-def get_conn():
-    return pool.getconn()
+def _require_pool():
+    if pool is None:
+        # Retry after a failed startup (e.g. the database was not up yet)
+        init_pool()
+    if pool is None:
+        raise RuntimeError("Database connection pool is not available")
+    return pool
+
+def connection():
+    """Context manager for a pooled connection; always returned, rolled back on error."""
+    return _require_pool().connection()
+
+async def run_async(fn, *args):
+    """From an async route: await fn(conn, *args) on a pooled connection."""
+    _require_pool()
+    return await async_pool.run(fn, *args)
+
+def pool_stats():
+    if pool is None:
+        return {"available": False}
+    return {"available": True, **pool.stats()}
+
+# --- Schema ---
+# transactions is range-partitioned on time_step (every insert carries it, and
+# request_hash already covers it, so the idempotency key can include the
+# partition key). Partitions are PARTITION_WIDTH time steps wide and are
+# created PARTITIONS_AHEAD widths before rows need them; anything outside the
+# existing ranges lands in transactions_default until its partition exists.
+TABLE_DDL = """
+CREATE TABLE IF NOT EXISTS transactions (
+    id BIGSERIAL,
+    user_id INT,
+    tx_id TEXT,
+    time_step INT NOT NULL,
+    features JSONB,
+    ml_probability FLOAT,
+    rule_score FLOAT,
+    total_rule_score FLOAT,
+    fired_rules JSONB,
+    final_decision BOOLEAN,
+    status VARCHAR(20) DEFAULT 'PENDING',
+    created_at TIMESTAMP DEFAULT NOW(),
+    decided_by VARCHAR(16),
+    request_hash TEXT,
+    features_packed BYTEA,
+    feature_layout INT,
+    fired_mask SMALLINT,
+    PRIMARY KEY (id, time_step)
+) PARTITION BY RANGE (time_step);
+CREATE TABLE IF NOT EXISTS transactions_default PARTITION OF transactions DEFAULT;
+"""
+
+# Columns added after the partitioned layout shipped; no-ops on up-to-date tables
+COLUMN_MIGRATIONS = """
+ALTER TABLE transactions ADD COLUMN IF NOT EXISTS features_packed BYTEA;
+ALTER TABLE transactions ADD COLUMN IF NOT EXISTS feature_layout INT;
+ALTER TABLE transactions ADD COLUMN IF NOT EXISTS fired_mask SMALLINT;
+"""
+
+# Column order of each packed feature vector (see feature_codec)
+LAYOUTS_DDL = """
+CREATE TABLE IF NOT EXISTS feature_layouts (
+    version INT PRIMARY KEY,
+    feature_names TEXT[] NOT NULL,
+    created_at TIMESTAMP DEFAULT NOW()
+);
+"""
+
+# Challenger-model scores of live requests (shadow.py), joined to the champion
+# decision on (tx_id, request_hash)
+SHADOW_DDL = """
+CREATE TABLE IF NOT EXISTS shadow_scores (
+    tx_id TEXT NOT NULL,
+    request_hash TEXT NOT NULL,
+    model_version TEXT NOT NULL,
+    ml_probability FLOAT,
+    final_decision BOOLEAN,
+    champion_probability FLOAT,
+    champion_decision BOOLEAN,
+    created_at TIMESTAMP DEFAULT NOW(),
+    PRIMARY KEY (tx_id, request_hash, model_version)
+);
+"""
+
+# Created on the parent, so every partition gets them. Trailing id columns
+# give keyset pagination an index order to walk.
+INDEXES = {
+    # Idempotency: one stored decision per request; also serves tx_id lookups
+    "transactions_tx_request_uq":
+        "CREATE UNIQUE INDEX IF NOT EXISTS {name} ON transactions (tx_id, request_hash, time_step)",
+    "transactions_user_idx":
+        "CREATE INDEX IF NOT EXISTS {name} ON transactions (user_id, id)",
+    "transactions_time_step_idx":
+        "CREATE INDEX IF NOT EXISTS {name} ON transactions (time_step, id)",
+    "transactions_status_idx":
+        "CREATE INDEX IF NOT EXISTS {name} ON transactions (status, id)",
+    # ml_min / ml_max: the high-score ranges reviewers page through are a small slice
+    "transactions_ml_idx":
+        "CREATE INDEX IF NOT EXISTS {name} ON transactions (ml_probability, id)",
+    # rules_all / rules_any: a bitmask test cannot use a btree, but query_where
+    # adds the implied fired_mask <> 0, so newest-first pages walk only the
+    # rows where some rule fired
+    "transactions_fired_idx":
+        "CREATE INDEX IF NOT EXISTS {name} ON transactions (id) WHERE fired_mask <> 0"
+}
+# Indexes of earlier versions that no query uses
+RETIRED_INDEXES = ("transactions_rejected_idx", "transactions_created_brin")
+
+PARTITION_PREFIX = "transactions_ts_"
+# Serializes partition DDL across workers/processes
+PARTITION_LOCK_ID = 7301011
+
+_partition_lock = threading.Lock()
+_partitions = None     # lower bounds of the existing time_step partitions
+
+def _is_partitioned(cur):
+    cur.execute("SELECT relkind FROM pg_class WHERE oid = to_regclass('transactions')")
+    row = cur.fetchone()
+    return None if row is None else row[0] == "p"
 
-def release_conn(conn):
-    pool.putconn(conn)
+# time_step given to legacy rows stored without one: time_step is the
+# partition key (NOT NULL) and Elliptic steps start at 1
+LEGACY_NULL_TIME_STEP = 0
+
+def _migrate_unpartitioned(cur):
+    """
+    Move rows of a pre-partitioning transactions table into the partitioned
+    layout. Rows without a time_step are kept with LEGACY_NULL_TIME_STEP.
+    """
+    cur.execute("""
+    ALTER TABLE transactions ADD COLUMN IF NOT EXISTS decided_by VARCHAR(16);
+    ALTER TABLE transactions ADD COLUMN IF NOT EXISTS request_hash TEXT;
+    ALTER TABLE transactions RENAME TO transactions_unpartitioned;
+    ALTER TABLE transactions_unpartitioned RENAME CONSTRAINT transactions_pkey TO transactions_unpartitioned_pkey;
+    ALTER SEQUENCE IF EXISTS transactions_id_seq RENAME TO transactions_unpartitioned_id_seq;
+    DROP INDEX IF EXISTS transactions_tx_request_uq;
+    """)
+    cur.execute(TABLE_DDL)
+    step = f"coalesce(time_step, {LEGACY_NULL_TIME_STEP})"
+    cur.execute(f"SELECT min({step}), max({step}), count(*) FILTER (WHERE time_step IS NULL) "
+                "FROM transactions_unpartitioned")
+    lo, hi, no_step = cur.fetchone()
+    if lo is not None:
+        _create_partitions(cur, _partition_lows(lo, hi))
+    select = LEGACY_COLUMNS.replace("time_step", step)
+    cur.execute(f"""
+    INSERT INTO transactions (id, {LEGACY_COLUMNS}, created_at)
+    SELECT id, {select}, created_at FROM transactions_unpartitioned;
+    SELECT setval(pg_get_serial_sequence('transactions', 'id'),
+                  (SELECT coalesce(max(id), 0) + 1 FROM transactions_unpartitioned), false);
+    """)
+    cur.execute("SELECT count(*) FROM transactions")
+    moved = cur.fetchone()[0]
+    cur.execute("DROP TABLE transactions_unpartitioned")
+    print(f"Migrated {moved} rows to the time_step-partitioned transactions table.")
+    if no_step:
+        print(f"⚠️ {no_step} migrated rows had no time_step; stored with time_step {LEGACY_NULL_TIME_STEP}.")
+
+def _existing_partitions(cur):
+    cur.execute("""
+    SELECT c.relname FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid
+    WHERE i.inhparent = 'transactions'::regclass
+    """)
+    ranges = []
+    for (name,) in cur.fetchall():
+        if name.startswith(PARTITION_PREFIX):
+            lo, hi = name[len(PARTITION_PREFIX):].split("_")
+            ranges.append((int(lo), int(hi)))
+    return ranges
+
+def _partition_lows(lo_step, hi_step):
+    width = config.PARTITION_WIDTH
+    return range((lo_step // width) * width, hi_step + 1, width)
+
+def _create_partitions(cur, lows):
+    """
+    Create the missing PARTITION_WIDTH-wide partitions starting at `lows`.
+    Rows already parked in the default partition for a new range are moved
+    into it before it is attached. Returns (created, all partition lows).
+    """
+    cur.execute("SELECT pg_advisory_xact_lock(%s)", (PARTITION_LOCK_ID,))
+    existing = {lo for lo, _ in _existing_partitions(cur)}
+    created = 0
+    for lo in lows:
+        if lo in existing:
+            continue
+        hi = lo + config.PARTITION_WIDTH
+        name = f"{PARTITION_PREFIX}{lo}_{hi}"
+        cur.execute(f"""
+        CREATE TABLE {name} (LIKE transactions INCLUDING DEFAULTS);
+        WITH moved AS (
+            DELETE FROM transactions_default WHERE time_step >= %s AND time_step < %s RETURNING *
+        )
+        INSERT INTO {name} SELECT * FROM moved;
+        ALTER TABLE transactions ATTACH PARTITION {name} FOR VALUES FROM (%s) TO (%s);
+        """, (lo, hi, lo, hi))
+        existing.add(lo)
+        created += 1
+    return created, existing
+
+def ensure_partitions(max_time_step, min_time_step=None):
+    """
+    Make sure partitions exist from max_time_step (or min_time_step when
+    given) to PARTITIONS_AHEAD widths past it. Only a set lookup when they
+    already do, so it runs on every insert.
+    """
+    global _partitions
+    ahead = max_time_step + config.PARTITIONS_AHEAD * config.PARTITION_WIDTH
+    lows = _partition_lows(max_time_step if min_time_step is None else min_time_step, ahead)
+    known = _partitions
+    if known is not None and all(lo in known for lo in lows):
+        return
+    with _partition_lock:
+        with connection() as conn:
+            cur = conn.cursor()
+            created, existing = _create_partitions(cur, lows)
+            conn.commit()
+            cur.close()
+            _partitions = frozenset(existing)
+            if created:
+                print(f"Created {created} transactions partition(s) up to time_step {ahead}.")
+
+def _ensure_partitions_for(rows):
+    ensure_partitions(max(row[_TIME_STEP_POS] for row in rows))
 
 def create_tables():
     if pool is None:
         print("Skipping table creation: Pool not initialized.")
         return
 
-    conn = get_conn()
+    with connection() as conn:
+        cur = conn.cursor()
+        partitioned = _is_partitioned(cur)
+        if partitioned is None:
+            cur.execute(TABLE_DDL)
+        elif not partitioned:
+            _migrate_unpartitioned(cur)
+        cur.execute(COLUMN_MIGRATIONS)
+        cur.execute(LAYOUTS_DDL)
+        cur.execute(SHADOW_DDL)
+        for name, ddl in INDEXES.items():
+            cur.execute(ddl.format(name=name))
+        for name in RETIRED_INDEXES:
+            cur.execute(f"DROP INDEX IF EXISTS {name}")
+        conn.commit()
+        cur.execute("SELECT coalesce(max(time_step), 0), least(coalesce(min(time_step), 0), 0) FROM transactions")
+        max_step, min_step = cur.fetchone()
+        cur.close()
+    ensure_partitions(max_step, min_step)
+    print("Tables checked/created.")
+
+# Columns of the pre-partitioning table (copied by _migrate_unpartitioned)
+LEGACY_COLUMNS = (
+    "user_id, tx_id, time_step, features, ml_probability, rule_score, "
+    "total_rule_score, fired_rules, final_decision, status, decided_by, request_hash"
+)
+INSERT_COLUMNS = LEGACY_COLUMNS + ", features_packed, feature_layout, fired_mask"
+
+_KEY_COLUMNS = [c.strip() for c in INSERT_COLUMNS.split(",")]
+_TX_ID_POS = _KEY_COLUMNS.index("tx_id")
+_REQUEST_HASH_POS = _KEY_COLUMNS.index("request_hash")
+_TIME_STEP_POS = _KEY_COLUMNS.index("time_step")
+_LAYOUT_POS = _KEY_COLUMNS.index("feature_layout")
+
+def row_key(row):
+    """(tx_id, request_hash) of an INSERT_COLUMNS row: the idempotency key."""
+    return (row[_TX_ID_POS], row[_REQUEST_HASH_POS])
+
+# --- Compact storage ---
+_registered_layouts = set()
+
+def _register_layouts(cur, rows):
+    """Record feature layouts first used by `rows`; returns the versions written."""
+    new = {row[_LAYOUT_POS] for row in rows} - _registered_layouts - {None}
+    for version in new:
+        cur.execute(
+            "INSERT INTO feature_layouts (version, feature_names) VALUES (%s, %s) "
+            "ON CONFLICT (version) DO NOTHING",
+            (version, list(feature_codec.LAYOUTS[version].names))
+        )
+    return new
+
+def feature_layout(version):
+    """FeatureLayout of a stored version (from this process or the feature_layouts table)."""
+    layout = feature_codec.LAYOUTS.get(version)
+    if layout is None:
+        with connection() as conn:
+            cur = conn.cursor()
+            cur.execute("SELECT feature_names FROM feature_layouts WHERE version = %s", (version,))
+            found = cur.fetchone()
+            cur.close()
+        if found is None:
+            raise KeyError(f"Unknown feature layout version {version}")
+        layout = feature_codec.FeatureLayout(found[0])
+    return layout
+
+def decode_stored(features, features_packed, layout_version, fired_rules, fired_mask):
+    """(features dict, fired-rules dict) of a stored row in either layout."""
+    if features_packed is not None:
+        features = feature_layout(layout_version).decode(features_packed, features)
+    elif isinstance(features, str):
+        features = json.loads(features)
+    if isinstance(fired_rules, str):
+        fired_rules = json.loads(fired_rules)     # stored as text outside Postgres
+    if fired_rules is None and fired_mask is not None:
+        from rules import mask_to_fired
+        fired_rules = mask_to_fired(fired_mask)
+    return features or {}, fired_rules
+
+# A retried request hits the unique index; the no-op update makes RETURNING
+# hand back the id of the row stored the first time.
+ON_CONFLICT_RETURNING = (
+    "ON CONFLICT (tx_id, request_hash, time_step) DO UPDATE SET tx_id = EXCLUDED.tx_id "
+    "RETURNING id;"
+)
+
+def insert_transaction(row):
+    """Insert one decision row (tuple ordered as INSERT_COLUMNS) and return its id."""
+    _ensure_partitions_for([row])
+    with connection() as conn:
+        cur = conn.cursor()
+        new_layouts = _register_layouts(cur, [row])
+        cur.execute(
+            f"INSERT INTO transactions ({INSERT_COLUMNS}) "
+            f"VALUES ({', '.join(['%s'] * len(_KEY_COLUMNS))}) " + ON_CONFLICT_RETURNING,
+            row
+        )
+        new_id = cur.fetchone()[0]
+        conn.commit()
+        _registered_layouts.update(new_layouts)
+        cur.close()
+        return new_id
+
+def insert_transactions(rows):
+    """
+    Insert many decision rows in a single multi-row INSERT.
+    Returns the ids in the same order as `rows`. Rows repeating a
+    (tx_id, request_hash) pair are sent once (Postgres rejects touching the
+    same conflict target twice in one statement) and share its id.
+    """
+    if not rows:
+        return []
+
+    first = {}
+    for row in rows:
+        first.setdefault(row_key(row), row)
+    unique_rows = list(first.values())
+    _ensure_partitions_for(unique_rows)
+
+    with connection() as conn:
+        cur = conn.cursor()
+        new_layouts = _register_layouts(cur, unique_rows)
+        ids = execute_values(
+            cur,
+            f"INSERT INTO transactions ({INSERT_COLUMNS}) VALUES %s " + ON_CONFLICT_RETURNING,
+            unique_rows,
+            page_size=len(unique_rows),
+            fetch=True
+        )
+        conn.commit()
+        _registered_layouts.update(new_layouts)
+        cur.close()
+        id_by_key = {row_key(row): r[0] for row, r in zip(unique_rows, ids)}
+        return [id_by_key[row_key(row)] for row in rows]
+
+# --- Bulk ingest ---
+def _copy_value(value):
+    """One field in COPY text format."""
+    if value is None:
+        return "\\N"
+    if isinstance(value, bool):
+        return "t" if value else "f"
+    if isinstance(value, (bytes, bytearray, memoryview)):
+        return "\\\\x" + bytes(value).hex()
+    return (str(value).replace("\\", "\\\\").replace("\t", "\\t")
+            .replace("\n", "\\n").replace("\r", "\\r"))
+
+def copy_transactions(rows):
+    """
+    Bulk-load decision rows with COPY into a temporary staging table, then
+    move them into transactions skipping already-stored requests. Much
+    faster than INSERT for large batches; returns the number of new rows
+    (ids are not returned).
+    """
+    if not rows:
+        return 0
+
+    first = {}
+    for row in rows:
+        first.setdefault(row_key(row), row)
+    unique_rows = list(first.values())
+    _ensure_partitions_for(unique_rows)
+
+    buf = io.StringIO()
+    for row in unique_rows:
+        buf.write("\t".join(_copy_value(v) for v in row) + "\n")
+    buf.seek(0)
+
+    with connection() as conn:
+        cur = conn.cursor()
+        new_layouts = _register_layouts(cur, unique_rows)
+        cur.execute(
+            "CREATE TEMP TABLE IF NOT EXISTS transactions_stage ON COMMIT DELETE ROWS AS "
+            f"SELECT {INSERT_COLUMNS} FROM transactions WITH NO DATA"
+        )
+        cur.copy_expert(f"COPY transactions_stage ({INSERT_COLUMNS}) FROM STDIN", buf)
+        cur.execute(
+            f"INSERT INTO transactions ({INSERT_COLUMNS}) "
+            f"SELECT {INSERT_COLUMNS} FROM transactions_stage ON CONFLICT DO NOTHING"
+        )
+        inserted = cur.rowcount
+        conn.commit()
+        _registered_layouts.update(new_layouts)
+        cur.close()
+        return inserted
+
+# --- Shadow scores ---
+SHADOW_COLUMNS = (
+    "tx_id, request_hash, model_version, ml_probability, final_decision, "
+    "champion_probability, champion_decision"
+)
+
+def insert_shadow_scores(rows):
+    """Insert challenger scores (tuples ordered as SHADOW_COLUMNS); repeats are ignored."""
+    if not rows:
+        return
+    with connection() as conn:
+        cur = conn.cursor()
+        execute_values(
+            cur,
+            f"INSERT INTO shadow_scores ({SHADOW_COLUMNS}) VALUES %s ON CONFLICT DO NOTHING",
+            rows,
+            page_size=len(rows)
+        )
+        conn.commit()
+        cur.close()
+
+def query_shadow_scores(conn, tx_id):
+    """Stored challenger scores of one transaction, as dicts."""
+    columns = [c.strip() for c in SHADOW_COLUMNS.split(",")] + ["created_at"]
     cur = conn.cursor()
-    cur.execute("""
-    CREATE TABLE IF NOT EXISTS transactions (
-        id SERIAL PRIMARY KEY,
-        user_id INT,
-        tx_id TEXT,
-        time_step INT,
-        features JSONB,
-        ml_probability FLOAT,
-        rule_score FLOAT,
-        total_rule_score FLOAT,
-        fired_rules JSONB,
-        final_decision BOOLEAN,
-        status VARCHAR(20) DEFAULT 'PENDING',
-        created_at TIMESTAMP DEFAULT NOW()
-    );
-    """)
-    conn.commit()
+    cur.execute(
+        f"SELECT {', '.join(columns)} FROM shadow_scores WHERE tx_id = %s ORDER BY created_at",
+        (tx_id,)
+    )
+    fetched = cur.fetchall()
+    cur.close()
+    conn.rollback()
+    return [dict(zip(columns, values)) for values in fetched]
+
+# --- Read paths ---
+# Plain columns a query may select; features and fired_rules are decoded from
+# whichever layout the row was stored in.
+QUERY_COLUMNS = (
+    "id", "user_id", "tx_id", "time_step", "ml_probability", "rule_score",
+    "total_rule_score", "final_decision", "status", "decided_by", "fired_mask", "created_at"
+)
+DECODED_FIELDS = {
+    "features": ("features", "features_packed", "feature_layout"),
+    "fired_rules": ("fired_rules", "fired_mask")
+}
+QUERY_FIELDS = QUERY_COLUMNS + tuple(DECODED_FIELDS)
+
+def query_where(filters, cursor, mark="%s"):
+    """WHERE clause and parameters for the query filters (`mark`: placeholder style)."""
+    clauses, params = [], []
+
+    def add(sql, value):
+        if value is not None:
+            clauses.append(sql.replace("%s", mark))
+            params.append(value)
+
+    add("time_step >= %s", filters.get("time_step_min"))
+    add("time_step <= %s", filters.get("time_step_max"))
+    add("user_id = %s", filters.get("user_id"))
+    add("tx_id = %s", filters.get("tx_id"))
+    add("status = %s", filters.get("status"))
+    add("ml_probability >= %s", filters.get("ml_min"))
+    add("ml_probability <= %s", filters.get("ml_max"))
+    # rules_all: every rule in the mask fired; rules_any: at least one did
+    # (either implies fired_mask <> 0, spelled out for transactions_fired_idx)
+    if filters.get("rules_all") or filters.get("rules_any"):
+        clauses.append("fired_mask <> 0")
+    if filters.get("rules_all"):
+        clauses.append(f"fired_mask & {mark} = {mark}")
+        params += [filters["rules_all"], filters["rules_all"]]
+    if filters.get("rules_any"):
+        add("fired_mask & %s <> 0", filters["rules_any"])
+    add("id < %s", cursor)
+    return (" WHERE " + " AND ".join(clauses)) if clauses else "", params
+
+def select_columns(fields):
+    """Stored columns needed to answer `fields` ("id" first, for the cursor)."""
+    columns = ["id"]
+    for field in fields:
+        for col in DECODED_FIELDS.get(field, (field,)):
+            if col not in columns:
+                columns.append(col)
+    return columns
+
+def page_rows(columns, fetched, fields, limit):
+    """
+    (rows as dicts with only `fields`, next_cursor or None) from up to
+    limit + 1 fetched tuples ordered as `columns`, newest first.
+    """
+    more = len(fetched) > limit
+    rows = []
+    for values in fetched[:limit]:
+        rec = dict(zip(columns, values))
+        if "features" in fields or "fired_rules" in fields:
+            features, fired = decode_stored(rec.get("features"), rec.get("features_packed"),
+                                            rec.get("feature_layout"), rec.get("fired_rules"),
+                                            rec.get("fired_mask"))
+            rec["features"], rec["fired_rules"] = features, fired
+        rows.append({field: rec[field] for field in fields})
+    return rows, (fetched[limit - 1][0] if more else None)
+
+def query_transactions(conn, fields, filters, limit, cursor=None):
+    """
+    Newest-first page of stored decisions with keyset pagination: pass the
+    returned next_cursor (the last id) back as `cursor` for the next page,
+    which is an index range scan instead of OFFSET's skip-and-discard.
+    Returns (rows as dicts with only `fields`, next_cursor or None).
+    """
+    columns = select_columns(fields)
+    where, params = query_where(filters, cursor)
+    cur = conn.cursor()
+    cur.execute("SET LOCAL statement_timeout = %s", (int(config.QUERY_TIMEOUT_MS),))
+    cur.execute(
+        f"SELECT {', '.join(columns)} FROM transactions{where} ORDER BY id DESC LIMIT %s",
+        params + [limit + 1]
+    )
+    fetched = cur.fetchall()
     cur.close()
-    release_conn(conn)
-    print("Tables checked/created.")
\ No newline at end of file
+    conn.rollback()     # read-only; ends the transaction and the SET LOCAL
+    return page_rows(columns, fetched, fields, limit)
@@ -0,0 +1,223 @@
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager, asynccontextmanager
+from metrics import Counter, Histogram
+
+WAIT_MS_BUCKETS = (0.1, 0.5, 1, 2, 5, 10, 25, 50, 100, 250, 1000, 5000)
+
+class PoolTimeout(Exception):
+    """No connection became free within the pool's timeout."""
+
+class ConnectionPool:
+    """
+    Thread-safe blocking connection pool.
+
+    getconn() hands out an idle connection, opens a new one while fewer
+    than `maxconn` exist, and otherwise waits (up to `timeout` seconds) for
+    one to be returned. Use connection() rather than getconn()/putconn():
+    it rolls back on error, always returns the connection, and drops it
+    when the server closed it.
+
+    A connection held longer than `leak_seconds` is reported as leaked
+    (once per checkout) so a missing putconn() shows up in stats() and
+    the `leaked` counter. The check runs on checkout (at most once per
+    LEAK_CHECK_SECONDS), from stats() and from check_leaks().
+    """
+    LEAK_CHECK_SECONDS = 1.0
+
+    def __init__(self, connect, minconn=1, maxconn=10, timeout=30.0, leak_seconds=60.0):
+        self._connect = connect
+        self.minconn = minconn
+        self.maxconn = maxconn
+        self.timeout = timeout
+        self.leak_seconds = leak_seconds
+
+        self._cond = threading.Condition()
+        self._idle = deque()
+        self._in_use = {}       # id(conn) -> (conn, checkout time, thread name, reported)
+        self._size = 0
+        self._closed = False
+        self._last_leak_check = time.monotonic()
+
+        self.wait_ms = Histogram(WAIT_MS_BUCKETS)
+        self.checkouts = Counter()
+        self.timeouts = Counter()
+        self.discarded = Counter()
+        self.leaked = Counter()
+
+        for _ in range(minconn):
+            self._idle.append(self._connect())
+            self._size += 1
+
+    @property
+    def size(self):
+        return self._size
+
+    @property
+    def in_use(self):
+        return len(self._in_use)
+
+    def getconn(self, timeout=None):
+        timeout = self.timeout if timeout is None else timeout
+        t0 = time.perf_counter()
+        deadline = time.monotonic() + timeout
+        with self._cond:
+            while True:
+                if self._closed:
+                    raise RuntimeError("Connection pool is closed")
+                if self._idle:
+                    conn = self._idle.pop()
+                    break
+                if self._size < self.maxconn:
+                    # Reserve the slot, connect outside the lock
+                    self._size += 1
+                    conn = None
+                    break
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self.timeouts.inc()
+                    raise PoolTimeout(f"No database connection free after {timeout:.1f}s "
+                                      f"({self._size} open, all in use)")
+                self._cond.wait(remaining)
+
+        if conn is None:
+            try:
+                conn = self._connect()
+            except Exception:
+                with self._cond:
+                    self._size -= 1
+                    self._cond.notify()
+                raise
+
+        with self._cond:
+            now = time.monotonic()
+            self._in_use[id(conn)] = (conn, now, threading.current_thread().name, False)
+            if now - self._last_leak_check >= self.LEAK_CHECK_SECONDS:
+                self._check_leaks()
+        self.checkouts.inc()
+        self.wait_ms.observe((time.perf_counter() - t0) * 1000.0)
+        return conn
+
+    def putconn(self, conn, close=False):
+        with self._cond:
+            self._in_use.pop(id(conn), None)
+            if close or conn.closed or self._closed:
+                self._size -= 1
+                self.discarded.inc()
+            else:
+                self._idle.append(conn)
+                conn = None
+            self._cond.notify()
+        if conn is not None and not conn.closed:
+            conn.close()
+
+    @contextmanager
+    def connection(self):
+        conn = self.getconn()
+        broken = False
+        try:
+            yield conn
+        except Exception:
+            try:
+                conn.rollback()
+            except Exception:
+                broken = True   # the connection itself failed; do not reuse it
+            raise
+        finally:
+            self.putconn(conn, close=broken)
+
+    def closeall(self):
+        with self._cond:
+            self._closed = True
+            idle, self._idle = list(self._idle), deque()
+            self._size -= len(idle)
+            self._cond.notify_all()
+        for conn in idle:
+            conn.close()
+
+    def check_leaks(self):
+        """Report connections held longer than leak_seconds; returns them."""
+        with self._cond:
+            return self._check_leaks()
+
+    def _check_leaks(self):
+        now = time.monotonic()
+        self._last_leak_check = now
+        held = []
+        for key, (conn, since, thread, reported) in list(self._in_use.items()):
+            age = now - since
+            if age < self.leak_seconds:
+                continue
+            held.append({"thread": thread, "held_seconds": round(age, 1)})
+            if not reported:
+                self._in_use[key] = (conn, since, thread, True)
+                self.leaked.inc()
+                print(f"⚠️ DB connection held {age:.0f}s by thread '{thread}' (possible leak)")
+        return held
+
+    def stats(self):
+        with self._cond:
+            held = self._check_leaks()
+            return {
+                "size": self._size,
+                "max_size": self.maxconn,
+                "in_use": len(self._in_use),
+                "idle": len(self._idle),
+                "checkouts": self.checkouts.value,
+                "timeouts": self.timeouts.value,
+                "discarded": self.discarded.value,
+                "leaked_total": self.leaked.value,
+                "held_too_long": held,
+                "wait_ms": self.wait_ms.snapshot()
+            }
+
+class AsyncPool:
+    """
+    Async front for a ConnectionPool, for `async def` routes.
+
+    psycopg2 is blocking, so connection checkout and the database work run
+    on worker threads; a CapacityLimiter sized to the pool keeps async
+    callers from queueing more threads than there are connections, and the
+    event loop never blocks on a query.
+
+        async with db.async_pool.connection() as run:
+            rows = await run(fetch_rows, user_id)   # fetch_rows(conn, user_id)
+    """
+
+    def __init__(self, pool):
+        self.pool = pool
+        self._limiter = None
+
+    def _get_limiter(self):
+        from anyio import CapacityLimiter
+        if self._limiter is None:
+            self._limiter = CapacityLimiter(self.pool.maxconn)
+        return self._limiter
+
+    @asynccontextmanager
+    async def connection(self):
+        from anyio import to_thread
+        limiter = self._get_limiter()
+        async with limiter:
+            conn = await to_thread.run_sync(self.pool.getconn)
+            broken = False
+
+            async def run(fn, *args):
+                return await to_thread.run_sync(fn, conn, *args)
+
+            try:
+                yield run
+            except Exception:
+                try:
+                    await to_thread.run_sync(conn.rollback)
+                except Exception:
+                    broken = True
+                raise
+            finally:
+                self.pool.putconn(conn, close=broken)
+
+    async def run(self, fn, *args):
+        """Run fn(conn, *args) on a pooled connection and return its result."""
+        async with self.connection() as run:
+            return await run(fn, *args)
@@ -0,0 +1,67 @@
+"""
+Compact encoding of the per-transaction features for COMPACT_STORAGE.
+
+Features are packed as little-endian float32 in a fixed column order (a
+FeatureLayout) and stored as bytea next to the layout version (a CRC32 of
+the names). Names outside the layout stay in the JSONB `features` column,
+so decode returns the same feature names the client sent, but layout
+values come back rounded to float32 (and an explicit NaN reads as
+absent). Layouts are recorded in the feature_layouts table
+(database._register_layouts) so old rows stay decodable after the
+model's feature set changes.
+"""
+import json
+import zlib
+import numpy as np
+
+ENCODING = np.dtype("<f4")
+
+# Layouts created in this process, by version
+LAYOUTS = {}
+
+def layout_version(names):
+    """Stable id of a column order; fits a Postgres INTEGER."""
+    return zlib.crc32("\n".join(names).encode()) & 0x7FFFFFFF
+
+class FeatureLayout:
+    """Ordered feature names; index i of a packed vector is names[i]."""
+
+    def __init__(self, names):
+        self.names = tuple(names)
+        self.version = layout_version(self.names)
+        self.index = {name: i for i, name in enumerate(self.names)}
+        LAYOUTS.setdefault(self.version, self)
+
+    @classmethod
+    def from_scorer(cls, scorer):
+        """The model's input features, minus the meta-features the backend computes."""
+        derived = {scorer.time_step_col, scorer.score_col} | {col for _, col in scorer.rule_cols}
+        return cls(name for i, name in enumerate(scorer.feature_names) if i not in derived)
+
+    def encode(self, features):
+        """(packed float32 bytes, JSON text of names outside the layout or None)."""
+        vec = np.full(len(self.names), np.nan, dtype=ENCODING)
+        extras = {}
+        for name, value in features.items():
+            i = self.index.get(name)
+            if i is None:
+                extras[name] = value
+            else:
+                vec[i] = value
+        return vec.tobytes(), (json.dumps(extras) if extras else None)
+
+    def decode(self, packed, extras=None):
+        """Inverse of encode(): the {name: value} dict (absent features are NaN in the blob)."""
+        vec = np.frombuffer(packed, dtype=ENCODING)
+        present = np.flatnonzero(~np.isnan(vec))
+        features = {self.names[i]: float(vec[i]) for i in present}
+        if extras:
+            features.update(json.loads(extras) if isinstance(extras, str) else extras)
+        return features
+
+    def decode_matrix(self, packed_rows):
+        """Stack many packed rows into an (n, len(names)) float32 matrix (NaN = absent)."""
+        if not packed_rows:
+            return np.empty((0, len(self.names)), dtype=np.float32)
+        return np.frombuffer(b"".join(bytes(p) for p in packed_rows),
+                             dtype=ENCODING).reshape(len(packed_rows), -1).astype(np.float32)
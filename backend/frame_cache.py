@@ -0,0 +1,113 @@
+"""
+Typed, memory-mapped column store for DataFrames: the training-data cache
+of hybrid_pipeline.py and the binary copy of simulation_data.csv.
+
+    <frame>/
+        meta.json       column order, dtype blocks, row count, sources
+        <dtype>.npy     one Fortran-ordered (rows, k) array per dtype
+
+Within a block every column is contiguous, so read_frame() maps the
+blocks (np.load mmap_mode="r") and wraps them in a DataFrame without
+copying; pages are read only for the columns that are used. cached_frame()
+keys a cache entry by the SHA-256 of its source files, so editing a source
+builds a new entry and an unchanged one is never parsed again. File hashes
+are remembered by (size, mtime) in the cache directory's hashes.json.
+"""
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import numpy as np
+import pandas as pd
+from model_registry import file_sha256
+
+def write_frame(path, df, sources=None):
+    """Write the numeric columns of `df` to the directory `path`, replacing it."""
+    blocks = {}
+    for name, dtype in df.dtypes.items():
+        if not (pd.api.types.is_numeric_dtype(dtype) or pd.api.types.is_bool_dtype(dtype)):
+            raise ValueError(f"Column {name!r} has dtype {dtype}; only numeric columns are stored")
+        blocks.setdefault(np.dtype(dtype).name, []).append(name)
+
+    parent = os.path.dirname(os.path.abspath(path))
+    os.makedirs(parent, exist_ok=True)
+    tmp = tempfile.mkdtemp(prefix=".tmp-", dir=parent)
+    os.chmod(tmp, 0o755)
+    try:
+        for dtype, columns in blocks.items():
+            np.save(os.path.join(tmp, f"{dtype}.npy"), np.asfortranarray(df[columns].to_numpy(dtype=dtype)))
+        meta = {
+            "columns": [str(c) for c in df.columns],
+            "blocks": {dtype: [str(c) for c in columns] for dtype, columns in blocks.items()},
+            "rows": len(df),
+            "sources": sources or {}
+        }
+        with open(os.path.join(tmp, "meta.json"), "w") as f:
+            json.dump(meta, f, indent=2)
+        if os.path.exists(path):
+            shutil.rmtree(path)
+        os.replace(tmp, path)
+    except BaseException:
+        shutil.rmtree(tmp, ignore_errors=True)
+        raise
+
+def read_frame(path, columns=None):
+    """DataFrame over the memory-mapped blocks of `path` (all columns, or `columns` in that order)."""
+    with open(os.path.join(path, "meta.json")) as f:
+        meta = json.load(f)
+    wanted = set(columns or meta["columns"])
+    frames = []
+    for dtype, names in meta["blocks"].items():
+        if wanted.intersection(names):
+            block = np.load(os.path.join(path, f"{dtype}.npy"), mmap_mode="r")
+            frames.append(pd.DataFrame(block, columns=names, copy=False))
+    if not frames:
+        raise KeyError(f"None of {sorted(wanted)} are stored in {path}")
+    df = pd.concat(frames, axis=1) if len(frames) > 1 else frames[0]
+    return df[list(columns or meta["columns"])]
+
+def read_table(path, columns=None):
+    """read_frame() for a frame directory, pd.read_csv() otherwise."""
+    if os.path.isdir(path):
+        return read_frame(path, columns)
+    return pd.read_csv(path, usecols=columns)
+
+def _file_hashes(paths, cache_dir):
+    """SHA-256 per source, rehashing only files whose size or mtime changed."""
+    memo_path = os.path.join(cache_dir, "hashes.json")
+    try:
+        with open(memo_path) as f:
+            memo = json.load(f)
+    except (FileNotFoundError, ValueError):
+        memo = {}
+
+    hashes, changed = {}, False
+    for path in paths:
+        st = os.stat(path)
+        key, stamp = os.path.abspath(path), [st.st_size, st.st_mtime_ns]
+        if memo.get(key, {}).get("stamp") != stamp:
+            memo[key] = {"stamp": stamp, "sha256": file_sha256(path)}
+            changed = True
+        hashes[path] = memo[key]["sha256"]
+
+    if changed:
+        os.makedirs(cache_dir, exist_ok=True)
+        with open(memo_path + ".tmp", "w") as f:
+            json.dump(memo, f, indent=2)
+        os.replace(memo_path + ".tmp", memo_path)
+    return hashes
+
+def cached_frame(sources, build, cache_dir, columns=None, version=""):
+    """
+    Frame for the files `sources` from cache_dir/<hash of their contents>,
+    calling build() and writing it there first on a miss. Change `version`
+    when build() changes its output (e.g. column dtypes) to skip old entries.
+    """
+    hashes = _file_hashes(sources, cache_dir)
+    key = hashlib.sha256((version + "".join(hashes[p] for p in sources)).encode()).hexdigest()[:16]
+    path = os.path.join(cache_dir, key)
+    if not os.path.exists(os.path.join(path, "meta.json")):
+        print(f"Cache miss: parsing {', '.join(os.path.basename(p) for p in sources)} into {path} ...")
+        write_frame(path, build(), {os.path.basename(p): h for p, h in hashes.items()})
+    return read_frame(path, columns)
@@ -0,0 +1,72 @@
+import contextvars
+import functools
+import time
+from metrics import REGISTRY, STAGE_BUCKETS, stage_timer
+
+# Set per request by the middleware; the endpoint (running in a worker
+# thread with a copy of the context) appends its own duration to the list
+_handler_seconds = contextvars.ContextVar("handler_seconds", default=None)
+
+def timed_handler(fn):
+    """Record a sync endpoint's own run time for RequestMetricsMiddleware."""
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs):
+        t0 = time.perf_counter()
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            slot = _handler_seconds.get()
+            if slot is not None:
+                slot.append(time.perf_counter() - t0)
+    return wrapper
+
+class RequestMetricsMiddleware:
+    """
+    Pure ASGI middleware (no per-request task or body copy, unlike
+    BaseHTTPMiddleware) recording request counts and latency per route
+    template, method and status class.
+
+    For endpoints wrapped in timed_handler, the rest of the request (body
+    parsing, pydantic validation, waiting for a worker thread, response
+    serialization) is recorded as the "framework" stage of that route.
+    """
+
+    def __init__(self, app, stage_routes=None):
+        self.app = app
+        # route path -> stage-histogram route label, e.g. {"/transactions": "single"}
+        self.stage_routes = stage_routes or {}
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        t0 = time.perf_counter()
+        status = 500
+        handler = []
+        _handler_seconds.set(handler)
+
+        async def send_wrapper(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            elapsed = time.perf_counter() - t0
+            route = scope.get("route")
+            path = getattr(route, "path", "unmatched")
+            labels = {"method": scope["method"], "path": path}
+            code = f"{status // 100}xx"
+
+            REGISTRY.counter("http_requests_total", "HTTP requests", status=code, **labels).inc()
+            if status >= 500:
+                REGISTRY.counter("http_request_errors_total", "HTTP requests answered with 5xx", **labels).inc()
+            REGISTRY.histogram("http_request_duration_seconds", "End-to-end request latency",
+                               STAGE_BUCKETS, **labels).observe(elapsed)
+
+            stage_route = self.stage_routes.get(path)
+            if handler and stage_route is not None:
+                stage_timer("framework", stage_route).observe(max(elapsed - handler[0], 0.0))
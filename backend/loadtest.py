@@ -0,0 +1,332 @@
+"""
+Load generator for the backend: replays simulation_data.csv rows (in
+time_step order, cycling) against POST /transactions or /transactions/batch.
+
+Each step runs an open-loop schedule at a target rate: requests are due at
+fixed intervals whether or not earlier ones have finished, and latency is
+measured from the due time, so queueing behind a saturated server shows
+up in the percentiles instead of silently lowering the offered load.
+--rates 0 runs closed-loop (every worker sends back-to-back).
+
+Without --url a local server is started with STORAGE_BACKEND=memory (or
+--storage sqlite), so no PostgreSQL is needed.
+
+    python loadtest.py --rates 100,200,400,800 --duration 10 --out run.json
+    python loadtest.py --mode batch --batch-size 50 --rates 10,20,40
+    python loadtest.py --url http://127.0.0.1:8000 --rates 0 --concurrency 64
+    python loadtest.py --rates 200,400 --compare run.json
+"""
+import argparse
+import csv
+import http.client
+import json
+import os
+import queue
+import subprocess
+import sys
+import threading
+import time
+import urllib.parse
+import urllib.request
+import uuid
+
+import numpy as np
+
+from script_utils import HERE, child_env, free_port, http_status
+
+DEFAULT_CSV = os.path.join(HERE, "..", "simulation_data.csv")
+
+class Replay:
+    """
+    simulation_data.csv rows (or the simulation_data/ frame directory) as
+    request bodies; tx_ids are unique per run and cycle.
+    """
+
+    def __init__(self, path, mode="single", batch_size=50, users=1000):
+        if os.path.isdir(path):
+            from frame_cache import read_frame
+            rows = read_frame(path).to_dict("records")
+        else:
+            with open(path, newline="") as f:
+                rows = list(csv.DictReader(f))
+        rows.sort(key=lambda r: int(float(r["time_step"])))   # stable: file order within a step
+        self.rows = [
+            (int(float(r["time_step"])),
+             {k: float(v) for k, v in r.items() if k.startswith("feat_") and v != ""})
+            for r in rows
+        ]
+        self.mode = mode
+        self.batch_size = batch_size
+        self.users = users
+        self.run_id = uuid.uuid4().hex[:8]
+        self.path = "/transactions" if mode == "single" else "/transactions/batch"
+
+    def _tx(self, i):
+        time_step, features = self.rows[i % len(self.rows)]
+        return {"user_id": i % self.users, "tx_id": f"lt-{self.run_id}-{i}",
+                "time_step": time_step, "features": features}
+
+    def body(self, n):
+        """JSON body of the n-th request."""
+        if self.mode == "single":
+            return json.dumps(self._tx(n)).encode()
+        start = n * self.batch_size
+        return json.dumps({"transactions": [self._tx(i) for i in range(start, start + self.batch_size)]}).encode()
+
+def _percentiles(values_ms):
+    if not values_ms:
+        return None
+    arr = np.asarray(values_ms)
+    return {
+        "p50": float(np.percentile(arr, 50)),
+        "p95": float(np.percentile(arr, 95)),
+        "p99": float(np.percentile(arr, 99)),
+        "max": float(arr.max()),
+        "mean": float(arr.mean())
+    }
+
+def run_step(base_url, replay, rate, duration, concurrency, start_index=0, timeout=30.0):
+    """
+    One load step. rate > 0: open loop at `rate` requests/s; rate == 0:
+    closed loop. Returns (result dict, next request index).
+    """
+    url = urllib.parse.urlparse(base_url)
+    work = queue.Queue()
+    lock = threading.Lock()
+    latencies, service, errors = [], [], {}
+    counts = {"sent": 0, "completed": 0, "dropped": 0}
+    stop_at = time.perf_counter() + duration
+    next_index = [start_index]
+
+    def take():
+        with lock:
+            n = next_index[0]
+            next_index[0] += 1
+            return n
+
+    def worker():
+        conn = http.client.HTTPConnection(url.hostname, url.port, timeout=timeout)
+        while True:
+            if rate > 0:
+                item = work.get()
+                if item is None:
+                    break
+                due, n = item
+                if time.perf_counter() >= stop_at:
+                    with lock:
+                        counts["dropped"] += 1      # never sent: the server fell behind
+                    continue
+            else:
+                if time.perf_counter() >= stop_at:
+                    break
+                due, n = time.perf_counter(), take()
+
+            started = time.perf_counter()
+            error = None
+            try:
+                conn.request("POST", replay.path, body=replay.body(n),
+                             headers={"Content-Type": "application/json"})
+                resp = conn.getresponse()
+                resp.read()
+                if resp.status >= 400:
+                    error = f"HTTP {resp.status}"
+            except Exception as e:
+                error = type(e).__name__
+                conn.close()
+                conn = http.client.HTTPConnection(url.hostname, url.port, timeout=timeout)
+            done = time.perf_counter()
+
+            with lock:
+                counts["sent"] += 1
+                if error is None:
+                    counts["completed"] += 1
+                    latencies.append((done - due) * 1000.0)
+                    service.append((done - started) * 1000.0)
+                else:
+                    errors[error] = errors.get(error, 0) + 1
+        conn.close()
+
+    threads = [threading.Thread(target=worker, daemon=True) for _ in range(concurrency)]
+    t0 = time.perf_counter()
+    for t in threads:
+        t.start()
+
+    if rate > 0:
+        interval = 1.0 / rate
+        k = 0
+        while True:
+            due = t0 + k * interval
+            if due >= stop_at:
+                break
+            delay = due - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            work.put((due, take()))
+            k += 1
+        for _ in threads:
+            work.put(None)
+
+    for t in threads:
+        t.join()
+    elapsed = max(time.perf_counter() - t0, 1e-9)
+
+    sent = counts["sent"]
+    rows_per_request = 1 if replay.mode == "single" else replay.batch_size
+    result = {
+        "target_rps": rate or None,
+        "duration_s": elapsed,
+        "sent": sent,
+        "completed": counts["completed"],
+        "dropped": counts["dropped"],
+        "errors": errors,
+        "error_rate": (sent - counts["completed"]) / sent if sent else 0.0,
+        "achieved_rps": counts["completed"] / elapsed,
+        "transactions_per_sec": counts["completed"] * rows_per_request / elapsed,
+        "latency_ms": _percentiles(latencies),
+        "service_ms": _percentiles(service)
+    }
+    return result, next_index[0]
+
+def _sustained(step, slo_ms, max_error_rate):
+    if not step["latency_ms"] or step["error_rate"] > max_error_rate:
+        return False
+    if step["target_rps"] and step["achieved_rps"] < 0.95 * step["target_rps"]:
+        return False
+    return step["latency_ms"]["p99"] <= slo_ms
+
+def stage_means(base_url):
+    """Mean ms per fraud_stage_duration_seconds{stage,route} from the server's /metrics."""
+    try:
+        with urllib.request.urlopen(base_url + "/metrics", timeout=5) as resp:
+            text = resp.read().decode()
+    except Exception:
+        return {}
+    sums, counts = {}, {}
+    for line in text.splitlines():
+        for suffix, into in (("_sum", sums), ("_count", counts)):
+            prefix = "fraud_stage_duration_seconds" + suffix + "{"
+            if line.startswith(prefix):
+                labels, value = line[len(prefix):].rsplit("} ", 1)
+                into[labels] = float(value)
+    return {labels: round(sums[labels] / n * 1000.0, 3) for labels, n in counts.items() if n}
+
+def start_server(storage, workers, extra_env=None, timeout=120.0):
+    """Launch uvicorn on a free port with a database-free store; returns (process, base_url)."""
+    port = free_port()
+    base = f"http://127.0.0.1:{port}"
+    env = {"STORAGE_BACKEND": storage, **(extra_env or {})}
+    proc = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app:app", "--port", str(port),
+         "--workers", str(workers), "--log-level", "warning"],
+        cwd=HERE, env=child_env(env), stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    t0 = time.perf_counter()
+    while time.perf_counter() - t0 < timeout:
+        if proc.poll() is not None:
+            raise SystemExit(f"Backend exited with code {proc.returncode}")
+        try:
+            if http_status(base + "/ready", timeout=1.0) == 200:
+                return proc, base
+        except OSError:
+            pass
+        time.sleep(0.1)
+    proc.terminate()
+    raise SystemExit("Backend did not become ready")
+
+def _print_step(step, ok):
+    lat = step["latency_ms"] or {}
+    target = f"{step['target_rps']:.0f}" if step["target_rps"] else "max"
+    print(f"  target {target:>6} req/s -> {step['achieved_rps']:8.1f} req/s "
+          f"({step['transactions_per_sec']:8.1f} tx/s)  "
+          f"p50 {lat.get('p50', 0):7.1f}  p95 {lat.get('p95', 0):7.1f}  p99 {lat.get('p99', 0):7.1f} ms  "
+          f"errors {step['error_rate']:.2%}  dropped {step['dropped']}  {'ok' if ok else 'SATURATED'}")
+
+def compare(report, baseline_path):
+    with open(baseline_path) as f:
+        base = json.load(f)
+    by_rate = {s["target_rps"]: s for s in base["steps"]}
+    print(f"\nCompared with {baseline_path}:")
+    for step in report["steps"]:
+        old = by_rate.get(step["target_rps"])
+        if not old or not old["latency_ms"] or not step["latency_ms"]:
+            continue
+        print(f"  target {step['target_rps'] or 'max'}: "
+              f"achieved {old['achieved_rps']:.1f} -> {step['achieved_rps']:.1f} req/s, "
+              f"p99 {old['latency_ms']['p99']:.1f} -> {step['latency_ms']['p99']:.1f} ms")
+    print(f"  saturation: {base['saturation']['max_sustained_rps']} -> "
+          f"{report['saturation']['max_sustained_rps']} req/s")
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay simulation_data.csv against the backend.")
+    parser.add_argument("--url", default=None, help="Running backend (default: start one locally)")
+    parser.add_argument("--csv", default=DEFAULT_CSV, help="simulation_data.csv or the simulation_data/ directory")
+    parser.add_argument("--mode", choices=["single", "batch"], default="single")
+    parser.add_argument("--batch-size", type=int, default=50)
+    parser.add_argument("--concurrency", type=int, default=32, help="Client connections")
+    parser.add_argument("--rates", default="50,100,200,400,800",
+                        help="Comma-separated target requests/s per step (0 = closed loop)")
+    parser.add_argument("--duration", type=float, default=10.0, help="Seconds per step")
+    parser.add_argument("--warmup", type=float, default=2.0, help="Closed-loop seconds before measuring")
+    parser.add_argument("--slo-ms", type=float, default=250.0, help="p99 above this counts as saturated")
+    parser.add_argument("--max-error-rate", type=float, default=0.01)
+    parser.add_argument("--storage", choices=["memory", "sqlite"], default="memory",
+                        help="Store of the locally started backend")
+    parser.add_argument("--server-workers", type=int, default=1)
+    parser.add_argument("--out", default=None, help="Write the results as JSON")
+    parser.add_argument("--compare", default=None, help="Earlier --out file to compare against")
+    args = parser.parse_args()
+
+    replay = Replay(args.csv, args.mode, args.batch_size)
+    proc = None
+    base_url = args.url
+    if base_url is None:
+        proc, base_url = start_server(args.storage, args.server_workers)
+        print(f"Started backend at {base_url} (STORAGE_BACKEND={args.storage})")
+
+    try:
+        index = 0
+        if args.warmup > 0:
+            _, index = run_step(base_url, replay, 0, args.warmup, min(args.concurrency, 4))
+
+        print(f"Replaying {len(replay.rows)} rows from {args.csv} ({args.mode} requests, "
+              f"{args.concurrency} connections, {args.duration:.0f}s per step)")
+        steps, saturation = [], None
+        for rate in (float(r) for r in args.rates.split(",")):
+            step, index = run_step(base_url, replay, rate, args.duration, args.concurrency, index)
+            ok = _sustained(step, args.slo_ms, args.max_error_rate)
+            step["sustained"] = ok
+            steps.append(step)
+            _print_step(step, ok)
+            if not ok and saturation is None:
+                saturation = step
+
+        sustained = [s for s in steps if s["sustained"]]
+        report = {
+            "config": {k: v for k, v in vars(args).items() if k not in ("out", "compare")},
+            "url": base_url,
+            "rows": len(replay.rows),
+            "steps": steps,
+            "saturation": {
+                "max_sustained_rps": max((s["achieved_rps"] for s in sustained), default=None),
+                "first_saturated_target_rps": saturation["target_rps"] if saturation else None
+            },
+            "server_stage_mean_ms": stage_means(base_url)
+        }
+    finally:
+        if proc is not None:
+            proc.terminate()
+            proc.wait(timeout=10)
+
+    sat = report["saturation"]
+    print(f"\nMax sustained: {sat['max_sustained_rps'] and round(sat['max_sustained_rps'], 1)} req/s; "
+          f"saturated at target: {sat['first_saturated_target_rps'] or 'not reached'}")
+
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"Results written to {args.out}")
+    if args.compare:
+        compare(report, args.compare)
+
+if __name__ == "__main__":
+    main()
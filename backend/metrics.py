@@ -0,0 +1,145 @@
+import bisect
+import threading
+
+class Counter:
+    """Monotonic counter, safe to increment from any thread."""
+
+    def __init__(self):
+        self._value = 0
+        self._lock = threading.Lock()
+
+    def inc(self, n=1):
+        with self._lock:
+            self._value += n
+
+    @property
+    def value(self):
+        return self._value
+
+class Histogram:
+    """
+    Fixed-bucket histogram (Prometheus style: counts are cumulative per
+    upper bound). observe() is safe to call from any thread.
+    """
+
+    def __init__(self, buckets):
+        self.buckets = tuple(sorted(buckets))
+        self._counts = [0] * (len(self.buckets) + 1)   # last slot is +Inf
+        self._sum = 0.0
+        self._count = 0
+        self._lock = threading.Lock()
+
+    def observe(self, value):
+        i = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            self._counts[i] += 1
+            self._sum += value
+            self._count += 1
+
+    def snapshot(self):
+        with self._lock:
+            counts = list(self._counts)
+            total, count = self._sum, self._count
+
+        cumulative, running = {}, 0
+        for le, c in zip(self.buckets + ("+Inf",), counts):
+            running += c
+            cumulative[str(le)] = running
+
+        return {
+            "buckets": cumulative,
+            "count": count,
+            "sum": total,
+            "mean": total / count if count else 0.0
+        }
+
+# --- Prometheus exposition ---
+def _fmt(value):
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+def _labels(labels, extra=None):
+    items = list(labels) + (list(extra.items()) if extra else [])
+    if not items:
+        return ""
+    return "{" + ",".join(f'{k}="{v}"' for k, v in items) + "}"
+
+class Registry:
+    """
+    Named metrics rendered in the Prometheus text format (counter names
+    end in _total). counter() and
+    histogram() return the existing metric for a repeated name + labels, so
+    callers can fetch labelled children on the hot path. Gauges are
+    callables sampled at scrape time; register_* adds metrics owned by
+    other components (`scale` converts e.g. ms histograms to seconds; a
+    callable `hist` is resolved at scrape time, None skips it).
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._families = {}     # name -> (type, help, {labels: metric})
+
+    def _get(self, kind, name, help_text, labels, factory):
+        key = tuple(sorted(labels.items()))
+        family = self._families.get(name)
+        if family is not None:
+            metric = family[2].get(key)
+            if metric is not None:
+                return metric
+        with self._lock:
+            family = self._families.setdefault(name, (kind, help_text, {}))
+            return family[2].setdefault(key, factory())
+
+    def counter(self, name, help_text, **labels):
+        return self._get("counter", name, help_text, labels, Counter)
+
+    def histogram(self, name, help_text, buckets, **labels):
+        return self._get("histogram", name, help_text, labels, lambda: Histogram(buckets))
+
+    def gauge(self, name, help_text, fn, **labels):
+        self._get("gauge", name, help_text, labels, lambda: fn)
+
+    def register_counter(self, name, help_text, fn, **labels):
+        """A counter whose value some other object keeps; fn() returns it."""
+        self._get("counter", name, help_text, labels, lambda: fn)
+
+    def register_histogram(self, name, help_text, hist, scale=1.0, **labels):
+        self._get("histogram", name, help_text, labels, lambda: (hist, scale))
+
+    def render(self):
+        lines = []
+        for name, (kind, help_text, children) in sorted(self._families.items()):
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {kind}")
+            for key, metric in list(children.items()):
+                if kind == "histogram":
+                    hist, scale = metric if isinstance(metric, tuple) else (metric, 1.0)
+                    if callable(hist):
+                        hist = hist()
+                    if hist is None:
+                        continue
+                    snap = hist.snapshot()
+                    for le, count in snap["buckets"].items():
+                        bound = float("inf") if le == "+Inf" else float(le) * scale
+                        lines.append(f"{name}_bucket{_labels(key, {'le': _fmt(bound)})} {count}")
+                    lines.append(f"{name}_sum{_labels(key)} {_fmt(snap['sum'] * scale)}")
+                    lines.append(f"{name}_count{_labels(key)} {snap['count']}")
+                else:
+                    value = metric.value if isinstance(metric, Counter) else metric()
+                    if value is None:
+                        continue
+                    lines.append(f"{name}{_labels(key)} {_fmt(value)}")
+        return "\n".join(lines) + "\n"
+
+REGISTRY = Registry()
+
+# Per-stage latency of the scoring path, in seconds
+STAGE_BUCKETS = (0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005,
+                 0.01, 0.025, 0.05, 0.1, 0.25, 1.0)
+
+def stage_timer(stage, route):
+    return REGISTRY.histogram(
+        "fraud_stage_duration_seconds", "Time spent per scoring stage",
+        STAGE_BUCKETS, stage=stage, route=route
+    )
@@ -1,19 +1,273 @@
-import xgboost as xgb
+import threading
+import time
+import numpy as np
 import os
-from config import MODEL_PATH  
+from config import MODEL_PATH, MODEL_BACKEND, FAST_START, WARMUP_ITERATIONS, WARMUP_BATCH_SIZE
+from config import MODEL_REGISTRY_DIR, MODEL_VERSION, GRAPH_PATH, USER_STATE_ENABLED
+from model_registry import ModelRegistry, file_sha256, verify_artifact
 
-def load_model():
-    if not os.path.exists(MODEL_PATH):
-        print(f"⚠️ WARNING: Model file '{MODEL_PATH}' not found. App will run but predictions will fail.")
+def load_model(path=MODEL_PATH):
+    import xgboost as xgb
+
+    if not os.path.exists(path):
+        print(f"⚠️ WARNING: Model file '{path}' not found. App will run but predictions will fail.")
         return xgb.XGBClassifier()
         
     try:
+        verify_artifact(path)
         model = xgb.XGBClassifier()
-        model.load_model(MODEL_PATH)
-        print(f"✅ Model loaded from {MODEL_PATH}")
+        model.load_model(path)   # .json or binary .ubj
+        print(f"✅ Model loaded from {path}")
         return model
     except Exception as e:
         print(f"❌ Error loading model: {e}")
         return xgb.XGBClassifier()
 
-model = load_model()
\ No newline at end of file
+def load_tree_ensemble(path=MODEL_PATH):
+    """Load a .json dump or .npz artifact into the pure-NumPy evaluator (no xgboost import)."""
+    from tree_model import TreeEnsemble
+
+    if not os.path.exists(path):
+        print(f"⚠️ WARNING: Model file '{path}' not found. App will run but predictions will fail.")
+        return None
+
+    try:
+        verify_artifact(path)
+        if path.endswith(".npz"):
+            ensemble = TreeEnsemble.load(path)
+        else:
+            ensemble = TreeEnsemble.from_json(path)
+        print(f"✅ Model loaded from {path} (numpy tree evaluator, {ensemble.n_trees} trees)")
+        return ensemble
+    except Exception as e:
+        print(f"❌ Error loading model: {e}")
+        return None
+
+class ScoringModel:
+    """
+    A loaded model plus its input layout, computed once at load time:
+    feature-name order, name -> column index map, and per-thread float32
+    row buffers that requests scatter their features into.
+
+    `predict_fn` maps an (n, n_features) float32 matrix to n probabilities;
+    None means no usable model, so predict() raises and callers fall back.
+    `prefix_fn(X, n_trees)` scores with only the first n trees (cascade tier).
+    """
+
+    def __init__(self, predict_fn, feature_names, prefix_fn=None):
+        self.predict_fn = predict_fn
+        self.prefix_fn = prefix_fn
+        self.feature_names = list(feature_names or [])
+        self.feature_index = {name: i for i, name in enumerate(self.feature_names)}
+        self.n_features = len(self.feature_names)
+
+        # Columns of the meta-features hybrid_predict fills in (skipped if absent)
+        self.time_step_col = self.feature_index.get("time_step")
+        self.rule_cols = [
+            (bit, self.feature_index[f"R{bit + 1}_Fired"])
+            for bit in range(7) if f"R{bit + 1}_Fired" in self.feature_index
+        ]
+        self.score_col = self.feature_index.get("Total_Rule_Score")
+
+        # Registry version (content hash) and metadata, set by the loader
+        self.version = None
+        self.meta = {}
+
+        self._local = threading.local()
+
+    def row(self):
+        """Zeroed (1, n_features) float32 buffer, reused per thread."""
+        buf = getattr(self._local, "row", None)
+        if buf is None:
+            buf = self._local.row = np.zeros((1, self.n_features), dtype=np.float32)
+        else:
+            buf.fill(0)
+        return buf
+
+    def predict(self, X):
+        """P(illicit) for each row of a float32 matrix in feature_names order."""
+        if self.predict_fn is None or not self.n_features:
+            raise RuntimeError("model is not loaded or has no feature names")
+        return self.predict_fn(X)
+
+    def predict_prefix(self, X, n_trees):
+        """Cheap approximation of predict() using the first n_trees trees."""
+        if self.prefix_fn is None or not self.n_features:
+            raise RuntimeError("model does not support prefix prediction")
+        return self.prefix_fn(X, n_trees)
+
+    def warmup(self, iterations=WARMUP_ITERATIONS, batch_size=WARMUP_BATCH_SIZE):
+        """Run throwaway predictions so the first real request pays no lazy-init cost."""
+        if self.predict_fn is None or not self.n_features:
+            return 0.0
+        t0 = time.perf_counter()
+        X = np.zeros((batch_size, self.n_features), dtype=np.float32)
+        for _ in range(iterations):
+            self.predict(self.row())
+            self.predict(X)
+            if self.prefix_fn is not None:
+                self.predict_prefix(self.row(), 1)
+        return time.perf_counter() - t0
+
+    @classmethod
+    def from_xgboost(cls, clf):
+        try:
+            booster = clf.get_booster()
+        except Exception:
+            # Unfitted fallback model
+            return cls(None, [])
+        return cls(
+            lambda X: booster.inplace_predict(X, validate_features=False),
+            booster.feature_names,
+            lambda X, n: booster.inplace_predict(X, iteration_range=(0, n), validate_features=False)
+        )
+
+    @classmethod
+    def from_tree_ensemble(cls, ensemble):
+        if ensemble is None:
+            return cls(None, [])
+        return cls(ensemble.predict, ensemble.feature_names, ensemble.predict)
+
+# --- Model state ---
+# Until initialize() runs, `scorer` has no model: predictions raise and
+# hybrid_predict falls back; the API gates requests on `ready`.
+# Request paths read `scorer` once, so swap_model() can replace it while
+# they run.
+scorer = ScoringModel(None, [])
+ready = threading.Event()
+startup_timings = {}
+registry = ModelRegistry(MODEL_REGISTRY_DIR)
+
+_swap_lock = threading.Lock()
+swap_status = {"state": "idle"}
+
+def load_scorer(path, version=None, meta=None, threads=None):
+    """
+    Load `path` with MODEL_BACKEND; predict_fn is None if loading failed.
+    `threads` caps xgboost's prediction threads (the numpy evaluator uses one).
+    """
+    if MODEL_BACKEND == "numpy":
+        new_scorer = ScoringModel.from_tree_ensemble(load_tree_ensemble(path))
+    else:
+        clf = load_model(path)
+        if threads:
+            clf.set_params(n_jobs=threads)
+        new_scorer = ScoringModel.from_xgboost(clf)
+    new_scorer.version, new_scorer.meta = version, meta or {}
+    return new_scorer
+
+def check_inputs(scorer):
+    """
+    Raise ValueError if `scorer` was trained on features that only a disabled
+    serving component computes: nbr_* (GRAPH_PATH) and user_*
+    (USER_STATE_ENABLED) would be 0 on every request, unlike in training.
+    """
+    for prefix, setting, enabled in (("nbr_", "GRAPH_PATH", GRAPH_PATH),
+                                     ("user_", "USER_STATE_ENABLED", USER_STATE_ENABLED)):
+        expected = [f for f in scorer.feature_names if f.startswith(prefix)]
+        if expected and not enabled:
+            raise ValueError(f"model {scorer.version} expects {len(expected)} {prefix}* features "
+                             f"({expected[0]}, ...) but {setting} is not set; they would all be 0")
+
+def _startup_model():
+    """(path, version, meta): MODEL_VERSION, else the registry's active version, else MODEL_PATH."""
+    version = MODEL_VERSION or registry.active()
+    if version:
+        try:
+            return registry.artifact_path(version), version, registry.get(version)
+        except KeyError as e:
+            print(f"⚠️ {e}; falling back to {MODEL_PATH}")
+    # Unregistered file: same content-hash version it would get in the registry
+    version = file_sha256(MODEL_PATH)[:12] if os.path.exists(MODEL_PATH) else None
+    return MODEL_PATH, version, {}
+
+def initialize():
+    """Load the configured model, warm it up, then set `ready`. Raises if check_inputs() fails."""
+    global scorer
+
+    t0 = time.perf_counter()
+    new_scorer = load_scorer(*_startup_model())
+    check_inputs(new_scorer)
+    t1 = time.perf_counter()
+    warmup_s = new_scorer.warmup()
+
+    scorer = new_scorer
+    startup_timings.update(load_seconds=t1 - t0, warmup_seconds=warmup_s)
+    ready.set()
+    print(f"Model {new_scorer.version} ready (load {t1 - t0:.3f}s, warmup {warmup_s:.3f}s).")
+
+def swap_model(version):
+    """
+    Load and warm registry `version` on the calling thread, then replace
+    `scorer` with it in one assignment and make it the startup version.
+    In-flight requests finish on the model they started with; nothing
+    waits on the load. Raises, keeping the current model, if the version
+    is unknown, does not load or fails check_inputs().
+    """
+    global scorer
+    if not _swap_lock.acquire(blocking=False):
+        raise RuntimeError(f"a swap to {swap_status.get('target')} is already in progress")
+    try:
+        swap_status.clear()
+        swap_status.update(state="loading", target=version, started_at=time.time())
+        meta = registry.get(version)
+
+        t0 = time.perf_counter()
+        new_scorer = load_scorer(registry.artifact_path(version), version, meta)
+        if new_scorer.predict_fn is None or not new_scorer.n_features:
+            raise ValueError(f"model {version} did not load")
+        check_inputs(new_scorer)
+        t1 = time.perf_counter()
+        warmup_s = new_scorer.warmup()
+
+        old, scorer = scorer, new_scorer
+        registry.set_active(version)
+        swap_status.update(state="done", previous=old.version, finished_at=time.time(),
+                           load_seconds=t1 - t0, warmup_seconds=warmup_s)
+        print(f"✅ Model swapped {old.version} -> {version} (load {t1 - t0:.3f}s, warmup {warmup_s:.3f}s).")
+        return new_scorer
+    except Exception as e:
+        swap_status.update(state="failed", error=str(e), finished_at=time.time())
+        print(f"❌ Model swap to {version} failed, keeping {scorer.version}: {e}")
+        raise
+    finally:
+        _swap_lock.release()
+
+def swap_in_progress():
+    return _swap_lock.locked()
+
+# Default: load at import like before. FAST_START leaves it to a background
+# thread started by the API so the server accepts connections immediately.
+if not FAST_START:
+    initialize()
+
+def convert(json_path, out_dir=None):
+    """Write .ubj (xgboost) and .npz (numpy evaluator) artifacts plus .sha256 sidecars."""
+    import xgboost as xgb
+    from tree_model import TreeEnsemble
+
+    stem = os.path.splitext(os.path.basename(json_path))[0]
+    out_dir = out_dir or os.path.dirname(json_path) or "."
+
+    booster = xgb.Booster()
+    booster.load_model(json_path)
+    ubj_path = os.path.join(out_dir, stem + ".ubj")
+    booster.save_model(ubj_path)
+
+    npz_path = os.path.join(out_dir, stem + ".npz")
+    TreeEnsemble.from_json(json_path).save(npz_path)
+
+    for path in (ubj_path, npz_path):
+        with open(path + ".sha256", "w") as f:
+            f.write(f"{file_sha256(path)}  {os.path.basename(path)}\n")
+        print(f"Wrote {path} ({os.path.getsize(path) / 1024:.0f} KiB) + .sha256")
+    return ubj_path, npz_path
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Convert a JSON model into fast-loading binary artifacts.")
+    parser.add_argument("model", help="XGBoost JSON model")
+    parser.add_argument("--out-dir", default=None)
+    args = parser.parse_args()
+    convert(args.model, args.out_dir)
@@ -0,0 +1,182 @@
+"""
+Local registry of model artifacts, addressed by content hash.
+
+    model_registry/
+        ACTIVE                      version the backend loads at startup
+        <version>/model.json        the artifact (.json, .ubj or .npz)
+        <version>/meta.json         feature names, training split, metrics, ...
+
+A version is the first 12 hex digits of the artifact's SHA-256, so
+registering the same file twice is a no-op and a version always means the
+same bytes. Entries are written to a temporary directory and renamed into
+place, and ACTIVE is replaced atomically, so a reader never sees a partial
+entry.
+
+    python model_registry.py register elliptic_xgb_hybrid_model.json --split 34 --metric auprc=0.81
+    python model_registry.py list
+    python model_registry.py activate <version>
+"""
+import datetime
+import hashlib
+import json
+import os
+import re
+import shutil
+import tempfile
+
+ARTIFACT_TYPES = (".json", ".ubj", ".npz")
+# A version is the first 12 hex digits of the artifact's SHA-256
+VERSION_RE = re.compile(r"[0-9a-f]{12}")
+
+def file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+def verify_artifact(path):
+    """
+    Check `path` against its `<path>.sha256` sidecar, if one exists.
+    Raises ValueError on mismatch so a corrupt or swapped file is never served.
+    """
+    sidecar = path + ".sha256"
+    if not os.path.exists(sidecar):
+        return None
+
+    with open(sidecar) as f:
+        expected = f.read().split()[0].strip().lower()
+    actual = file_sha256(path)
+    if actual != expected:
+        raise ValueError(f"content hash mismatch for {path}: expected {expected}, got {actual}")
+    return actual
+
+def _feature_names(path):
+    if path.endswith(".npz"):
+        from tree_model import TreeEnsemble
+        return list(TreeEnsemble.load(path).feature_names)
+    import xgboost as xgb
+    booster = xgb.Booster()
+    booster.load_model(path)
+    return list(booster.feature_names or [])
+
+class ModelRegistry:
+    def __init__(self, root):
+        self.root = root
+
+    def _dir(self, version):
+        # Only well-formed versions reach the filesystem (no "../", no paths)
+        if not isinstance(version, str) or not VERSION_RE.fullmatch(version):
+            raise KeyError(f"Unknown model version {version!r}")
+        return os.path.join(self.root, version)
+
+    def register(self, path, train_split=None, metrics=None, notes=None, feature_names=None):
+        """Copy `path` into the registry and return its metadata (existing entry if already registered)."""
+        ext = os.path.splitext(path)[1]
+        if ext not in ARTIFACT_TYPES:
+            raise ValueError(f"Unsupported model artifact {path!r} (expected {', '.join(ARTIFACT_TYPES)})")
+        verify_artifact(path)
+        sha256 = file_sha256(path)
+        version = sha256[:12]
+        if os.path.exists(self._dir(version)):
+            return self.get(version)
+
+        meta = {
+            "version": version,
+            "sha256": sha256,
+            "artifact": "model" + ext,
+            "source": os.path.abspath(path),
+            "registered_at": datetime.datetime.now(datetime.timezone.utc).isoformat(timespec="seconds"),
+            "feature_names": list(feature_names) if feature_names is not None else _feature_names(path),
+            "train_split_time_step": train_split,
+            "metrics": metrics or {},
+            "notes": notes
+        }
+        os.makedirs(self.root, exist_ok=True)
+        tmp = tempfile.mkdtemp(prefix=".tmp-", dir=self.root)
+        try:
+            os.chmod(tmp, 0o755)    # mkdtemp creates it owner-only
+            shutil.copyfile(path, os.path.join(tmp, meta["artifact"]))
+            with open(os.path.join(tmp, "meta.json"), "w") as f:
+                json.dump(meta, f, indent=2)
+            os.rename(tmp, self._dir(version))
+        except OSError:
+            shutil.rmtree(tmp, ignore_errors=True)
+            if not os.path.exists(self._dir(version)):     # lost a race with the same file: fine
+                raise
+        print(f"✅ Registered model {version} ({len(meta['feature_names'])} features) from {path}")
+        return meta
+
+    def get(self, version):
+        try:
+            with open(os.path.join(self._dir(version), "meta.json")) as f:
+                return json.load(f)
+        except (FileNotFoundError, NotADirectoryError):
+            raise KeyError(f"Unknown model version {version!r}") from None
+
+    def artifact_path(self, version):
+        return os.path.join(self._dir(version), self.get(version)["artifact"])
+
+    def versions(self):
+        """Metadata of every registered version, newest first."""
+        if not os.path.isdir(self.root):
+            return []
+        entries = [self.get(name) for name in os.listdir(self.root)
+                   if VERSION_RE.fullmatch(name) and os.path.exists(os.path.join(self.root, name, "meta.json"))]
+        return sorted(entries, key=lambda meta: meta["registered_at"], reverse=True)
+
+    def active(self):
+        try:
+            with open(os.path.join(self.root, "ACTIVE")) as f:
+                return f.read().strip() or None
+        except FileNotFoundError:
+            return None
+
+    def set_active(self, version):
+        self.get(version)   # must exist
+        os.makedirs(self.root, exist_ok=True)
+        tmp = os.path.join(self.root, ".ACTIVE.tmp")
+        with open(tmp, "w") as f:
+            f.write(version + "\n")
+        os.replace(tmp, os.path.join(self.root, "ACTIVE"))
+
+def _parse_metrics(pairs):
+    metrics = {}
+    for pair in pairs or ():
+        name, _, value = pair.partition("=")
+        metrics[name] = float(value)
+    return metrics
+
+if __name__ == "__main__":
+    import argparse
+    import config
+
+    parser = argparse.ArgumentParser(description="Manage the local model registry.")
+    parser.add_argument("--root", default=config.MODEL_REGISTRY_DIR)
+    sub = parser.add_subparsers(dest="command", required=True)
+    reg = sub.add_parser("register", help="Add a model artifact")
+    reg.add_argument("model")
+    reg.add_argument("--split", type=int, default=None, help="Last training time_step")
+    reg.add_argument("--metric", action="append", help="name=value, repeatable")
+    reg.add_argument("--notes", default=None)
+    reg.add_argument("--activate", action="store_true", help="Also make it the startup version")
+    sub.add_parser("list", help="Registered versions, newest first")
+    act = sub.add_parser("activate", help="Set the version loaded at startup")
+    act.add_argument("version")
+    args = parser.parse_args()
+
+    registry = ModelRegistry(args.root)
+    if args.command == "register":
+        meta = registry.register(args.model, args.split, _parse_metrics(args.metric), args.notes)
+        if args.activate:
+            registry.set_active(meta["version"])
+        print(json.dumps({k: v for k, v in meta.items() if k != "feature_names"}, indent=2))
+    elif args.command == "list":
+        active = registry.active()
+        for meta in registry.versions():
+            mark = "*" if meta["version"] == active else " "
+            print(f"{mark} {meta['version']}  {meta['registered_at']}  split={meta['train_split_time_step']}  "
+                  f"{json.dumps(meta['metrics'])}  {meta['artifact']}")
+    else:
+        registry.set_active(args.version)
+        print(f"Active model: {args.version} (loaded at the next start; POST /admin/model/swap to switch now)")
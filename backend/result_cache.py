@@ -0,0 +1,105 @@
+import hashlib
+import json
+import threading
+import time
+from collections import OrderedDict
+from metrics import Counter
+
+# Rough per-entry bookkeeping cost (key tuple, OrderedDict node, timestamps)
+ENTRY_OVERHEAD_BYTES = 256
+
+def request_hash(user_id, time_step, features, parents=None):
+    """Stable digest of everything that affects a decision besides tx_id."""
+    body = {"user_id": user_id, "time_step": time_step, "features": features}
+    if parents:
+        body["parents"] = parents       # omitted when absent: digests of older requests are unchanged
+    payload = json.dumps(body, sort_keys=True, separators=(",", ":"))
+    return hashlib.blake2b(payload.encode(), digest_size=16).hexdigest()
+
+class ResultCache:
+    """
+    Bounded in-process cache of decisions keyed by (tx_id, request_hash).
+
+    Entries expire `ttl_seconds` after insertion; when either `max_entries`
+    or `max_bytes` (estimated from the JSON size of the value) would be
+    exceeded, least recently used entries are evicted first.
+    """
+
+    def __init__(self, max_entries=100000, ttl_seconds=600.0, max_bytes=64 * 1024 * 1024):
+        self.max_entries = max_entries
+        self.ttl = ttl_seconds
+        self.max_bytes = max_bytes
+
+        self._data = OrderedDict()   # key -> (expires_at, size, value)
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+        self.hits = Counter()
+        self.misses = Counter()
+        self.evictions = Counter()
+        self.expirations = Counter()
+
+    def __len__(self):
+        return len(self._data)
+
+    @property
+    def enabled(self):
+        return self.max_entries > 0 and self.max_bytes > 0
+
+    def get(self, key):
+        if not self.enabled:
+            return None
+        now = time.monotonic()
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                self.misses.inc()
+                return None
+            if entry[0] <= now:
+                self._drop(key)
+                self.expirations.inc()
+                self.misses.inc()
+                return None
+            self._data.move_to_end(key)
+        self.hits.inc()
+        return entry[2]
+
+    def put(self, key, value):
+        if not self.enabled:
+            return
+        size = len(json.dumps(value, default=str)) + ENTRY_OVERHEAD_BYTES
+        if size > self.max_bytes:
+            return
+        expires = time.monotonic() + self.ttl
+        with self._lock:
+            if key in self._data:
+                self._drop(key)
+            self._data[key] = (expires, size, value)
+            self._bytes += size
+            while len(self._data) > self.max_entries or self._bytes > self.max_bytes:
+                oldest = next(iter(self._data))
+                if self._data[oldest][0] <= time.monotonic():
+                    self.expirations.inc()
+                else:
+                    self.evictions.inc()
+                self._drop(oldest)
+
+    def _drop(self, key):
+        _, size, _ = self._data.pop(key)
+        self._bytes -= size
+
+    def stats(self):
+        hits, misses = self.hits.value, self.misses.value
+        return {
+            "enabled": self.enabled,
+            "entries": len(self._data),
+            "bytes": self._bytes,
+            "max_entries": self.max_entries,
+            "max_bytes": self.max_bytes,
+            "ttl_seconds": self.ttl,
+            "hits": hits,
+            "misses": misses,
+            "hit_ratio": hits / (hits + misses) if hits + misses else 0.0,
+            "evictions": self.evictions.value,
+            "expirations": self.expirations.value
+        }
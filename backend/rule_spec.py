@@ -0,0 +1,172 @@
+"""
+Compiler for the declarative rule file (rules.yaml).
+
+A RuleSet is compiled once from the spec into a flat list of NumPy
+comparisons; evaluate() then runs every rule over whole columns and
+returns (Total_Rule_Score, fired bitmask) per row, the same contract as
+the hand-written engine it replaced. Standalone (NumPy and PyYAML only) so
+the training pipeline and the dashboard pages can import it too.
+"""
+import copy
+import hashlib
+import json
+import operator
+import os
+import numpy as np
+
+DEFAULT_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "rules.yaml")
+
+# Apply NumPy's comparison to arrays and NumPy scalars alike, so evaluate()
+# and evaluate_row() share one table (and one kernel, RuleSet._masks)
+OPS = {
+    ">": operator.gt, ">=": operator.ge,
+    "<": operator.lt, "<=": operator.le,
+    "==": operator.eq, "!=": operator.ne
+}
+MAX_RULES = 8       # fired masks are uint8
+
+class RuleSet:
+    """
+    Compiled rules. Attributes: names, labels, weights, thresholds (by
+    rule name), inputs (the raw features evaluate() reads), defaults,
+    score_table (Total_Rule_Score of each of the 2^n firing patterns) and
+    version (hash of the spec).
+    """
+
+    def __init__(self, spec, source=None):
+        self.spec = copy.deepcopy(spec)
+        self.source = source
+        self.version = hashlib.sha256(
+            json.dumps(self.spec, sort_keys=True).encode()
+        ).hexdigest()[:12]
+
+        rules = spec.get("rules") or []
+        if not 1 <= len(rules) <= MAX_RULES:
+            raise ValueError(f"A rule file needs 1 to {MAX_RULES} rules, got {len(rules)}")
+        self.defaults = {name: float(v) for name, v in (spec.get("defaults") or {}).items()}
+
+        self._derived = []
+        for name, d in (spec.get("derived") or {}).items():
+            if set(d) - {"ratio", "epsilon"} or len(d.get("ratio") or ()) != 2:
+                raise ValueError(f"Derived value {name!r}: expected ratio: [numerator, denominator]"
+                                 " and an optional epsilon")
+            num, den = d["ratio"]
+            self._derived.append((name, num, den, float(d.get("epsilon", 0.0))))
+        derived = {name for name, *_ in self._derived}
+
+        names, labels, weights, checks, inputs = [], [], [], [], []
+        for bit, rule in enumerate(rules):
+            name = rule.get("name")
+            where = f"Rule {bit + 1} ({name})"
+            if not name or name in names:
+                raise ValueError(f"{where}: missing or duplicate name")
+            if rule.get("op") not in OPS:
+                raise ValueError(f"{where}: op must be one of {' '.join(OPS)}")
+            if not isinstance(rule.get("weight"), int) or not isinstance(rule.get("threshold"), (int, float)):
+                raise ValueError(f"{where}: needs an integer weight and a numeric threshold")
+            unless = 0
+            for other in rule.get("unless") or ():
+                if other not in names:
+                    raise ValueError(f"{where}: unless {other!r} is not an earlier rule")
+                unless |= 1 << names.index(other)
+            feature = rule.get("feature")
+            if not feature:
+                raise ValueError(f"{where}: missing feature")
+            if feature not in derived:
+                inputs.append(feature)
+
+            names.append(name)
+            labels.append(rule.get("label", name))
+            weights.append(rule["weight"])
+            checks.append((bit, feature, rule["op"], float(rule["threshold"]), unless))
+
+        for _, num, den, _ in self._derived:
+            inputs += [num, den]
+
+        self.names = tuple(names)
+        self.labels = tuple(labels)
+        self.weights = np.array(weights, dtype=np.int64)
+        self.thresholds = {rule["name"]: rule["threshold"] for rule in rules}
+        self.inputs = tuple(dict.fromkeys(inputs))
+        self.bits = np.arange(len(names), dtype=np.uint8)
+        self.score_table = ((np.arange(1 << len(names))[:, None] >> self.bits) & 1) @ self.weights
+        self._checks = [(bit, f, OPS[op], th, unless) for bit, f, op, th, unless in checks]
+        self._scores = self.score_table.tolist()
+
+    def _masks(self, values):
+        """
+        The rules themselves: fired bitmask(s) from `values` (input name ->
+        float64 1-D array for evaluate(), NumPy float64 scalar for
+        evaluate_row()). Both get the same arithmetic (x/0 -> +-inf,
+        0/0 -> NaN, NaN compares false except !=).
+        """
+        for name, num, den, eps in self._derived:
+            values[name] = values[num] / (values[den] + eps)
+
+        masks = np.uint8(0)
+        for bit, feature, op, threshold, unless in self._checks:
+            fired = op(values[feature], threshold)
+            if unless:
+                fired &= (masks & unless) == 0
+            masks = masks | (fired.astype(np.uint8) << bit)
+        return masks
+
+    def evaluate(self, columns):
+        """
+        (scores, masks) for `columns`, a mapping of feature name -> 1-D array
+        or scalar (a dict or DataFrame). Missing features take `defaults`.
+        """
+        values = {}
+        for name in self.inputs:
+            value = columns[name] if name in columns else self.defaults.get(name, 0.0)
+            values[name] = np.asarray(value, dtype=float)
+        masks = self._masks(values)
+        return self.score_table[masks], masks
+
+    def evaluate_row(self, features, time_step):
+        """
+        evaluate() for one transaction (a feature dict): the same kernel on
+        NumPy scalars, which skips the per-call array overhead. Returns
+        (score, mask) ints.
+        """
+        values = {"time_step": np.float64(time_step)}
+        for name in self.inputs:
+            if name != "time_step":
+                values[name] = np.float64(features.get(name, self.defaults.get(name, 0.0)))
+        mask = int(self._masks(values))
+        return self._scores[mask], mask
+
+    def mask_to_columns(self, masks):
+        """Expand uint8 masks into an (N, n_rules) 0/1 matrix in rule order."""
+        return (np.asarray(masks, dtype=np.uint8)[..., None] >> self.bits) & 1
+
+    def mask_to_fired(self, mask):
+        mask = int(mask)
+        return {name: (mask >> bit) & 1 for bit, name in enumerate(self.names)}
+
+    def fired_to_mask(self, fired):
+        return sum(1 << bit for bit, name in enumerate(self.names) if fired.get(name))
+
+    def with_overrides(self, thresholds=None, weights=None):
+        """A new RuleSet with some rules' thresholds and/or weights replaced (by rule name)."""
+        spec = copy.deepcopy(self.spec)
+        for rule in spec["rules"]:
+            if thresholds and rule["name"] in thresholds:
+                rule["threshold"] = thresholds[rule["name"]]
+            if weights and rule["name"] in weights:
+                rule["weight"] = int(weights[rule["name"]])
+        return RuleSet(spec, self.source)
+
+    def describe(self):
+        return {"version": self.version, "source": self.source, "rules": self.spec["rules"],
+                "derived": self.spec.get("derived") or {}, "defaults": self.defaults}
+
+def load_rules(path=None):
+    """Read and compile a rule file (rules.yaml next to this module by default)."""
+    import yaml
+    path = path or DEFAULT_PATH
+    with open(path) as f:
+        spec = yaml.safe_load(f)
+    if not isinstance(spec, dict):
+        raise ValueError(f"{path}: expected a mapping with a `rules` list")
+    return RuleSet(spec, source=path)
@@ -1,89 +1,402 @@
-import pandas as pd
+import os
+import threading
+import time
 import numpy as np
 from config import *
-from model_loader import model
+from rule_spec import load_rules
+from metrics import Counter, stage_timer
+from user_state import UserVelocityStore
+from tx_graph import TxGraph
+from feature_store import FeatureStore
+import model_loader
+from model_registry import file_sha256
+
+# --- Rule Engine (compiled from RULES_PATH, see rules.yaml) ---
+# Rule i fires -> bit i of the uint8 mask (R1 = bit 0 ... R7 = bit 6)
+ruleset = load_rules(RULES_PATH)
+_reload_lock = threading.Lock()
+
+def reload_rules(path=None):
+    """
+    Recompile the rule file and swap it in atomically: every evaluation
+    reads `ruleset` once, so a request sees either the old or the new rules.
+    Rule names and order must not change (they are the model's R*_Fired
+    features and the stored fired_mask bits). An invalid file raises and
+    the current rules stay in place.
+    """
+    global ruleset
+    with _reload_lock:
+        new = load_rules(path or RULES_PATH)
+        if new.names != ruleset.names:
+            raise ValueError(f"Rule names changed ({', '.join(ruleset.names)} -> "
+                             f"{', '.join(new.names)}); restart with a retrained model instead")
+        old, ruleset = ruleset, new
+    if new.version != old.version:
+        print(f"✅ Rules reloaded from {new.source} (version {old.version} -> {new.version})")
+    return new
+
+def watch_rules(interval):
+    """Thread body: reload RULES_PATH whenever its modification time changes."""
+    last = os.path.getmtime(RULES_PATH)
+    while True:
+        time.sleep(interval)
+        try:
+            mtime = os.path.getmtime(RULES_PATH)
+            if mtime != last:
+                last = mtime
+                reload_rules()
+        except Exception as e:
+            print(f"⚠️ Rule reload failed, keeping version {ruleset.version}: {e}")
+
+def evaluate_rules_batch(columns):
+    """
+    Vectorized rules over `columns` (feature name -> NumPy array or scalar,
+    including "time_step"). Returns (scores, masks): Total_Rule_Score per
+    row and a uint8 bitmask of fired rules per row.
+    """
+    return ruleset.evaluate(columns)
+
+def mask_to_columns(masks):
+    """Expand uint8 masks into an (N, 7) 0/1 matrix in R1..R7 order."""
+    return ruleset.mask_to_columns(masks)
+
+def mask_to_fired(mask):
+    """Decode one bitmask into the {"R1": 0/1, ...} dict used in responses."""
+    return ruleset.mask_to_fired(mask)
+
+def fired_to_mask(fired):
+    """Inverse of mask_to_fired: {"R1": 0/1, ...} -> bitmask (R1 = bit 0)."""
+    return ruleset.fired_to_mask(fired)
 
 def evaluate_rules(feat, tstep):
-    # Safe get with defaults
-    f3   = feat.get("feat_3", 0)
-    f4   = feat.get("feat_4", 0)
-    f10  = feat.get("feat_10", 0)
-    f15  = feat.get("feat_15", 0)
-    f20  = feat.get("feat_20", 1)
-    f100 = feat.get("feat_100", 0)
-
-    # --- Rule Logic ---
-    R1 = int(f3 > TH_HIGH_VALUE)
-    R2 = int(f4 <= TH_ZERO_FEE)
-    R3 = int(tstep <= TH_EARLY_STEP)
-    R4 = int(f3 < TH_LOW_VALUE and R1 == 0)
-    R5 = int(f100 > TH_AGGREGATE)
-    R6 = int(f10 > TH_VELOCITY)
-    R7 = int((f15 / (f20 + 1e-6)) > TH_STRUCTURAL)
-
-    fired = {
-        "R1": R1, "R2": R2, "R3": R3, "R4": R4,
-        "R5": R5, "R6": R6, "R7": R7
+    # Missing features take the rule file's defaults
+    rs = ruleset
+    score, mask = rs.evaluate_row(feat, tstep)
+    return score, rs.mask_to_fired(mask)
+
+# --- Cascade (rules first, ML only when needed) ---
+TIER_RULES, TIER_FAST, TIER_MODEL, TIER_FALLBACK = "rules", "fast_model", "model", "fallback"
+tier_counts = {tier: Counter() for tier in (TIER_RULES, TIER_FAST, TIER_MODEL, TIER_FALLBACK)}
+# Decisions the rule tier alone could settle, counted in every CASCADE_MODE
+rule_decidable = Counter()
+
+# Per-stage latency histograms (exported on /metrics)
+STAGES = {
+    route: {stage: stage_timer(stage, route) for stage in ("feature_store", "user_state", "graph", "rules", "features", "model")}
+    for route in ("single", "batch")
+}
+
+# --- Online feature store (feature_store.py) ---
+# Requests for a stored tx_id are scored on the full precomputed vector
+# instead of zeros for every column the request leaves out
+feature_store = FeatureStore(FEATURE_STORE_PATH) if FEATURE_STORE_PATH else None
+
+# --- Per-user velocity state (user_state.py) ---
+# Adds user_tx_count, user_amount_sum and user_step_count to each request's
+# features, so rules (rules.yaml) and models trained with them can use them
+user_state = (UserVelocityStore(USER_STATE_WINDOW, USER_STATE_MAX_USERS, USER_STATE_SEEN_TX)
+              if USER_STATE_ENABLED else None)
+
+def _with_velocity(features, user_id, time_step, tx_id=None):
+    # tx_id: a retry of an already recorded transaction is not counted again
+    return {**features, **user_state.observe(
+        user_id, int(time_step), features.get(USER_STATE_AMOUNT_FEATURE, 0.0), tx_id
+    )}
+
+# --- Transaction graph (tx_graph.py) ---
+# Each scored transaction is added with edges from its parents and gets its
+# nbr_* neighbor features, the columns graph-trained models expect
+def load_graph():
+    """GRAPH_SNAPSHOT if it extends the current GRAPH_PATH, else GRAPH_PATH."""
+    source = file_sha256(GRAPH_PATH)
+    if GRAPH_SNAPSHOT and os.path.exists(GRAPH_SNAPSHOT):
+        graph = TxGraph.load(GRAPH_SNAPSHOT, GRAPH_COMPACT_EDGES, GRAPH_MAX_NODES)
+        if graph.source == source:
+            print(f"Graph: restored {len(graph)} nodes from {GRAPH_SNAPSHOT}")
+            return graph
+        print(f"⚠️ Graph snapshot {GRAPH_SNAPSHOT} extends a different GRAPH_PATH; starting from {GRAPH_PATH}.")
+    graph = TxGraph.load(GRAPH_PATH, GRAPH_COMPACT_EDGES, GRAPH_MAX_NODES)
+    graph.source = source
+    return graph
+
+tx_graph = load_graph() if GRAPH_PATH else None
+
+def _with_neighbors(features, tx_id, parents):
+    return {**features, **tx_graph.add_transaction(tx_id, features, parents)}
+
+def enrich_features(features, time_step, user_id=None, tx_id=None, parents=None):
+    """
+    The features a transaction is scored on: its stored vector
+    (FEATURE_STORE_PATH) overlaid with the request's features, plus the
+    user's velocity features (USER_STATE_ENABLED) and its graph neighbor
+    features (GRAPH_PATH). Records the transaction in the velocity state
+    and the graph, so call it once per request.
+    """
+    stages = STAGES["single"]
+    t0 = time.perf_counter()
+    if feature_store is not None and tx_id is not None:
+        features = feature_store.merge(tx_id, features)
+        t = time.perf_counter()
+        stages["feature_store"].observe(t - t0)
+        t0 = t
+    if user_state is not None and user_id is not None:
+        features = _with_velocity(features, user_id, time_step, tx_id)
+        t = time.perf_counter()
+        stages["user_state"].observe(t - t0)
+        t0 = t
+    if tx_graph is not None and tx_id is not None:
+        features = _with_neighbors(features, tx_id, parents)
+        stages["graph"].observe(time.perf_counter() - t0)
+    return features
+
+def enrich_features_batch(features_list, time_steps, user_ids=None, tx_ids=None, parents_list=None):
+    """enrich_features for N transactions (velocity recorded in input order)."""
+    n = len(features_list)
+    stages = STAGES["batch"]
+    t0 = time.perf_counter()
+    if feature_store is not None and tx_ids is not None:
+        features_list = [feature_store.merge(tx_id, f) for f, tx_id in zip(features_list, tx_ids)]
+        t = time.perf_counter()
+        stages["feature_store"].observe(t - t0)
+        t0 = t
+    if user_state is not None and user_ids is not None:
+        features_list = [_with_velocity(f, u, ts, tx_id) for f, u, ts, tx_id
+                         in zip(features_list, user_ids, time_steps, tx_ids or [None] * n)]
+        t = time.perf_counter()
+        stages["user_state"].observe(t - t0)
+        t0 = t
+    if tx_graph is not None and tx_ids is not None:
+        parents_list = parents_list or [None] * n
+        features_list = [_with_neighbors(f, tx_id, p) for f, tx_id, p in zip(features_list, tx_ids, parents_list)]
+        stages["graph"].observe(time.perf_counter() - t0)
+    return features_list
+
+def cascade_stats():
+    """Decisions per tier and the share of full-model calls avoided."""
+    counts = {tier: c.value for tier, c in tier_counts.items()}
+    total = sum(counts.values())
+    avoided = counts[TIER_RULES] + counts[TIER_FAST]
+    return {
+        "mode": CASCADE_MODE,
+        "decisions": total,
+        "by_tier": counts,
+        "model_calls_avoided_fraction": avoided / total if total else 0.0,
+        "rule_decidable_fraction": rule_decidable.value / total if total else 0.0
     }
 
-    total = (
-        R1 * W_R1 + 
-        R2 * W_R2 + 
-        R3 * W_R3 + 
-        R4 * W_R4 +
-        R5 * W_R5 + 
-        R6 * W_R6 + 
-        R7 * W_R7
-    )
-    
-    return total, fired
+def _fast_tier(scorer, X):
+    """Prefix-tree probabilities, NaN where the cheap tier is not confident."""
+    p = np.asarray(scorer.predict_prefix(X, CASCADE_FAST_TREES), dtype=float)
+    return np.where((p <= CASCADE_FAST_LOW) | (p >= CASCADE_FAST_HIGH), p, np.nan)
 
-def hybrid_predict(features, time_step):
+def hybrid_predict(features, time_step, predict=None, scorer=None, user_id=None,
+                   tx_id=None, parents=None):
     """
+    0. enrich_features: stored vector, velocity and graph neighbor features
+       (callers that already enriched `features` omit the ids)
     1. Run Rule Engine
     2. Construct Full Feature Vector (Features + Rules)
-    3. Run ML Model
+    3. Run ML Model (cheap tier first in "rules+fast" cascade mode)
+
+    `predict` optionally replaces the direct booster call (e.g. the
+    micro-batcher); it takes a (1, n_features) float32 matrix. `scorer`
+    pins the model (default: the one loaded now).
+    Returns (ml_prob, rule_score, fired_rules, is_fraud, decided_by);
+    ml_prob is None when the cascade skipped the model.
     """
+    stages = STAGES["single"]
+
+    # 0. Stored vector and streaming per-user state, in process (no DB round trip)
+    features = enrich_features(features, time_step, user_id, tx_id, parents)
+    t0 = time.perf_counter()
+
     # 1. Run Rule Engine FIRST
     rule_score, fired_rules = evaluate_rules(features, time_step)
+    rules_reject = rule_score >= RULE_THRESHOLD
+    t1 = time.perf_counter()
+    stages["rules"].observe(t1 - t0)
+    if rules_reject:
+        rule_decidable.inc()
+
+    # Rule tier: the OR in the final decision makes the ML score irrelevant
+    if rules_reject and CASCADE_MODE != "off":
+        tier_counts[TIER_RULES].inc()
+        return None, rule_score, fired_rules, True, TIER_RULES
 
     # 2. Prepare ML Input
     try:
-        # Start with the input features
-        input_data = features.copy()
-        input_data['time_step'] = time_step
-        
-        # Add the Rule Features (Model likely trained on these names)
-        for r_key, val in fired_rules.items():
-            input_data[f"{r_key}_Fired"] = val  # e.g., "R1_Fired"
-            
-        input_data['Total_Rule_Score'] = rule_score
-
-        # Convert to DataFrame
-        df_input = pd.DataFrame([input_data])
-
-        # --- CRITICAL FIX: Align columns with Model ---
-        # Get the list of columns the model was actually trained on
-        booster = model.get_booster()
-        expected_cols = booster.feature_names
-        
-        if expected_cols:
-            # Reindex ensures we have exactly the right columns in the right order.
-            # Missing columns (like feat_0, feat_1, etc.) are filled with 0.
-            df_final = df_input.reindex(columns=expected_cols, fill_value=0)
-        else:
-            # Fallback if feature names aren't saved in model
-            df_final = df_input
+        scorer = scorer or model_loader.scorer
+
+        # Scatter the request straight into the model's row layout.
+        # Features the model was not trained on are ignored; missing ones stay 0.
+        row = scorer.row()
+        index = scorer.feature_index
+        for name, val in features.items():
+            col = index.get(name)
+            if col is not None:
+                row[0, col] = val
+
+        if scorer.time_step_col is not None:
+            row[0, scorer.time_step_col] = time_step
+        for bit, col in scorer.rule_cols:
+            row[0, col] = fired_rules[ruleset.names[bit]]
+        if scorer.score_col is not None:
+            row[0, scorer.score_col] = rule_score
+        t2 = time.perf_counter()
+        stages["features"].observe(t2 - t1)
 
         # 3. ML Prediction
-        ml_prob = float(model.predict_proba(df_final)[:, 1][0])
-        
+        ml_prob, decided_by = float("nan"), TIER_MODEL
+        if CASCADE_MODE == "rules+fast":
+            try:
+                ml_prob, decided_by = float(_fast_tier(scorer, row)[0]), TIER_FAST
+            except Exception as e:
+                print(f"⚠️ Fast tier failed (using full model): {e}")
+        if np.isnan(ml_prob):
+            ml_prob, decided_by = float((predict or scorer.predict)(row)[0]), TIER_MODEL
+        stages["model"].observe(time.perf_counter() - t2)
+
     except Exception as e:
         print(f"⚠️ ML Prediction Failed (Using Fallback): {e}")
         # If ML fails (e.g. shape mismatch), fallback to just rules
-        ml_prob = 0.0
+        ml_prob, decided_by = 0.0, TIER_FALLBACK
+
+    tier_counts[decided_by].inc()
 
     # 4. Final Decision
-    is_fraud = (ml_prob >= ML_THRESHOLD) or (rule_score >= RULE_THRESHOLD)
+    is_fraud = (ml_prob >= ML_THRESHOLD) or rules_reject
+
+    return ml_prob, rule_score, fired_rules, is_fraud, decided_by
+
+def _column(features_list, name, default):
+    # Same defaults as evaluate_rules for features a client did not send
+    return np.fromiter(
+        (f.get(name, default) for f in features_list), dtype=float, count=len(features_list)
+    )
+
+def _fill_meta_features(X, scorer, tsteps, masks, rule_scores):
+    # time_step, R*_Fired and Total_Rule_Score columns of an N-row model matrix
+    if scorer.time_step_col is not None:
+        X[:, scorer.time_step_col] = tsteps
+    rule_cols = mask_to_columns(masks)
+    for bit, col in scorer.rule_cols:
+        X[:, col] = rule_cols[:, bit]
+    if scorer.score_col is not None:
+        X[:, scorer.score_col] = rule_scores
+
+def model_matrix(scorer, features_list, tsteps, masks, rule_scores):
+    """(N, n_features) float32 input for `scorer`: request features plus rule meta-features."""
+    index = scorer.feature_index
+    X = np.zeros((len(features_list), scorer.n_features), dtype=np.float32)
+    for i, features in enumerate(features_list):
+        for name, val in features.items():
+            col = index.get(name)
+            if col is not None:
+                X[i, col] = val
+    _fill_meta_features(X, scorer, tsteps, masks, rule_scores)
+    return X
+
+def hybrid_predict_batch(features_list, time_steps, scorer=None, user_ids=None,
+                         tx_ids=None, parents_list=None):
+    """
+    Vectorized hybrid_predict for N transactions.
+    Rules and the ML model each run once over an N-row matrix; in cascade
+    mode the model only sees the rows the earlier tiers left undecided.
+    Returns (ml_probs, rule_scores, fired_list, is_fraud, decided_by) in
+    input order; ml_probs is NaN where the model was skipped.
+    `tx_ids`, `user_ids` and `parents_list` are passed to
+    enrich_features_batch (omit them for already enriched features).
+    """
+    n = len(features_list)
+    tsteps = np.asarray(time_steps, dtype=float)
+    stages = STAGES["batch"]
+
+    # 0. Stored feature vectors and streaming per-user state
+    features_list = enrich_features_batch(features_list, time_steps, user_ids, tx_ids, parents_list)
+    t0 = time.perf_counter()
+
+    # 1. Rule Engine over columns
+    rs = ruleset
+    columns = {name: _column(features_list, name, rs.defaults.get(name, 0)) for name in rs.inputs}
+    columns["time_step"] = tsteps
+    rule_scores, masks = rs.evaluate(columns)
+    rules_reject = rule_scores >= RULE_THRESHOLD
+    rule_decidable.inc(int(rules_reject.sum()))
+    t1 = time.perf_counter()
+    stages["rules"].observe(t1 - t0)
+
+    ml_probs = np.full(n, np.nan)
+    decided_by = np.full(n, TIER_MODEL, dtype=object)
+    if CASCADE_MODE != "off":
+        decided_by[rules_reject] = TIER_RULES
+        pending = np.flatnonzero(~rules_reject)
+    else:
+        pending = np.arange(n)
+
+    # 2. Prepare ML Input (same layout as hybrid_predict)
+    try:
+        scorer = scorer or model_loader.scorer
+        X = model_matrix(scorer, [features_list[i] for i in pending],
+                         tsteps[pending], masks[pending], rule_scores[pending])
+        t2 = time.perf_counter()
+        stages["features"].observe(t2 - t1)
+
+        # 3. ML Prediction (cheap tier, then one full-model call for the rest)
+        if CASCADE_MODE == "rules+fast" and len(pending):
+            try:
+                fast = _fast_tier(scorer, X)
+                sure = ~np.isnan(fast)
+                ml_probs[pending[sure]] = fast[sure]
+                decided_by[pending[sure]] = TIER_FAST
+                X, pending = X[~sure], pending[~sure]
+            except Exception as e:
+                print(f"⚠️ Fast tier failed (using full model): {e}")
+
+        if len(pending):
+            ml_probs[pending] = scorer.predict(X)
+        stages["model"].observe(time.perf_counter() - t2)
+
+    except Exception as e:
+        print(f"⚠️ Batch ML Prediction Failed (Using Fallback): {e}")
+        ml_probs[pending] = 0.0
+        decided_by[pending] = TIER_FALLBACK
+
+    for tier in tier_counts:
+        tier_counts[tier].inc(int((decided_by == tier).sum()))
+
+    # 4. Final Decision (NaN >= threshold is False, so skipped rows rely on the rules)
+    is_fraud = (ml_probs >= ML_THRESHOLD) | rules_reject
+
+    fired_list = [mask_to_fired(m) for m in masks]
+    return ml_probs, rule_scores, fired_list, is_fraud, decided_by.tolist()
+
+def hybrid_predict_columns(columns):
+    """
+    Columnar hybrid scoring for offline bulk jobs.
+    `columns` maps feature name -> 1-D array (a DataFrame works) and must
+    contain "time_step". Unlike the request path, ML errors propagate.
+    Returns (ml_probs, rule_scores, masks, is_fraud).
+    """
+    tsteps = np.asarray(columns["time_step"], dtype=float)
+    n = len(tsteps)
+
+    def col(name, default):
+        if name not in columns:
+            return np.full(n, default, dtype=float)
+        return np.nan_to_num(np.asarray(columns[name], dtype=float), nan=default)
+
+    rs = ruleset
+    rule_columns = {name: col(name, rs.defaults.get(name, 0)) for name in rs.inputs}
+    rule_columns["time_step"] = tsteps
+    rule_scores, masks = rs.evaluate(rule_columns)
+
+    scorer = model_loader.scorer
+    X = np.zeros((n, scorer.n_features), dtype=np.float32)
+    for name, col_idx in scorer.feature_index.items():
+        if name in columns:
+            X[:, col_idx] = columns[name]
+    _fill_meta_features(X, scorer, tsteps, masks, rule_scores)
 
-    return ml_prob, rule_score, fired_rules, is_fraud
+    ml_probs = scorer.predict(X).astype(float)
+    is_fraud = (ml_probs >= ML_THRESHOLD) | (rule_scores >= RULE_THRESHOLD)
+    return ml_probs, rule_scores, masks, is_fraud
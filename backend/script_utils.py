@@ -0,0 +1,32 @@
+"""
+Helpers shared by the scripts that launch and probe a local backend
+(startup_report.py, loadtest.py).
+"""
+import json
+import os
+import socket
+import urllib.error
+import urllib.request
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+def child_env(overrides):
+    """os.environ with `overrides` applied, for a child process."""
+    env = dict(os.environ)
+    env.update(overrides)
+    return env
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+def http_status(url, body=None, timeout=5.0):
+    """Status code of a GET (or a JSON POST when `body` is given)."""
+    data = json.dumps(body).encode() if body is not None else None
+    req = urllib.request.Request(url, data=data, headers={"Content-Type": "application/json"})
+    try:
+        with urllib.request.urlopen(req, timeout=timeout) as resp:
+            return resp.status
+    except urllib.error.HTTPError as e:
+        return e.code
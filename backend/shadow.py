@@ -0,0 +1,242 @@
+"""
+Shadow scoring: challenger models score copies of live requests off the
+request path, and their results are compared with the champion's.
+
+submit() is a non-blocking put on a bounded queue; when the queue is full
+the copy is dropped and counted, so the champion never waits on a
+challenger. Background workers drain the queue in batches, score each
+batch with one predict call per challenger (xgboost capped at one thread
+per worker) and store every challenger score next to the champion
+decision through the storage backend.
+"""
+import math
+import os
+import queue
+import random
+import threading
+import time
+import numpy as np
+from config import ML_THRESHOLD, RULE_THRESHOLD
+from metrics import Counter, Histogram
+from rules import model_matrix
+
+ABS_DELTA_BUCKETS = (0.001, 0.01, 0.05, 0.1, 0.2, 0.3, 0.5, 0.75, 1.0)
+
+class Challenger:
+    """A challenger model and its running comparison with the champion."""
+
+    def __init__(self, scorer):
+        self.scorer = scorer
+        self.version = scorer.version
+
+        self.scored = Counter()
+        self.flagged = Counter()
+        self.decision_agreements = Counter()
+        self.model_compared = Counter()      # rows where the champion model ran too
+        self.model_agreements = Counter()
+        self.delta_sum = Counter()
+        self.abs_delta = Histogram(ABS_DELTA_BUCKETS)
+        self.cpu_seconds = Counter()
+        self.errors = Counter()
+
+    def record(self, probs, fraud, champion_probs, champion_fraud):
+        self.scored.inc(len(probs))
+        self.flagged.inc(int(fraud.sum()))
+        self.decision_agreements.inc(int((fraud == champion_fraud).sum()))
+
+        ran = ~np.isnan(champion_probs)
+        if ran.any():
+            ours, theirs = probs[ran], champion_probs[ran]
+            self.model_compared.inc(int(ran.sum()))
+            self.model_agreements.inc(int(((ours >= ML_THRESHOLD) == (theirs >= ML_THRESHOLD)).sum()))
+            delta = ours - theirs
+            self.delta_sum.inc(float(delta.sum()))
+            for d in np.abs(delta):
+                self.abs_delta.observe(float(d))
+
+    def stats(self):
+        scored, compared = self.scored.value, self.model_compared.value
+        return {
+            "version": self.version,
+            "meta": {k: v for k, v in self.scorer.meta.items() if k != "feature_names"},
+            "scored": scored,
+            "errors": self.errors.value,
+            "flag_rate": self.flagged.value / scored if scored else 0.0,
+            "decision_agreement": self.decision_agreements.value / scored if scored else None,
+            "model_agreement": self.model_agreements.value / compared if compared else None,
+            "mean_delta": self.delta_sum.value / compared if compared else None,
+            "abs_delta": self.abs_delta.snapshot(),
+            "cpu_seconds": self.cpu_seconds.value,
+            "cpu_us_per_row": self.cpu_seconds.value / scored * 1e6 if scored else None
+        }
+
+def load_challengers(specs, threads=1):
+    """Challengers for SHADOW_MODELS entries (registry versions or artifact paths); bad ones are skipped."""
+    import model_loader
+    from model_registry import file_sha256
+
+    challengers = []
+    for spec in specs:
+        try:
+            path, version, meta = model_loader.registry.artifact_path(spec), spec, model_loader.registry.get(spec)
+        except KeyError:
+            if not os.path.exists(spec):
+                print(f"⚠️ Shadow model {spec!r} is neither a registered version nor a file; skipped.")
+                continue
+            path, version, meta = spec, file_sha256(spec)[:12], {"source": os.path.abspath(spec)}
+
+        scorer = model_loader.load_scorer(path, version, meta, threads=threads)
+        if scorer.predict_fn is None or not scorer.n_features:
+            print(f"❌ Shadow model {spec!r} did not load; skipped.")
+            continue
+        try:
+            model_loader.check_inputs(scorer)
+        except ValueError as e:
+            print(f"❌ Shadow model {spec!r}: {e}; skipped.")
+            continue
+        scorer.warmup()
+        challengers.append(Challenger(scorer))
+    return challengers
+
+class ShadowScorer:
+    """
+    Bounded queue + worker threads scoring request copies with challengers.
+
+    Items are (tx_id, request_hash, features, time_step, fired_mask,
+    rule_score, champion_probability, champion_decision), with the features
+    as the champion scored them (rules.enrich_features: stored vector,
+    velocity and graph features); a champion probability of None/NaN means
+    the cascade skipped the model. Rows go to
+    `store` (Storage.insert_shadow) ordered as database.SHADOW_COLUMNS.
+    """
+
+    def __init__(self, store, max_queue=1000, workers=1, batch_size=256, sample_rate=1.0):
+        self.store = store
+        self.workers = workers
+        self.batch_size = batch_size
+        self.sample_rate = sample_rate
+        self.challengers = []
+
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._stop = threading.Event()
+        self._threads = []
+        self._cpu_start = None
+        self._last_error = None
+
+        self.submitted = Counter()
+        self.dropped = Counter()
+        self.store_errors = Counter()
+
+    @property
+    def running(self):
+        return any(t.is_alive() for t in self._threads)
+
+    @property
+    def queue_depth(self):
+        return self._queue.qsize()
+
+    def start(self, specs):
+        """Load the challengers, then start the workers (call off the event loop)."""
+        self.challengers = load_challengers(specs)
+        if not self.challengers:
+            print("⚠️ Shadow scoring: no usable challenger models, disabled.")
+            return
+        self._stop.clear()
+        self._cpu_start = time.process_time()
+        self._threads = [
+            threading.Thread(target=self._run, name=f"shadow-{i}", daemon=True)
+            for i in range(self.workers)
+        ]
+        for t in self._threads:
+            t.start()
+        print(f"Shadow scoring started: {', '.join(c.version for c in self.challengers)} "
+              f"({self.workers} worker(s), sample rate {self.sample_rate:g}).")
+
+    def stop(self):
+        self._stop.set()
+        for t in self._threads:
+            t.join()
+        self._threads = []
+
+    def submit(self, items):
+        """Queue copies of scored requests; never blocks."""
+        if not self._threads:
+            return
+        for item in items:
+            if self.sample_rate < 1.0 and random.random() >= self.sample_rate:
+                continue
+            try:
+                self._queue.put_nowait(item)
+                self.submitted.inc()
+            except queue.Full:
+                self.dropped.inc()
+
+    def _drain(self):
+        try:
+            items = [self._queue.get(timeout=0.1)]
+        except queue.Empty:
+            return []
+        while len(items) < self.batch_size:
+            try:
+                items.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return items
+
+    def _run(self):
+        while not self._stop.is_set():
+            items = self._drain()
+            if items:
+                self._score(items)
+
+    def _score(self, items):
+        tx_ids, hashes, features, tsteps, masks, rule_scores, champion, champion_fraud = zip(*items)
+        tsteps = np.asarray(tsteps, dtype=float)
+        masks = np.asarray(masks, dtype=np.uint8)
+        rule_scores = np.asarray(rule_scores, dtype=float)
+        champion_probs = np.array([math.nan if p is None else p for p in champion], dtype=float)
+        champion_fraud = np.asarray(champion_fraud, dtype=bool)
+        champion_stored = [None if math.isnan(p) else p for p in champion_probs.tolist()]
+        rules_reject = rule_scores >= RULE_THRESHOLD
+
+        rows = []
+        for challenger in self.challengers:
+            t0 = time.thread_time()
+            try:
+                X = model_matrix(challenger.scorer, features, tsteps, masks, rule_scores)
+                probs = np.asarray(challenger.scorer.predict(X), dtype=float)
+            except Exception as e:
+                challenger.errors.inc(len(items))
+                self._last_error = f"{challenger.version}: {e}"
+                continue
+            finally:
+                challenger.cpu_seconds.inc(time.thread_time() - t0)
+
+            fraud = (probs >= ML_THRESHOLD) | rules_reject
+            challenger.record(probs, fraud, champion_probs, champion_fraud)
+            rows += zip(tx_ids, hashes, [challenger.version] * len(items), probs.tolist(),
+                        fraud.tolist(), champion_stored, champion_fraud.tolist())
+
+        try:
+            self.store(rows)
+        except Exception as e:
+            self.store_errors.inc(len(rows))
+            self._last_error = f"store: {e}"
+
+    def stats(self):
+        shadow_cpu = sum(c.cpu_seconds.value for c in self.challengers)
+        process_cpu = time.process_time() - self._cpu_start if self._cpu_start is not None else 0.0
+        return {
+            "enabled": True,
+            "running": self.running,
+            "sample_rate": self.sample_rate,
+            "queue_depth": self._queue.qsize(),
+            "queue_capacity": self._queue.maxsize,
+            "submitted": self.submitted.value,
+            "dropped": self.dropped.value,
+            "store_errors": self.store_errors.value,
+            "last_error": self._last_error,
+            "cpu_seconds": shadow_cpu,
+            "cpu_share": shadow_cpu / process_cpu if process_cpu else 0.0,
+            "challengers": [c.stats() for c in self.challengers]
+        }
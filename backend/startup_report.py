@@ -0,0 +1,146 @@
+"""
+Import-time and time-to-first-response report for the backend.
+
+For each startup profile it measures, in fresh processes:
+  - import time of `app` (python -X importtime) and the slowest imports
+  - time from launching uvicorn until the socket answers, until /ready is
+    200, and until the first POST /transactions response
+
+    python startup_report.py
+    python startup_report.py --out startup.json --max-ready-ms 1500
+
+With --max-import-ms / --max-ready-ms the script exits 1 when a profile
+exceeds its budget, so it can gate CI against cold-start regressions.
+"""
+import argparse
+import json
+import os
+import socket
+import subprocess
+import sys
+import time
+import urllib.error
+
+from script_utils import HERE, child_env, free_port, http_status
+
+PROFILES = {
+    "default": {},
+    "fast-start-ubj": {
+        "FAST_START": "1",
+        "MODEL_PATH": "elliptic_xgb_hybrid_model.ubj"
+    },
+    "fast-start-numpy": {
+        "FAST_START": "1",
+        "MODEL_BACKEND": "numpy",
+        "MODEL_PATH": "elliptic_xgb_hybrid_model.npz"
+    }
+}
+
+SAMPLE_TX = {
+    "user_id": 1,
+    "tx_id": "STARTUP_PROBE",
+    "time_step": 10,
+    "features": {"feat_3": 1000.0, "feat_4": 0.1, "feat_10": 5.0,
+                 "feat_15": 1.0, "feat_20": 1.0, "feat_100": 0.5}
+}
+
+def measure_imports(overrides, top=10):
+    """Cumulative import time of `app` and its slowest direct/indirect imports."""
+    t0 = time.perf_counter()
+    out = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import app"],
+        cwd=HERE, env=child_env(overrides), capture_output=True, text=True
+    )
+    wall_ms = (time.perf_counter() - t0) * 1000.0
+
+    rows = []
+    for line in out.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        rows.append((name.strip(), int(cumulative_us) / 1000.0))
+
+    app_ms = next((ms for name, ms in rows if name == "app"), None)
+    slowest = sorted(rows, key=lambda r: r[1], reverse=True)[1:top + 1]
+    return {
+        "app_import_ms": app_ms,
+        "process_wall_ms": wall_ms,
+        "slowest_imports_ms": {name: round(ms, 1) for name, ms in slowest}
+    }
+
+def measure_first_response(overrides, timeout=120.0):
+    """Milliseconds from process launch to listening, ready and first scored response."""
+    port = free_port()
+    base = f"http://127.0.0.1:{port}"
+    t0 = time.perf_counter()
+    proc = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app:app", "--port", str(port), "--log-level", "warning"],
+        cwd=HERE, env=child_env(overrides), stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    result = {"listening_ms": None, "ready_ms": None, "first_response_ms": None, "first_response_status": None}
+    try:
+        while time.perf_counter() - t0 < timeout:
+            if proc.poll() is not None:
+                result["error"] = f"server exited with code {proc.returncode}"
+                return result
+            try:
+                status = http_status(base + "/ready", timeout=1.0)
+            except (urllib.error.URLError, ConnectionError, socket.timeout):
+                time.sleep(0.01)
+                continue
+            now_ms = (time.perf_counter() - t0) * 1000.0
+            if result["listening_ms"] is None:
+                result["listening_ms"] = now_ms
+            if status == 200:
+                result["ready_ms"] = now_ms
+                break
+            time.sleep(0.01)
+
+        status = http_status(base + "/transactions", SAMPLE_TX, timeout=timeout)
+        result["first_response_ms"] = (time.perf_counter() - t0) * 1000.0
+        result["first_response_status"] = status
+        return result
+    finally:
+        proc.terminate()
+        proc.wait(timeout=10)
+
+def main():
+    parser = argparse.ArgumentParser(description="Report backend import time and time-to-first-response.")
+    parser.add_argument("--profiles", default=",".join(PROFILES), help="Comma-separated profile names")
+    parser.add_argument("--out", default=None, help="Write the report as JSON")
+    parser.add_argument("--max-import-ms", type=float, default=None)
+    parser.add_argument("--max-ready-ms", type=float, default=None)
+    args = parser.parse_args()
+
+    report, failures = {}, []
+    for name in args.profiles.split(","):
+        overrides = PROFILES[name]
+        imports = measure_imports(overrides)
+        first = measure_first_response(overrides)
+        report[name] = {"env": overrides, **imports, **first}
+
+        print(f"\n[{name}] {overrides or '(defaults)'}")
+        print(f"  import app:          {imports['app_import_ms']:.0f} ms")
+        for key in ("listening_ms", "ready_ms", "first_response_ms"):
+            value = first.get(key)
+            print(f"  {key:<20} {'n/a' if value is None else f'{value:.0f} ms'}")
+        print(f"  first response HTTP: {first.get('first_response_status')}")
+        print("  slowest imports:     " + ", ".join(
+            f"{mod} {ms:.0f}ms" for mod, ms in list(imports["slowest_imports_ms"].items())[:5]))
+
+        if args.max_import_ms is not None and (imports["app_import_ms"] or 0) > args.max_import_ms:
+            failures.append(f"{name}: import {imports['app_import_ms']:.0f} ms > {args.max_import_ms:.0f} ms")
+        if args.max_ready_ms is not None and (first["ready_ms"] is None or first["ready_ms"] > args.max_ready_ms):
+            failures.append(f"{name}: ready {first['ready_ms']} ms > {args.max_ready_ms:.0f} ms")
+
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"\nReport written to {args.out}")
+
+    if failures:
+        print("\nBudget exceeded:\n  " + "\n  ".join(failures))
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,315 @@
+"""
+Where scored decisions are stored, chosen by STORAGE_BACKEND:
+
+- postgres: the partitioned transactions table (database.py)
+- sqlite:   a single local file, for edge deployments and local runs
+- memory:   a ring buffer of the last MEMORY_STORE_MAX_ROWS decisions,
+            for load tests and benchmarks
+
+Every backend takes rows ordered as database.INSERT_COLUMNS, returns the
+first row's id for a repeated (tx_id, request_hash), and answers the same
+query() as GET /transactions.
+"""
+import datetime
+import json
+import sqlite3
+import threading
+from collections import OrderedDict
+import database
+import feature_codec
+from database import INSERT_COLUMNS, SHADOW_COLUMNS, row_key
+
+COLUMNS = [c.strip() for c in INSERT_COLUMNS.split(",")]
+SHADOW_FIELDS = [c.strip() for c in SHADOW_COLUMNS.split(",")]
+
+class Storage:
+    """
+    Storage interface used by the API.
+
+    insert_decision(row) -> id, insert_many(rows) -> ids (same order),
+    bulk_insert(rows) for the write-behind flusher (ids not needed), and
+    query(fields, filters, limit, cursor) -> (rows, next_cursor): newest
+    first, keyset-paginated on id, filters as in database.query_where.
+    insert_shadow(rows) / shadow_scores(tx_id) keep challenger-model scores
+    (rows ordered as database.SHADOW_COLUMNS) next to the decisions.
+    """
+    name = None
+
+    def start(self):
+        pass
+
+    def close(self):
+        pass
+
+    def insert_decision(self, row):
+        raise NotImplementedError
+
+    def insert_many(self, rows):
+        raise NotImplementedError
+
+    def bulk_insert(self, rows):
+        self.insert_many(rows)
+
+    def query(self, fields, filters, limit, cursor=None):
+        raise NotImplementedError
+
+    def insert_shadow(self, rows):
+        raise NotImplementedError
+
+    def shadow_scores(self, tx_id):
+        raise NotImplementedError
+
+    async def query_async(self, fields, filters, limit, cursor=None):
+        """query() from an async route, on a worker thread."""
+        from anyio import to_thread
+        return await to_thread.run_sync(self.query, fields, filters, limit, cursor)
+
+    def stats(self):
+        return {"backend": self.name}
+
+class PostgresStorage(Storage):
+    name = "postgres"
+
+    def start(self):
+        database.init_pool()
+        if database.pool is None:
+            print("⚠️ PostgreSQL unavailable; requests will fail until it is reachable "
+                  "(STORAGE_BACKEND=sqlite or memory runs without a database server).")
+        database.create_tables()
+
+    def close(self):
+        if database.pool is not None:
+            database.pool.closeall()
+
+    def insert_decision(self, row):
+        return database.insert_transaction(row)
+
+    def insert_many(self, rows):
+        return database.insert_transactions(rows)
+
+    def bulk_insert(self, rows):
+        database.copy_transactions(rows)
+
+    def query(self, fields, filters, limit, cursor=None):
+        with database.connection() as conn:
+            return database.query_transactions(conn, fields, filters, limit, cursor)
+
+    async def query_async(self, fields, filters, limit, cursor=None):
+        return await database.run_async(database.query_transactions, fields, filters, limit, cursor)
+
+    def insert_shadow(self, rows):
+        database.insert_shadow_scores(rows)
+
+    def shadow_scores(self, tx_id):
+        with database.connection() as conn:
+            return database.query_shadow_scores(conn, tx_id)
+
+    def stats(self):
+        return {"backend": self.name, "pool": database.pool_stats()}
+
+# --- Filters for stores without SQL (same semantics as database.query_where) ---
+_POS = {name: i for i, name in enumerate(COLUMNS)}
+
+def _matches(row, filters):
+    def value(col):
+        return row[_POS[col]]
+
+    checks = (
+        ("time_step_min", lambda f: value("time_step") >= f),
+        ("time_step_max", lambda f: value("time_step") <= f),
+        ("user_id", lambda f: value("user_id") == f),
+        ("tx_id", lambda f: value("tx_id") == f),
+        ("status", lambda f: value("status") == f),
+        ("ml_min", lambda f: value("ml_probability") is not None and value("ml_probability") >= f),
+        ("ml_max", lambda f: value("ml_probability") is not None and value("ml_probability") <= f),
+        ("rules_all", lambda f: not f or (value("fired_mask") or 0) & f == f),
+        ("rules_any", lambda f: not f or (value("fired_mask") or 0) & f != 0)
+    )
+    return all(check(filters[key]) for key, check in checks if filters.get(key) is not None)
+
+class MemoryStore(Storage):
+    """
+    Ring buffer of the last `max_rows` decisions. Queries scan newest to
+    oldest, which is fine at ring-buffer sizes but not an index.
+    """
+    name = "memory"
+
+    def __init__(self, max_rows=100000):
+        self.max_rows = max_rows
+        self._rows = OrderedDict()      # (tx_id, request_hash) -> (id, row, created_at)
+        self._shadow = OrderedDict()    # (tx_id, request_hash, model_version) -> record
+        self._next_id = 1
+        self._lock = threading.Lock()
+
+    def insert_decision(self, row):
+        key = row_key(row)
+        with self._lock:
+            found = self._rows.get(key)
+            if found is not None:
+                return found[0]
+            new_id = self._next_id
+            self._next_id += 1
+            self._rows[key] = (new_id, row, datetime.datetime.now())
+            if len(self._rows) > self.max_rows:
+                self._rows.popitem(last=False)
+            return new_id
+
+    def insert_many(self, rows):
+        return [self.insert_decision(row) for row in rows]
+
+    def query(self, fields, filters, limit, cursor=None):
+        columns = database.select_columns(fields)
+        with self._lock:
+            entries = list(self._rows.values())
+
+        fetched = []
+        for new_id, row, created_at in reversed(entries):
+            if cursor is not None and new_id >= cursor:
+                continue
+            if not _matches(row, filters):
+                continue
+            rec = dict(zip(COLUMNS, row), id=new_id, created_at=created_at)
+            fetched.append(tuple(rec[c] for c in columns))
+            if len(fetched) > limit:
+                break
+        return database.page_rows(columns, fetched, fields, limit)
+
+    def insert_shadow(self, rows):
+        now = datetime.datetime.now()
+        with self._lock:
+            for row in rows:
+                self._shadow.setdefault(row[:3], dict(zip(SHADOW_FIELDS, row), created_at=now))
+            while len(self._shadow) > self.max_rows:
+                self._shadow.popitem(last=False)
+
+    def shadow_scores(self, tx_id):
+        with self._lock:
+            return [rec for key, rec in self._shadow.items() if key[0] == tx_id]
+
+    def stats(self):
+        return {"backend": self.name, "rows": len(self), "max_rows": self.max_rows}
+
+    def __len__(self):
+        return len(self._rows)
+
+class SQLiteStore(Storage):
+    """
+    Single-file SQLite table with the transactions columns. One connection
+    shared under a lock (SQLite serializes writers anyway); WAL mode and
+    synchronous=NORMAL keep commits cheap. Compact-storage layouts are kept
+    in the file too, so packed features decode after a restart.
+    """
+    name = "sqlite"
+
+    def __init__(self, path="transactions.sqlite3"):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS transactions ("
+            "id INTEGER PRIMARY KEY AUTOINCREMENT, "
+            + ", ".join(COLUMNS)
+            + ", created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP, UNIQUE (tx_id, request_hash))"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_transactions_user ON transactions (user_id, id)")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_transactions_time_step ON transactions (time_step, id)")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS feature_layouts (version INTEGER PRIMARY KEY, feature_names TEXT NOT NULL)"
+        )
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS shadow_scores ("
+            + ", ".join(SHADOW_FIELDS)
+            + ", created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP, PRIMARY KEY (tx_id, request_hash, model_version))"
+        )
+        for (names,) in self._conn.execute("SELECT feature_names FROM feature_layouts"):
+            feature_codec.FeatureLayout(json.loads(names))
+        self._layouts = {v for (v,) in self._conn.execute("SELECT version FROM feature_layouts")}
+
+        placeholders = ", ".join("?" * len(COLUMNS))
+        self._insert_sql = (
+            f"INSERT INTO transactions ({INSERT_COLUMNS}) VALUES ({placeholders}) "
+            "ON CONFLICT (tx_id, request_hash) DO NOTHING"
+        )
+
+    def _id_of(self, row):
+        return self._conn.execute(
+            "SELECT id FROM transactions WHERE tx_id = ? AND request_hash = ?", row_key(row)
+        ).fetchone()[0]
+
+    def _register_layouts(self, rows):
+        new = {row[_POS["feature_layout"]] for row in rows} - self._layouts - {None}
+        for version in new:
+            self._conn.execute(
+                "INSERT OR IGNORE INTO feature_layouts (version, feature_names) VALUES (?, ?)",
+                (version, json.dumps(list(feature_codec.LAYOUTS[version].names)))
+            )
+        self._layouts |= new
+
+    def insert_decision(self, row):
+        return self.insert_many([row])[0]
+
+    def insert_many(self, rows):
+        with self._lock:
+            self._conn.execute("BEGIN")
+            try:
+                self._register_layouts(rows)
+                self._conn.executemany(self._insert_sql, rows)
+                ids = [self._id_of(row) for row in rows]
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+            return ids
+
+    def query(self, fields, filters, limit, cursor=None):
+        columns = database.select_columns(fields)
+        where, params = database.query_where(filters, cursor, mark="?")
+        with self._lock:
+            fetched = self._conn.execute(
+                f"SELECT {', '.join(columns)} FROM transactions{where} ORDER BY id DESC LIMIT ?",
+                params + [limit + 1]
+            ).fetchall()
+        return database.page_rows(columns, fetched, fields, limit)
+
+    def insert_shadow(self, rows):
+        with self._lock:
+            self._conn.execute("BEGIN")
+            try:
+                self._conn.executemany(
+                    f"INSERT OR IGNORE INTO shadow_scores ({SHADOW_COLUMNS}) "
+                    f"VALUES ({', '.join('?' * len(SHADOW_FIELDS))})", rows
+                )
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+
+    def shadow_scores(self, tx_id):
+        columns = SHADOW_FIELDS + ["created_at"]
+        with self._lock:
+            fetched = self._conn.execute(
+                f"SELECT {', '.join(columns)} FROM shadow_scores WHERE tx_id = ? ORDER BY rowid", (tx_id,)
+            ).fetchall()
+        return [dict(zip(columns, values)) for values in fetched]
+
+    def stats(self):
+        return {"backend": self.name, "rows": len(self), "path": self.path}
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    def __len__(self):
+        with self._lock:
+            return self._conn.execute("SELECT count(*) FROM transactions").fetchone()[0]
+
+def open_storage(backend, sqlite_path="transactions.sqlite3", memory_max_rows=100000):
+    if backend == "postgres":
+        return PostgresStorage()
+    if backend == "memory":
+        return MemoryStore(memory_max_rows)
+    if backend == "sqlite":
+        return SQLiteStore(sqlite_path)
+    raise ValueError(f"Unknown storage backend {backend!r} (use postgres, sqlite or memory)")
@@ -0,0 +1,35 @@
+import os
+import sys
+import pytest
+
+# The backend modules import each other flat (import config, import rules);
+# put backend/ first so the repo root's config.py does not shadow it
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+MODEL_JSON = os.path.join(BACKEND_DIR, "elliptic_xgb_hybrid_model.json")
+SIMULATION_CSV = os.path.join(BACKEND_DIR, "simulation_data.csv")
+
+# config.py reads the environment once, at import: serve the checked-in model
+# without a database server or any of the optional components
+os.environ.update(
+    STORAGE_BACKEND="memory",
+    MODEL_PATH=MODEL_JSON,
+    MODEL_BACKEND="xgboost",
+    MODEL_REGISTRY_DIR=os.path.join(BACKEND_DIR, "tests", "no-registry"),
+    MODEL_VERSION="",
+    FAST_START="0",
+    MICROBATCH_ENABLED="0",
+    WRITE_BEHIND_ENABLED="0",
+    SHADOW_MODELS="",
+    USER_STATE_ENABLED="0",
+    FEATURE_STORE_PATH="",
+    GRAPH_PATH="",
+    COMPACT_STORAGE="0",
+    CASCADE_MODE="off",
+)
+
+@pytest.fixture(scope="session")
+def simulation_data():
+    import pandas as pd
+    return pd.read_csv(SIMULATION_CSV)
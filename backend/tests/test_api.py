@@ -0,0 +1,103 @@
+import pytest
+from fastapi.testclient import TestClient
+import app as api
+import rules
+from result_cache import ResultCache
+from storage import MemoryStore, SQLiteStore
+from user_state import UserVelocityStore
+
+FEATURES = {"feat_3": 60.0, "feat_4": 1.0, "feat_10": 2.0, "feat_15": 0.5, "feat_20": 1.0, "feat_100": 0.9}
+
+def _tx(tx_id, **overrides):
+    return {"tx_id": tx_id, "user_id": 7, "time_step": 12, "features": dict(FEATURES), **overrides}
+
+@pytest.fixture(params=["memory", "sqlite"])
+def client(request, tmp_path, monkeypatch):
+    store = MemoryStore(1000) if request.param == "memory" else SQLiteStore(str(tmp_path / "tx.sqlite3"))
+    monkeypatch.setattr(api, "storage", store)
+    monkeypatch.setattr(api, "result_cache", ResultCache())
+    with TestClient(api.app) as c:
+        yield c
+
+def test_decision_is_stored_and_queryable(client):
+    decision = client.post("/transactions", json=_tx("t1")).json()
+    assert decision["cached"] is False and decision["id"] is not None
+
+    page = client.get("/transactions", params={"tx_id": "t1", "fields": "id,tx_id,rule_score,status,fired_rules"}).json()
+    assert page["count"] == 1
+    stored = page["items"][0]
+    assert stored["id"] == decision["id"]
+    assert stored["rule_score"] == decision["rule_score"]
+    assert stored["status"] == decision["status"]
+    assert stored["fired_rules"] == decision["fired_rules"]
+
+def test_query_filters_and_pages(client):
+    client.post("/transactions/batch", json={"transactions": [_tx(f"p{i}", time_step=i) for i in range(1, 6)]})
+    first = client.get("/transactions", params={"limit": 2, "time_step_min": 2, "fields": "tx_id"}).json()
+    assert [r["tx_id"] for r in first["items"]] == ["p5", "p4"]
+    rest = client.get("/transactions", params={"limit": 2, "time_step_min": 2, "fields": "tx_id",
+                                               "cursor": first["next_cursor"]}).json()
+    assert [r["tx_id"] for r in rest["items"]] == ["p3", "p2"]
+
+def test_batch_isolates_invalid_items(client):
+    items = [
+        _tx("ok1"),
+        "not an object",
+        {"tx_id": "no-user", "time_step": 1, "features": FEATURES},
+        _tx("no-features", features={}),
+        _tx("ok2", time_step=13),
+    ]
+    results = client.post("/transactions/batch", json={"transactions": items}).json()["results"]
+
+    assert [r["index"] for r in results] == list(range(len(items)))
+    assert [("error" in r) for r in results] == [False, True, True, True, False]
+    assert {r["tx_id"] for r in results if "error" not in r} == {"ok1", "ok2"}
+    assert all(r["id"] is not None for r in results if "error" not in r)
+    assert len(api.storage.query(["id"], {}, 100)[0]) == 2
+
+def test_retry_is_answered_from_the_cache(client):
+    first = client.post("/transactions", json=_tx("r1")).json()
+    again = client.post("/transactions", json=_tx("r1")).json()
+    assert again["cached"] is True
+    assert {**again, "cached": False} == first
+
+    # Same tx_id with a different body is a different request
+    changed = client.post("/transactions", json=_tx("r1", time_step=13)).json()
+    assert changed["cached"] is False and changed["id"] != first["id"]
+
+    # The batch route shares the cache and the response shape
+    results = client.post("/transactions/batch", json={"transactions": [_tx("r1"), _tx("r2"), _tx("r2")]}).json()["results"]
+    assert results[0]["cached"] is True
+    assert {k: v for k, v in results[0].items() if k not in ("index", "tx_id")} == again
+    assert [r["cached"] for r in results[1:]] == [False, True]
+    assert results[1]["id"] == results[2]["id"]
+
+def test_retry_after_cache_eviction_returns_the_stored_id(client, monkeypatch):
+    first = client.post("/transactions", json=_tx("e1")).json()
+    monkeypatch.setattr(api, "result_cache", ResultCache())
+    again = client.post("/transactions", json=_tx("e1")).json()
+    assert again["cached"] is False
+    assert again["id"] == first["id"]
+    assert len(api.storage.query(["id"], {"tx_id": "e1"}, 10)[0]) == 1
+
+class _CapturingShadow:
+    def __init__(self):
+        self.items = []
+
+    def submit(self, items):
+        self.items += items
+
+    def stop(self):
+        pass
+
+def test_shadow_copies_carry_the_scored_features(client, monkeypatch):
+    shadow = _CapturingShadow()
+    monkeypatch.setattr(api, "shadow", shadow)
+    monkeypatch.setattr(rules, "user_state", UserVelocityStore(window=5, max_users=100))
+
+    client.post("/transactions", json=_tx("v1"))
+    client.post("/transactions/batch", json={"transactions": [_tx("v2"), _tx("v3")]})
+
+    counts = [features["user_tx_count"] for _, _, features, *_ in shadow.items]
+    assert counts == [1, 2, 3]
+    assert all(features["feat_3"] == FEATURES["feat_3"] for _, _, features, *_ in shadow.items)
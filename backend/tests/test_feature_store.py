@@ -0,0 +1,15 @@
+import numpy as np
+from feature_store import FeatureStore, build
+
+def test_lookups_by_numeric_and_other_ids(tmp_path):
+    path = str(tmp_path / "store")
+    build(path, [230425980, "abc", 7], np.arange(6, dtype=np.float32).reshape(3, 2), ["feat_0", "feat_1"])
+    store = FeatureStore(path)
+
+    assert store.get("230425980") == {"feat_0": 0.0, "feat_1": 1.0}
+    assert store.get("abc") == {"feat_0": 2.0, "feat_1": 3.0}
+    assert store.get(7.0) == {"feat_0": 4.0, "feat_1": 5.0}
+    # Ids int() rejects with TypeError are hashed like strings, not raised
+    for tx_id in (None, [1], {"id": 1}, "8"):
+        assert store.get(tx_id) is None
+    assert store.merge(None, {"feat_0": 9.0}) == {"feat_0": 9.0}
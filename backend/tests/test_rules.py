@@ -0,0 +1,29 @@
+import math
+import numpy as np
+import pandas as pd
+import rules
+
+def test_single_row_matches_batch_on_simulation_data(simulation_data):
+    scores, masks = rules.evaluate_rules_batch(simulation_data)
+    rows = simulation_data.to_dict("records")
+    for row, score, mask in zip(rows, scores, masks):
+        single_score, fired = rules.evaluate_rules(row, row["time_step"])
+        assert (single_score, rules.fired_to_mask(fired)) == (score, mask), row
+
+def test_missing_features_take_the_rule_defaults():
+    scores, masks = rules.evaluate_rules_batch({"time_step": np.array([3, 40])})
+    for step, score, mask in zip((3, 40), scores, masks):
+        single_score, fired = rules.evaluate_rules({}, step)
+        assert (single_score, rules.fired_to_mask(fired)) == (score, mask)
+
+def test_single_row_matches_batch_on_edge_values():
+    # NaN/None/inf inputs and a zero denominator for the derived ratio
+    eps = rules.ruleset.spec["derived"]["structural_ratio"]["epsilon"]
+    edge = [math.nan, None, math.inf, -math.inf, 0.0, 1.0, -1.0]
+    rows = [{"feat_15": num, "feat_20": den, "feat_3": num, "feat_4": num, "feat_100": num, "feat_10": num}
+            for num in edge for den in (-eps, 0.0, math.nan, None)]
+    batch = pd.DataFrame(rows, dtype=float).assign(time_step=20)
+    scores, masks = rules.evaluate_rules_batch(batch)
+    for row, score, mask in zip(rows, scores, masks):
+        single_score, fired = rules.evaluate_rules(row, 20)
+        assert (single_score, rules.fired_to_mask(fired)) == (score, mask), row
@@ -0,0 +1,30 @@
+import numpy as np
+import pytest
+from conftest import MODEL_JSON, SIMULATION_CSV
+from tree_model import TreeEnsemble, _model_matrix
+
+xgb = pytest.importorskip("xgboost")
+
+@pytest.fixture(scope="module")
+def models():
+    clf = xgb.XGBClassifier()
+    clf.load_model(MODEL_JSON)
+    return TreeEnsemble.from_json(MODEL_JSON), clf
+
+def test_matches_xgboost_on_simulation_data(models):
+    ensemble, clf = models
+    X = _model_matrix(SIMULATION_CSV, ensemble.feature_names)
+    np.testing.assert_allclose(ensemble.predict(X), clf.predict_proba(X)[:, 1], atol=1e-5)
+
+def test_matches_xgboost_with_missing_values(models):
+    ensemble, clf = models
+    rng = np.random.default_rng(0)
+    X = rng.normal(size=(2000, len(ensemble.feature_names))).astype(np.float32)
+    X[rng.random(X.shape) < 0.1] = np.nan
+    np.testing.assert_allclose(ensemble.predict(X), clf.predict_proba(X)[:, 1], atol=1e-5)
+
+def test_npz_round_trip(models, tmp_path):
+    ensemble, _ = models
+    X = np.random.default_rng(1).normal(size=(100, len(ensemble.feature_names))).astype(np.float32)
+    ensemble.save(str(tmp_path / "model.npz"))
+    np.testing.assert_array_equal(TreeEnsemble.load(str(tmp_path / "model.npz")).predict(X), ensemble.predict(X))
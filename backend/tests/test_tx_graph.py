@@ -0,0 +1,128 @@
+import threading
+import time
+import pytest
+import model_loader
+import rules
+from tx_graph import TxGraph, ILLICIT, LICIT, UNLABELED
+
+COLUMNS = ["feat_3", "feat_4"]
+
+def _graph(n=3, **kwargs):
+    # Training graph 0 -> 2, 1 -> 2 with 0 illicit and 1 licit
+    return TxGraph([str(i) for i in range(n)], [0, 1], [2, 2], [[i, -i] for i in range(n)], COLUMNS,
+                   [ILLICIT, LICIT] + [UNLABELED] * (n - 2), **kwargs)
+
+def _add(graph, tx_id, *parents):
+    return graph.add_transaction(tx_id, {"feat_3": 10.0, "feat_4": 1.0}, parents)
+
+def _snapshot(graph):
+    return {tx_id: (graph.lookup(tx_id), graph.neighbors(tx_id)) for tx_id in graph.ids}
+
+def test_compaction_keeps_lookups():
+    graph = _graph(compact_every=10**6)
+    for i in range(20):
+        _add(graph, f"s{i}", "0", "1", f"s{i - 1}")
+    _add(graph, "2", "s3")          # a retry gains an edge
+    before = _snapshot(graph)
+
+    graph.compact()
+    assert graph.stats()["pending_nodes"] == graph.stats()["pending_edges"] == 0
+    assert _snapshot(graph) == before
+
+def test_oldest_serving_nodes_are_evicted_beyond_max_nodes():
+    graph = _graph(compact_every=10**6, max_nodes=8)
+    for i in range(10):
+        _add(graph, f"s{i}", "0", f"s{i - 1}")
+    graph.compact()
+
+    assert graph.ids == ["0", "1", "2"] + [f"s{i}" for i in range(5, 10)]
+    assert graph.lookup("s4") is None and graph.stats()["evicted"] == 5
+    assert graph.neighbors("s5") == (["0"], ["s6"])
+    assert graph.lookup("s6")["nbr_in_degree"] == 2.0
+    assert graph.lookup("s6")["nbr_illicit_ratio"] == 1.0
+
+    # Evicted parents are unknown from now on
+    _add(graph, "s10", "s9", "s4")
+    assert graph.neighbors("s10") == (["s9"], [])
+    assert graph.neighbors("s9") == (["0", "s8"], ["s10"])
+
+def test_additions_during_a_compaction_stay_pending(monkeypatch):
+    graph = _graph(compact_every=10**6, max_nodes=6)
+    for i in range(5):
+        _add(graph, f"s{i}", "0", f"s{i - 1}")
+    fold = graph._fold
+
+    def racing_fold(*snapshot):
+        # Arrives while the arrays are rebuilt; s0 is evicted by this compaction
+        _add(graph, "late", "s4", "s0", "1")
+        return fold(*snapshot)
+
+    monkeypatch.setattr(graph, "_fold", racing_fold)
+    graph.compact()
+    monkeypatch.undo()
+
+    assert graph.stats()["pending_nodes"] == 1 and graph.stats()["pending_edges"] == 2
+    assert graph.neighbors("late") == (["1", "s4"], [])
+    assert graph.neighbors("s4") == (["0", "s3"], ["late"])
+    before = {tx_id: graph.lookup(tx_id) for tx_id in ("s4", "late")}
+
+    graph.compact()     # evicts s2, the only node over max_nodes now
+    assert graph.ids == ["0", "1", "2", "s3", "s4", "late"]
+    assert graph.neighbors("s3") == (["0"], ["s4"])
+    assert {tx_id: graph.lookup(tx_id) for tx_id in ("s4", "late")} == before
+
+def test_background_compaction(monkeypatch):
+    graph = _graph(compact_every=5)
+    threads = []
+    compact = graph.compact
+
+    def recording_compact():
+        threads.append(threading.current_thread().name)
+        compact()
+
+    monkeypatch.setattr(graph, "compact", recording_compact)
+    graph.start()
+    for i in range(100):
+        _add(graph, f"s{i}", f"s{i - 1}")
+    deadline = time.monotonic() + 5
+    while graph.stats()["pending_nodes"] >= 5 and time.monotonic() < deadline:
+        time.sleep(0.01)
+    graph.stop()
+
+    assert threads and set(threads) == {"graph-compactor"}
+    assert graph.neighbors("s50") == (["s49"], ["s51"])
+    assert not graph.running
+
+def test_save_and_load_keep_serving_nodes(tmp_path):
+    graph = _graph(max_nodes=100)
+    graph.source = "abc"
+    for i in range(5):
+        _add(graph, f"s{i}", "0", f"s{i - 1}")
+    before = _snapshot(graph)
+    path = str(tmp_path / "graph.npz")
+    assert graph.save(path) == 8
+
+    loaded = TxGraph.load(path, max_nodes=100)
+    assert (loaded.n_base, loaded.source) == (3, "abc")
+    assert _snapshot(loaded) == before
+
+def test_snapshot_is_restored_only_for_the_same_graph(tmp_path, monkeypatch):
+    base, snapshot = str(tmp_path / "graph.npz"), str(tmp_path / "snapshot.npz")
+    monkeypatch.setattr(rules, "GRAPH_PATH", base)
+    monkeypatch.setattr(rules, "GRAPH_SNAPSHOT", snapshot)
+    _graph().save(base)
+
+    graph = rules.load_graph()
+    _add(graph, "s0", "0")
+    graph.save(snapshot)
+    assert "s0" in rules.load_graph().index
+
+    _graph(4).save(base)        # retrained: the snapshot extends the old graph
+    assert "s0" not in rules.load_graph().index
+
+def test_graph_model_is_refused_without_a_graph(monkeypatch):
+    scorer = model_loader.ScoringModel(None, ["feat_3", "nbr_in_degree"])
+    with pytest.raises(ValueError, match="GRAPH_PATH"):
+        model_loader.check_inputs(scorer)
+    monkeypatch.setattr(model_loader, "GRAPH_PATH", "graph.npz")
+    model_loader.check_inputs(scorer)
@@ -0,0 +1,104 @@
+import threading
+import time
+from write_behind import Spool, WriteBehindWriter
+
+def _rows(start, n):
+    return [(i, f"tx{i}", b"\x00\x01") for i in range(start, start + n)]
+
+def test_spool_round_trip(tmp_path):
+    spool = Spool(str(tmp_path), segment_bytes=50)
+    spool.append(_rows(0, 5))
+    spool.append(_rows(5, 5))
+    assert spool.stats()["segments"] > 1
+
+    inserted = []
+    assert spool.replay(inserted.extend, batch_size=3) == 10
+    assert inserted == _rows(0, 10)
+    assert spool.stats()["segments"] == 0
+
+def test_append_during_replay_is_kept(tmp_path):
+    spool = Spool(str(tmp_path))
+    spool.append(_rows(0, 3))
+    inserted = []
+
+    def insert_many(rows):
+        # A queue overflow spills to the spool while the replay is running
+        spool.append(_rows(100, 2))
+        inserted.extend(rows)
+
+    assert spool.replay(insert_many, batch_size=10) == 3
+    assert inserted == _rows(0, 3)
+    assert spool.stats()["segments"] == 1
+
+    inserted.clear()
+    assert spool.replay(inserted.extend, batch_size=10) == 2
+    assert inserted == _rows(100, 2)
+
+def test_append_racing_the_seal_is_not_lost(tmp_path, monkeypatch):
+    spool = Spool(str(tmp_path))
+    spool.append(_rows(0, 3))
+    seal = spool.seal
+
+    def racing_seal():
+        sealed = seal()
+        spool.append(_rows(100, 2))   # overflow after the seal, before the segments are read
+        return sealed
+
+    monkeypatch.setattr(spool, "seal", racing_seal)
+    inserted = []
+    spool.replay(inserted.extend, batch_size=10)
+    monkeypatch.undo()
+    spool.append(_rows(200, 1))       # still goes to the segment opened by the racing append
+    spool.replay(inserted.extend, batch_size=10)
+
+    assert inserted == _rows(0, 3) + _rows(100, 2) + _rows(200, 1)
+
+def test_concurrent_appends_are_not_lost(tmp_path):
+    spool = Spool(str(tmp_path))
+    stop = threading.Event()
+    appended = []
+
+    def producer():
+        i = 0
+        while not stop.is_set():
+            spool.append(_rows(i, 1))
+            appended.append(i)
+            i += 1
+
+    thread = threading.Thread(target=producer)
+    thread.start()
+    replayed = []
+    for _ in range(20):
+        spool.replay(replayed.extend, batch_size=50)
+        time.sleep(0.001)
+    stop.set()
+    thread.join()
+    spool.replay(replayed.extend, batch_size=50)
+
+    assert sorted(row[0] for row in replayed) == appended
+
+def test_writer_spools_while_db_down_and_replays(tmp_path):
+    db = {"up": False, "rows": []}
+
+    def insert_many(rows):
+        if not db["up"]:
+            raise ConnectionError("database down")
+        db["rows"].extend(rows)
+
+    writer = WriteBehindWriter(insert_many, str(tmp_path), batch_size=10,
+                               flush_interval_ms=5, retry_interval_s=0.05)
+    writer.start()
+    for row in _rows(0, 25):
+        writer.submit(row)
+    deadline = time.monotonic() + 5
+    while writer.rows_spooled.value < 25 and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert writer.rows_spooled.value == 25 and not db["rows"]
+
+    db["up"] = True
+    while writer.rows_replayed.value < 25 and time.monotonic() < deadline:
+        time.sleep(0.01)
+    writer.stop()
+
+    assert sorted(db["rows"]) == _rows(0, 25)
+    assert writer.stats()["spool"]["segments"] == 0
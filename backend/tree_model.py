@@ -0,0 +1,334 @@
+"""
+Pure-NumPy evaluator for a saved XGBoost JSON model.
+
+The trees are flattened into contiguous arrays (split feature, threshold,
+left/right child, default direction, leaf value). For scoring they are
+re-laid out as complete binary trees of depth max_depth, so a node's
+children are 2i+1 / 2i+2 and a batch walks every row down every tree at
+once, one level per step, with no child-pointer lookups.
+Serving with it needs no xgboost import.
+
+Verify and benchmark against the stock booster:
+    python tree_model.py elliptic_xgb_hybrid_model.json --data simulation_data.csv
+"""
+import json
+import math
+import numpy as np
+
+# Rows scored per traversal pass; bounds the (rows x trees) node-index matrix
+CHUNK_ROWS = 2048
+
+def _parse_base_score(raw):
+    # Older models store "5E-1", newer ones "[5E-1]"
+    return float(str(raw).strip("[]"))
+
+class TreeEnsemble:
+    """Flat-array form of a binary:logistic gbtree model."""
+
+    def __init__(self, feature_names, roots, split_feature, threshold,
+                 left, right, default_left, leaf_value, base_margin, max_depth):
+        self.feature_names = feature_names
+        self.roots = roots
+        self.split_feature = split_feature
+        self.threshold = threshold
+        self.left = left
+        self.right = right
+        self.default_left = default_left
+        self.leaf_value = leaf_value
+        self.base_margin = base_margin
+        self.max_depth = max_depth
+        self._compile_complete()
+
+    @property
+    def n_trees(self):
+        return len(self.roots)
+
+    @property
+    def nbytes(self):
+        return sum(a.nbytes for a in (
+            self.roots, self.split_feature, self.threshold, self.left,
+            self.right, self.default_left, self.leaf_value,
+            self.c_feature, self.c_threshold, self.c_default_left, self.c_leaf
+        ))
+
+    def _compile_complete(self):
+        """
+        Pad every tree to a complete tree of depth max_depth (c_* arrays).
+        A leaf above the bottom level becomes a pass-through split
+        (threshold +inf, default left) whose subtree repeats its value.
+        """
+        depth = self.max_depth
+        n_inner, n_leaves = (1 << depth) - 1, 1 << depth
+        T = self.n_trees
+
+        feature = np.zeros((T, n_inner), dtype=np.int32)
+        threshold = np.full((T, n_inner), np.inf, dtype=np.float32)
+        default_left = np.ones((T, n_inner), dtype=bool)
+        leaf = np.zeros((T, n_leaves), dtype=np.float32)
+
+        for t, root in enumerate(self.roots):
+            stack = [(int(root), 0, 0)]   # (flat node, slot in complete tree, level)
+            while stack:
+                node, slot, level = stack.pop()
+                if level == depth:
+                    leaf[t, slot - n_inner] = self.leaf_value[node]
+                    continue
+                if self.left[node] != node:
+                    feature[t, slot] = self.split_feature[node]
+                    threshold[t, slot] = self.threshold[node]
+                    default_left[t, slot] = self.default_left[node]
+                stack.append((int(self.left[node]), 2 * slot + 1, level + 1))
+                stack.append((int(self.right[node]), 2 * slot + 2, level + 1))
+
+        self.c_feature = feature.ravel()
+        self.c_threshold = threshold.ravel()
+        self.c_default_left = default_left.ravel()
+        self.c_leaf = leaf.ravel()
+        self._inner_base = np.arange(T, dtype=np.int64) * n_inner
+        self._leaf_base = np.arange(T, dtype=np.int64) * n_leaves - n_inner
+
+    # Arrays written by save(); the c_* layout is stored too so load() skips recompiling
+    _SAVED_ARRAYS = (
+        "roots", "split_feature", "threshold", "left", "right", "default_left",
+        "leaf_value", "c_feature", "c_threshold", "c_default_left", "c_leaf",
+        "_inner_base", "_leaf_base"
+    )
+
+    def save(self, path):
+        """Write an uncompressed .npz artifact (loads in milliseconds, no JSON parse)."""
+        np.savez(
+            path,
+            feature_names=np.array(self.feature_names, dtype=str),
+            base_margin=np.float64(self.base_margin),
+            max_depth=np.int32(self.max_depth),
+            **{name.lstrip("_"): getattr(self, name) for name in self._SAVED_ARRAYS}
+        )
+
+    @classmethod
+    def load(cls, path):
+        """Load an artifact written by save()."""
+        with np.load(path, allow_pickle=False) as data:
+            ensemble = cls.__new__(cls)
+            ensemble.feature_names = data["feature_names"].tolist()
+            ensemble.base_margin = float(data["base_margin"])
+            ensemble.max_depth = int(data["max_depth"])
+            for name in cls._SAVED_ARRAYS:
+                setattr(ensemble, name, data[name.lstrip("_")])
+        return ensemble
+
+    @classmethod
+    def from_json(cls, path):
+        with open(path) as f:
+            return cls.from_dict(json.load(f))
+
+    @classmethod
+    def from_dict(cls, doc):
+        learner = doc["learner"]
+        objective = learner["objective"]["name"]
+        if objective not in ("binary:logistic", "reg:logistic"):
+            raise ValueError(f"Unsupported objective for TreeEnsemble: {objective}")
+
+        booster = learner["gradient_booster"]
+        if booster["name"] != "gbtree":
+            raise ValueError(f"Unsupported booster for TreeEnsemble: {booster['name']}")
+        trees = booster["model"]["trees"]
+
+        sizes = [len(t["left_children"]) for t in trees]
+        offsets = np.concatenate([[0], np.cumsum(sizes)[:-1]]).astype(np.int32)
+        total = int(sum(sizes))
+
+        split_feature = np.empty(total, dtype=np.int32)
+        threshold = np.empty(total, dtype=np.float32)
+        left = np.empty(total, dtype=np.int32)
+        right = np.empty(total, dtype=np.int32)
+        default_left = np.empty(total, dtype=bool)
+        leaf_value = np.zeros(total, dtype=np.float32)
+        max_depth = 0
+
+        for tree, off, size in zip(trees, offsets, sizes):
+            if any(tree.get("split_type", [])):
+                raise ValueError("Categorical splits are not supported by TreeEnsemble")
+
+            sl = slice(off, off + size)
+            lc = np.asarray(tree["left_children"], dtype=np.int32)
+            rc = np.asarray(tree["right_children"], dtype=np.int32)
+            cond = np.asarray(tree["split_conditions"], dtype=np.float32)
+            is_leaf = lc == -1
+            own = np.arange(off, off + size, dtype=np.int32)
+
+            # Leaves point at themselves so every row can take max_depth steps
+            left[sl] = np.where(is_leaf, own, lc + off)
+            right[sl] = np.where(is_leaf, own, rc + off)
+            split_feature[sl] = np.where(is_leaf, 0, tree["split_indices"])
+            threshold[sl] = np.where(is_leaf, 0, cond)
+            default_left[sl] = np.asarray(tree["default_left"], dtype=bool)
+            # For leaves XGBoost stores the (already shrunk) leaf value in split_conditions
+            leaf_value[sl] = np.where(is_leaf, cond, 0)
+
+            max_depth = max(max_depth, _tree_depth(lc, rc))
+
+        base_score = _parse_base_score(learner["learner_model_param"]["base_score"])
+        base_margin = math.log(base_score / (1.0 - base_score))
+
+        return cls(
+            feature_names=list(learner.get("feature_names") or []),
+            roots=offsets,
+            split_feature=split_feature,
+            threshold=threshold,
+            left=left,
+            right=right,
+            default_left=default_left,
+            leaf_value=leaf_value,
+            base_margin=base_margin,
+            max_depth=max_depth
+        )
+
+    def predict_margin(self, X, n_trees=None):
+        """Raw margin per row; `n_trees` limits scoring to the first n trees."""
+        X = np.asarray(X, dtype=np.float32)
+        if X.ndim == 1:
+            X = X[None, :]
+
+        out = np.empty(X.shape[0], dtype=np.float64)
+        for start in range(0, X.shape[0], CHUNK_ROWS):
+            out[start:start + CHUNK_ROWS] = self._margin_chunk(X[start:start + CHUNK_ROWS], n_trees)
+        return out
+
+    def _margin_chunk(self, X, n_trees):
+        inner_base = self._inner_base[:n_trees]
+        leaf_base = self._leaf_base[:n_trees]
+        n = X.shape[0]
+        has_nan = bool(np.isnan(X).any())
+
+        # Row offsets into the flattened X so one take() gathers every (row, tree) value
+        row_base = (np.arange(n, dtype=np.int64) * X.shape[1])[:, None]
+        flat_X = np.ascontiguousarray(X).ravel()
+        slot = np.zeros((n, len(inner_base)), dtype=np.int64)
+
+        for _ in range(self.max_depth):
+            node = slot + inner_base
+            x = flat_X[row_base + self.c_feature[node]]
+            go_right = ~(x < self.c_threshold[node])
+            if has_nan:
+                go_right &= ~(np.isnan(x) & self.c_default_left[node])
+            slot = 2 * slot + 1 + go_right
+
+        return self.c_leaf[slot + leaf_base].sum(axis=1, dtype=np.float64) + self.base_margin
+
+    def predict(self, X, n_trees=None):
+        """P(class 1) per row, matching XGBClassifier.predict_proba(X)[:, 1]."""
+        return 1.0 / (1.0 + np.exp(-self.predict_margin(X, n_trees)))
+
+def _tree_depth(lc, rc):
+    depth, frontier = 0, [0]
+    while True:
+        frontier = [c for n in frontier for c in (lc[n], rc[n]) if c != -1]
+        if not frontier:
+            return depth
+        depth += 1
+
+# --- Verification & benchmark CLI ---
+def _model_matrix(path, feature_names):
+    # Lay simulation_data columns out in model order and rebuild the rule meta-features
+    from frame_cache import read_table
+    from rules import ruleset
+
+    df = read_table(path)
+    X = np.zeros((len(df), len(feature_names)), dtype=np.float32)
+    index = {name: i for i, name in enumerate(feature_names)}
+    for col in df.columns:
+        if col in index:
+            X[:, index[col]] = df[col].to_numpy(dtype=np.float32)
+
+    scores, masks = ruleset.evaluate(df)
+    rule_cols = ruleset.mask_to_columns(masks)
+    for bit, name in enumerate(ruleset.names):
+        if f"{name}_Fired" in index:
+            X[:, index[f"{name}_Fired"]] = rule_cols[:, bit]
+    if "Total_Rule_Score" in index:
+        X[:, index["Total_Rule_Score"]] = scores
+    return X
+
+def _rss_kib():
+    import resource
+    return int(open("/proc/self/statm").read().split()[1]) * resource.getpagesize() // 1024
+
+def _peak_rss_delta(predict, X):
+    """Peak RSS growth (MiB) while predict(X) runs, sampled every 0.5 ms."""
+    import threading
+
+    base = _rss_kib()
+    peak = [base]
+    done = threading.Event()
+
+    def sample():
+        while not done.is_set():
+            peak[0] = max(peak[0], _rss_kib())
+            done.wait(0.0005)
+
+    t = threading.Thread(target=sample)
+    t.start()
+    try:
+        predict(X)
+    finally:
+        done.set()
+        t.join()
+    return max(peak[0] - base, 0) / 1024.0
+
+def main():
+    import argparse
+    import time
+
+    parser = argparse.ArgumentParser(description="Verify and benchmark the NumPy tree evaluator.")
+    parser.add_argument("model", help="XGBoost JSON model file")
+    parser.add_argument("--data", default="simulation_data.csv", help="CSV or frame directory used for the equivalence check")
+    parser.add_argument("--atol", type=float, default=1e-5)
+    parser.add_argument("--sizes", default="1,10,100,1000,10000,100000")
+    parser.add_argument("--memory", action="store_true", help="Also sample peak RSS growth per batch size")
+    args = parser.parse_args()
+
+    import xgboost as xgb
+
+    ensemble = TreeEnsemble.from_json(args.model)
+    clf = xgb.XGBClassifier()
+    clf.load_model(args.model)
+    booster = clf.get_booster()
+    n_features = len(ensemble.feature_names)
+    print(f"{ensemble.n_trees} trees, max depth {ensemble.max_depth}, "
+          f"{len(ensemble.left)} nodes, {ensemble.nbytes / 1024:.1f} KiB of arrays")
+
+    # 1. Equivalence on real rows plus random rows with missing values
+    X = _model_matrix(args.data, ensemble.feature_names)
+    rng = np.random.default_rng(0)
+    X_rand = rng.normal(size=(5000, n_features)).astype(np.float32)
+    X_rand[rng.random(X_rand.shape) < 0.1] = np.nan
+    for name, data in (("simulation_data", X), ("random+NaN", X_rand)):
+        diff = np.abs(ensemble.predict(data) - clf.predict_proba(data)[:, 1]).max()
+        status = "OK" if diff <= args.atol else "MISMATCH"
+        print(f"{name:>16}: {len(data)} rows, max |diff| = {diff:.2e} [{status}]")
+
+    # 2. Latency per batch size
+    print(f"\n{'batch':>8} {'xgboost ms':>11} {'numpy ms':>10} {'numpy/xgb':>10}"
+          + (f" {'xgb MiB':>8} {'numpy MiB':>10}" if args.memory else ""))
+    for size in [int(s) for s in args.sizes.split(",")]:
+        Xb = X[rng.integers(0, len(X), size)]
+        reps = max(3, min(200, 20000 // size))
+
+        def timed(fn):
+            fn(Xb)
+            t0 = time.perf_counter()
+            for _ in range(reps):
+                fn(Xb)
+            return (time.perf_counter() - t0) / reps * 1000.0
+
+        xgb_predict = lambda A: booster.inplace_predict(A, validate_features=False)
+        t_xgb = timed(xgb_predict)
+        t_np = timed(ensemble.predict)
+        line = f"{size:>8} {t_xgb:>11.3f} {t_np:>10.3f} {t_np / t_xgb:>10.2f}"
+        if args.memory:
+            line += (f" {_peak_rss_delta(xgb_predict, Xb):>8.1f}"
+                     f" {_peak_rss_delta(ensemble.predict, Xb):>10.1f}")
+        print(line)
+
+if __name__ == "__main__":
+    main()
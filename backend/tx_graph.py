@@ -0,0 +1,377 @@
+"""
+Transaction graph (Elliptic edge list) in compressed sparse row form, and
+the neighbor-aggregation features computed from it.
+
+Edges run txId1 -> txId2 (funds flow from the first transaction to the
+second). For every node and each aggregated column c the features are:
+
+    nbr_in_degree
+    nbr_in_mean_<c>, nbr_in_max_<c>
+    nbr_illicit_ratio   illicit / labeled among in-neighbors, counting
+                        only labels the graph was given (train split)
+
+Only in-neighbors (the transactions a node spends from) are used: they
+exist when a transaction is scored, its children do not, so features over
+out-neighbors would be seen in training but always be 0 in serving.
+Nodes without in-neighbors get 0. The training pipeline
+computes them for all nodes at once (sparse matrix products);
+the backend uses the same TxGraph for single-node lookups and adds new
+transactions and their edges as they are scored. Standalone (NumPy and
+SciPy only) so hybrid_pipeline.py can import it.
+
+Serving-time nodes live in a window: beyond `max_nodes` the oldest of them
+are evicted (with their edges) at the next compaction; the nodes the graph
+was built or loaded with are always kept.
+"""
+import os
+import threading
+import time
+import numpy as np
+
+UNLABELED, LICIT, ILLICIT = -1, 0, 1
+
+def feature_names(columns):
+    names = ["nbr_in_degree"]
+    for stat in ("mean", "max"):
+        names += [f"nbr_in_{stat}_{c}" for c in columns]
+    return names + ["nbr_illicit_ratio"]
+
+def _csr(n, src, dst):
+    """(indptr, indices) of the n x n adjacency src -> dst, duplicate edges dropped."""
+    keys = np.unique(np.asarray(src, dtype=np.int64) * n + np.asarray(dst, dtype=np.int64))
+    rows, cols = np.divmod(keys, n)
+    indptr = np.zeros(n + 1, dtype=np.int64)
+    np.cumsum(np.bincount(rows, minlength=n), out=indptr[1:])
+    return indptr, cols.astype(np.int64)     # np.unique sorted by row, then column
+
+def _row_max(indptr, indices, X):
+    out = np.zeros((len(indptr) - 1, X.shape[1]), dtype=X.dtype)
+    nonempty = np.flatnonzero(np.diff(indptr))
+    if len(nonempty):
+        out[nonempty] = np.maximum.reduceat(X[indices], indptr[nonempty], axis=0)
+    return out
+
+
+class TxGraph:
+    """
+    Directed transaction graph: out- and in-adjacency as CSR arrays over
+    node rows, the aggregated `columns` per node (float32) and labels
+    (UNLABELED / LICIT / ILLICIT) of the first `n_base` nodes.
+
+    Serving-time additions (add_transaction) go to small pending lists and
+    are folded into the CSR arrays by compact() once `compact_every` nodes
+    and edges are pending. compact() builds the new arrays outside the lock
+    while lookups keep using the old ones plus the pending lists, then swaps
+    them in; after start() it runs on a background thread, so no request
+    waits for a rebuild.
+
+    `index` maps a tx_id to a sequence number that eviction does not change;
+    a serving-time node's row is that number minus the nodes evicted so far.
+    """
+
+    def __init__(self, ids, src, dst, features, columns, labels=None, compact_every=10000,
+                 max_nodes=0, n_base=None, source=""):
+        self.columns = list(columns)
+        self.names = feature_names(self.columns)
+        self.compact_every = compact_every
+        self.max_nodes = max_nodes
+        self.source = source                # sha256 of the graph file a snapshot extends
+        self._lock = threading.Lock()
+        self._compact_lock = threading.Lock()
+        self._compact_due = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+
+        self.ids = [str(i) for i in ids]
+        self.n_base = len(self.ids) if n_base is None else int(n_base)
+        self.index = {tx_id: row for row, tx_id in enumerate(self.ids)}
+        self.features = np.asarray(features, dtype=np.float32).reshape(len(self.ids), len(self.columns))
+        self.labels = (np.full(self.n_base, UNLABELED, dtype=np.int8) if labels is None
+                       else np.asarray(labels, dtype=np.int8))
+        n = len(self.ids)
+        src, dst = np.asarray(src, dtype=np.int64), np.asarray(dst, dtype=np.int64)
+        self.out_indptr, self.out_indices = _csr(n, src, dst)
+        self.in_indptr, self.in_indices = _csr(n, dst, src)
+        self._new_features = []             # rows of nodes added since the last compaction
+        self._new_edges = []                # (parent row, child row) edges added since then
+        self._pending_out = {}              # the same edges by node: row -> [rows]
+        self._pending_in = {}
+        self.evicted = 0
+        self.compactions = 0
+        self.last_compaction_ms = 0.0
+
+    @classmethod
+    def from_edgelist(cls, edges, ids, features, columns, labels=None):
+        """Graph over `ids` from an edge DataFrame (txId1, txId2); edges to unknown ids are dropped."""
+        ids = np.asarray(ids)
+        order = np.argsort(ids)
+        src = np.searchsorted(ids, edges["txId1"].to_numpy(), sorter=order)
+        dst = np.searchsorted(ids, edges["txId2"].to_numpy(), sorter=order)
+        src, dst = np.minimum(src, len(ids) - 1), np.minimum(dst, len(ids) - 1)
+        src, dst = order[src], order[dst]
+        known = (ids[src] == edges["txId1"].to_numpy()) & (ids[dst] == edges["txId2"].to_numpy())
+        return cls(ids, src[known], dst[known], features, columns, labels)
+
+    def __len__(self):
+        return len(self.ids)
+
+    def _row(self, tx_id):
+        seq = self.index.get(str(tx_id))
+        if seq is None or seq < self.n_base:
+            return seq
+        return seq - self.evicted
+
+    # --- Whole-graph features (training) ---
+    def neighbor_features(self):
+        """(n_nodes, len(names)) float32 matrix of the features above, for every node."""
+        self.compact()
+        with self._lock:
+            from scipy.sparse import csr_matrix
+            n, X = len(self.ids), self.features.astype(np.float64)
+            in_adj = csr_matrix((np.ones(len(self.in_indices)), self.in_indices, self.in_indptr), shape=(n, n))
+            in_deg = np.diff(self.in_indptr)
+
+            labels = np.pad(self.labels, (0, n - len(self.labels)), constant_values=UNLABELED)
+            labeled = (labels != UNLABELED).astype(np.float64)
+            illicit = (labels == ILLICIT).astype(np.float64)
+            n_labeled, n_illicit = in_adj @ labeled, in_adj @ illicit
+
+            return np.hstack([
+                in_deg[:, None],
+                (in_adj @ X) / np.maximum(in_deg, 1)[:, None],
+                _row_max(self.in_indptr, self.in_indices, X),
+                (n_illicit / np.maximum(n_labeled, 1))[:, None]
+            ]).astype(np.float32)
+
+    # --- Serving: lookups and incremental updates ---
+    def _row_neighbors(self, row, indptr, indices, pending):
+        old = indices[indptr[row]:indptr[row + 1]] if row < len(indptr) - 1 else ()
+        new = pending.get(row)
+        if new:
+            return np.unique(np.concatenate([old, new]).astype(np.int64))
+        return np.asarray(old, dtype=np.int64)
+
+    def _feature_rows(self, rows):
+        """Feature rows of `rows`, gathering pending nodes from _new_features (O(len(rows)))."""
+        base = len(self.features)
+        old = rows < base
+        if old.all():
+            return self.features[rows]
+        out = np.empty((len(rows), len(self.columns)), dtype=np.float32)
+        out[old] = self.features[rows[old]]
+        out[~old] = [self._new_features[r - base] for r in rows[~old].tolist()]
+        return out
+
+    def _lookup(self, row):
+        in_rows = self._row_neighbors(row, self.in_indptr, self.in_indices, self._pending_in)
+        values = [float(len(in_rows))]
+        if len(in_rows):
+            X = self._feature_rows(in_rows).astype(np.float64)
+            values += X.mean(axis=0).tolist() + X.max(axis=0).tolist()
+        else:
+            values += [0.0] * (2 * len(self.columns))
+
+        labels = self.labels[in_rows[in_rows < len(self.labels)]]
+        n_labeled = int((labels != UNLABELED).sum())
+        values.append(float((labels == ILLICIT).sum()) / n_labeled if n_labeled else 0.0)
+        return dict(zip(self.names, values))
+
+    def lookup(self, tx_id):
+        """Neighbor features of one node, or None if the graph does not know it."""
+        with self._lock:
+            row = self._row(tx_id)
+            return None if row is None else self._lookup(row)
+
+    def neighbors(self, tx_id):
+        """(in-neighbor ids, out-neighbor ids) of one node."""
+        with self._lock:
+            row = self._row(tx_id)
+            if row is None:
+                raise KeyError(tx_id)
+            return ([self.ids[r] for r in self._row_neighbors(row, self.in_indptr, self.in_indices, self._pending_in)],
+                    [self.ids[r] for r in self._row_neighbors(row, self.out_indptr, self.out_indices, self._pending_out)])
+
+    def add_transaction(self, tx_id, features, parents=()):
+        """
+        Add a scored transaction (features: dict with the aggregated columns)
+        with edges parent -> tx_id from already known parents, and return its
+        neighbor features. A known tx_id (a retry) keeps its features and
+        only gets edges it does not have yet.
+        """
+        tx_id = str(tx_id)
+        with self._lock:
+            row = self._row(tx_id)
+            linked = set()
+            if row is None:
+                row = len(self.ids)
+                self.ids.append(tx_id)
+                self.index[tx_id] = row + self.evicted
+                self._new_features.append([features.get(c, 0.0) for c in self.columns])
+            elif parents:
+                linked = set(self._row_neighbors(row, self.in_indptr, self.in_indices, self._pending_in).tolist())
+            for parent in parents or ():
+                p = self._row(parent)
+                if p is None or p == row or p in linked:
+                    continue
+                linked.add(p)
+                self._link(p, row)
+            neighbor_features = self._lookup(row)
+            due = self._pending() >= self.compact_every
+        if due:
+            if self.running:
+                self._compact_due.set()
+            else:
+                self.compact()
+        return neighbor_features
+
+    def _link(self, parent, child):
+        self._new_edges.append((parent, child))
+        self._pending_out.setdefault(parent, []).append(child)
+        self._pending_in.setdefault(child, []).append(parent)
+
+    def _pending(self):
+        return len(self._new_features) + len(self._new_edges)
+
+    # --- Compaction ---
+    def compact(self):
+        """
+        Fold pending nodes and edges into the CSR arrays, evicting the oldest
+        serving-time nodes beyond max_nodes. Lookups and additions go on
+        while the arrays are built; what is added meanwhile stays pending.
+        """
+        with self._compact_lock:
+            with self._lock:
+                snapshot = self._snapshot()
+            if snapshot is None:
+                return
+            t0 = time.perf_counter()
+            built = self._fold(*snapshot)
+            with self._lock:
+                self._install(snapshot, built)
+                self.last_compaction_ms = (time.perf_counter() - t0) * 1000.0
+
+    def _snapshot(self):
+        if not self._pending():
+            return None
+        return (self.features, self.out_indptr, self.out_indices,
+                list(self._new_features), list(self._new_edges))
+
+    def _evict_map(self, rows, k):
+        """Rows after evicting rows n_base..n_base+k-1: those become -1, later rows move down by k."""
+        rows = np.asarray(rows, dtype=np.int64)
+        return np.where(rows < self.n_base, rows, np.where(rows < self.n_base + k, -1, rows - k))
+
+    def _fold(self, features, indptr, indices, new_features, new_edges):
+        """(features, out CSR, in CSR, nodes evicted) for the snapshot; touches no shared state."""
+        if new_features:
+            features = np.vstack([features, np.asarray(new_features, dtype=np.float32)])
+        n = len(features)
+        src, dst = np.repeat(np.arange(len(indptr) - 1), np.diff(indptr)), indices
+        if new_edges:
+            edges = np.asarray(new_edges, dtype=np.int64)
+            src, dst = np.concatenate([src, edges[:, 0]]), np.concatenate([dst, edges[:, 1]])
+
+        k = min(max(n - self.max_nodes, 0), n - self.n_base) if self.max_nodes else 0
+        if k:
+            features = np.delete(features, np.s_[self.n_base:self.n_base + k], axis=0)
+            src, dst = self._evict_map(src, k), self._evict_map(dst, k)
+            kept = (src >= 0) & (dst >= 0)
+            src, dst, n = src[kept], dst[kept], n - k
+        return features, _csr(n, src, dst), _csr(n, dst, src), k
+
+    def _install(self, snapshot, built):
+        """Swap in what _fold built from `snapshot`; nodes and edges added since stay pending."""
+        new_features, new_edges = snapshot[3], snapshot[4]
+        features, (out_indptr, out_indices), (in_indptr, in_indices), k = built
+        tail = self._new_edges[len(new_edges):]
+        if k:
+            for tx_id in self.ids[self.n_base:self.n_base + k]:
+                del self.index[tx_id]
+            del self.ids[self.n_base:self.n_base + k]
+            self.evicted += k
+            tail = [(p, c) for p, c in self._evict_map(tail, k).tolist() if p >= 0 and c >= 0] if tail else []
+
+        self.features = features
+        self.out_indptr, self.out_indices = out_indptr, out_indices
+        self.in_indptr, self.in_indices = in_indptr, in_indices
+        self._new_features = self._new_features[len(new_features):]
+        self._new_edges, self._pending_out, self._pending_in = [], {}, {}
+        for parent, child in tail:
+            self._link(parent, child)
+        self.compactions += 1
+
+    # --- Background compaction ---
+    @property
+    def running(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self):
+        """Compact on a background thread instead of in the add_transaction call that fills the lists."""
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="graph-compactor", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._compact_due.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def _run(self):
+        while True:
+            self._compact_due.wait()
+            self._compact_due.clear()
+            if self._stop.is_set():
+                return
+            if self._pending() < self.compact_every:
+                continue        # woken by additions made while the last compaction ran
+            try:
+                self.compact()
+            except Exception as e:
+                print(f"❌ Graph compaction failed: {e}")
+
+    # --- Persistence ---
+    def save(self, path):
+        """Compact and write the graph to an .npz, atomically; evicted nodes are not in it."""
+        with self._compact_lock, self._lock:
+            snapshot = self._snapshot()
+            if snapshot is not None:
+                self._install(snapshot, self._fold(*snapshot))
+            arrays = dict(
+                ids=np.asarray(self.ids), columns=np.asarray(self.columns),
+                out_indptr=self.out_indptr, out_indices=self.out_indices,
+                features=self.features, labels=self.labels,
+                n_base=self.n_base, source=self.source
+            )
+        tmp = path + ".tmp.npz"
+        np.savez_compressed(tmp, **arrays)
+        os.replace(tmp, path)
+        return len(arrays["ids"])
+
+    @classmethod
+    def load(cls, path, compact_every=10000, max_nodes=0):
+        with np.load(path) as data:
+            indptr, indices = data["out_indptr"], data["out_indices"]
+            src = np.repeat(np.arange(len(indptr) - 1), np.diff(indptr))
+            # Graphs saved before snapshots existed: every node is a base node
+            n_base = int(data["n_base"]) if "n_base" in data else None
+            source = str(data["source"]) if "source" in data else ""
+            return cls(data["ids"], src, indices, data["features"], data["columns"].tolist(),
+                       data["labels"], compact_every, max_nodes, n_base, source)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "nodes": len(self.ids),
+                "base_nodes": self.n_base,
+                "max_nodes": self.max_nodes,
+                "edges": int(len(self.out_indices)) + len(self._new_edges),
+                "pending_nodes": len(self._new_features),
+                "pending_edges": len(self._new_edges),
+                "evicted": self.evicted,
+                "compactions": self.compactions,
+                "last_compaction_ms": self.last_compaction_ms,
+                "background_compaction": self.running,
+                "columns": self.columns
+            }
@@ -0,0 +1,173 @@
+"""
+In-process per-user velocity state for streaming features.
+
+Each tracked user owns one row of three preallocated (max_users, window)
+arrays, stored flat: a ring buffer indexed by time_step % window holding
+the step a slot belongs to, its transaction count and its amount sum. Recording a
+transaction and reading the window back touch only that row, so the cost
+does not grow with the user's history or the number of users. Users are
+kept in least-recently-active order; when max_users are tracked, the most
+inactive one is evicted and its row reused, which caps memory at
+construction time.
+
+Transactions are recorded once per tx_id: the last `max_seen` tx_ids are
+remembered, and a retry or re-submission of one of them reads the window
+without adding to it again.
+"""
+import os
+import threading
+from array import array
+from collections import OrderedDict
+import numpy as np
+
+EMPTY = -2 ** 63
+# Rough per-user cost of the id -> row map on top of the arrays
+INDEX_BYTES_PER_USER = 120
+# Rough cost of one remembered tx_id
+SEEN_BYTES_PER_TX = 150
+
+class UserVelocityStore:
+    """
+    Sliding-window counters over the last `window` time_steps per user_id.
+
+    observe() records one transaction and returns the user's features
+    including it: user_tx_count and user_amount_sum over the window
+    (time_step - window, time_step], and user_step_count in time_step
+    itself. Transactions older than the window a slot already holds are
+    not recorded (their features still reflect what is in the window).
+    """
+
+    def __init__(self, window=5, max_users=100000, max_seen=100000):
+        self.window = window
+        self.max_users = max_users
+        self.max_seen = max_seen
+        # array.array: element access from Python is several times cheaper
+        # than NumPy scalar indexing, and the buffers map onto NumPy for snapshots
+        self._steps = array("q", [EMPTY]) * (max_users * window)
+        self._counts = array("q", [0]) * (max_users * window)
+        self._sums = array("d", [0.0]) * (max_users * window)
+        self.steps = np.frombuffer(self._steps, dtype=np.int64).reshape(max_users, window)
+        self.counts = np.frombuffer(self._counts, dtype=np.int64).reshape(max_users, window)
+        self.sums = np.frombuffer(self._sums, dtype=np.float64).reshape(max_users, window)
+
+        self._rows = OrderedDict()      # user_id -> row, least recently active first
+        self._next_row = 0
+        self._seen = OrderedDict()      # tx_ids already recorded, oldest first
+        self._lock = threading.Lock()
+        self.evictions = 0
+        self.repeats = 0
+
+    def _row_for(self, user_id):
+        row = self._rows.get(user_id)
+        if row is not None:
+            self._rows.move_to_end(user_id)
+            return row
+        if self._next_row < self.max_users:
+            row = self._next_row
+            self._next_row += 1
+        else:
+            _, row = self._rows.popitem(last=False)
+            self.evictions += 1
+            self.steps[row] = EMPTY
+            self.counts[row] = 0
+            self.sums[row] = 0.0
+        self._rows[user_id] = row
+        return row
+
+    def _first_time(self, tx_id):
+        if tx_id is None:
+            return True
+        if tx_id in self._seen:
+            self.repeats += 1
+            return False
+        self._seen[tx_id] = None
+        if len(self._seen) > self.max_seen:
+            self._seen.popitem(last=False)
+        return True
+
+    def observe(self, user_id, time_step, amount=0.0, tx_id=None):
+        """
+        Record one transaction (unless `tx_id` was already recorded); returns
+        {user_tx_count, user_amount_sum, user_step_count}.
+        """
+        steps, counts, sums = self._steps, self._counts, self._sums
+        with self._lock:
+            base = self._row_for(user_id) * self.window
+            slot = base + time_step % self.window
+
+            held = steps[slot]
+            if self._first_time(tx_id):
+                if held < time_step:
+                    steps[slot] = time_step
+                    counts[slot] = 0
+                    sums[slot] = 0.0
+                    held = time_step
+                if held == time_step:
+                    counts[slot] += 1
+                    sums[slot] += amount
+
+            lo, n, total = time_step - self.window, 0, 0.0
+            for i in range(base, base + self.window):
+                if lo < steps[i] <= time_step:
+                    n += counts[i]
+                    total += sums[i]
+            return {
+                "user_tx_count": float(n),
+                "user_amount_sum": total,
+                "user_step_count": float(counts[slot]) if held == time_step else 0.0
+            }
+
+    def __len__(self):
+        return len(self._rows)
+
+    def stats(self):
+        array_bytes = self.steps.nbytes + self.counts.nbytes + self.sums.nbytes
+        return {
+            "enabled": True,
+            "users": len(self),
+            "max_users": self.max_users,
+            "window": self.window,
+            "evictions": self.evictions,
+            "repeats": self.repeats,
+            "seen_tx_ids": len(self._seen),
+            "bytes": array_bytes + len(self) * INDEX_BYTES_PER_USER + len(self._seen) * SEEN_BYTES_PER_TX
+        }
+
+    # --- Snapshots ---
+    def save(self, path):
+        """Write tracked users (least recently active first) to an .npz, atomically."""
+        with self._lock:
+            users = np.fromiter(self._rows.keys(), dtype=np.int64, count=len(self._rows))
+            rows = np.fromiter(self._rows.values(), dtype=np.int64, count=len(self._rows))
+            steps, counts, sums = self.steps[rows], self.counts[rows], self.sums[rows]
+            seen = np.asarray(list(self._seen), dtype=str)
+
+        tmp = path + ".tmp.npz"
+        np.savez(tmp, window=self.window, users=users, steps=steps, counts=counts, sums=sums, seen=seen)
+        os.replace(tmp, path)
+        return len(users)
+
+    def load(self, path):
+        """Restore a snapshot written by save(); returns users restored (0 if absent or incompatible)."""
+        if not os.path.exists(path):
+            return 0
+        with np.load(path) as snap:
+            if int(snap["window"]) != self.window:
+                print(f"⚠️ User state snapshot {path} has window {int(snap['window'])}, "
+                      f"not {self.window}; starting empty.")
+                return 0
+            # Keep the most recently active users if the snapshot is larger than max_users
+            keep = slice(max(len(snap["users"]) - self.max_users, 0), None)
+            users, steps, counts, sums = (snap[k][keep] for k in ("users", "steps", "counts", "sums"))
+            seen = snap["seen"][-self.max_seen:].tolist() if "seen" in snap and self.max_seen else []
+
+        with self._lock:
+            n = len(users)
+            self.steps[:n], self.counts[:n], self.sums[:n] = steps, counts, sums
+            self.steps[n:self._next_row] = EMPTY
+            self.counts[n:self._next_row] = 0
+            self.sums[n:self._next_row] = 0.0
+            self._rows = OrderedDict(zip(users.tolist(), range(n)))
+            self._next_row = n
+            self._seen = OrderedDict.fromkeys(seen)
+        return n
@@ -0,0 +1,238 @@
+import base64
+import glob
+import json
+import os
+import queue
+import threading
+import time
+from metrics import Counter, Histogram
+
+FLUSH_MS_BUCKETS = (1, 2, 5, 10, 25, 50, 100, 250, 500, 1000, 5000)
+FLUSH_ROWS_BUCKETS = (1, 10, 50, 100, 250, 500, 1000, 5000)
+
+def _encode_value(value):
+    # json.dumps hook: packed features (bytea) are spooled as base64
+    if isinstance(value, (bytes, bytearray, memoryview)):
+        return {"$b64": base64.b64encode(bytes(value)).decode("ascii")}
+    raise TypeError(f"Cannot spool value of type {type(value).__name__}")
+
+def _decode_value(value):
+    if isinstance(value, dict) and "$b64" in value:
+        return base64.b64decode(value["$b64"])
+    return value
+
+class Spool:
+    """
+    Append-only local segment files (JSON lines) holding decision rows
+    that could not be written to the database. Segments roll over at
+    `segment_bytes`; replay() drains them oldest first.
+    """
+
+    def __init__(self, directory, segment_bytes=64 * 1024 * 1024):
+        self.directory = directory
+        self.segment_bytes = segment_bytes
+        os.makedirs(directory, exist_ok=True)
+        self._lock = threading.Lock()
+        self._file = None
+        self._seq = 0
+
+    def _segments(self):
+        return sorted(glob.glob(os.path.join(self.directory, "segment-*.jsonl")))
+
+    def _open_segment(self):
+        self._seq += 1
+        name = f"segment-{time.time_ns():020d}-{self._seq:06d}.jsonl"
+        self._file = open(os.path.join(self.directory, name), "a", encoding="utf-8")
+
+    def append(self, rows):
+        with self._lock:
+            if self._file is None or self._file.tell() >= self.segment_bytes:
+                self._roll()
+            for row in rows:
+                self._file.write(json.dumps(row, default=_encode_value) + "\n")
+            self._file.flush()
+            os.fsync(self._file.fileno())
+
+    def _roll(self):
+        if self._file is not None:
+            self._file.close()
+        self._open_segment()
+
+    def seal(self):
+        """
+        Close the active segment and return every segment written so far.
+        Both happen under the lock, so an append racing with this call goes
+        to a new segment that is not in the returned list.
+        """
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+            return self._segments()
+
+    def replay(self, insert_many, batch_size):
+        """
+        Insert the segments sealed at the start, in order; returns rows
+        replayed. Stops at the first DB error. Segments opened meanwhile
+        (queue overflow during the replay) are left for the next replay.
+        """
+        replayed = 0
+        for path in self.seal():
+            with open(path, encoding="utf-8") as f:
+                rows = [tuple(_decode_value(v) for v in json.loads(line)) for line in f if line.strip()]
+            for start in range(0, len(rows), batch_size):
+                insert_many(rows[start:start + batch_size])
+            os.remove(path)
+            replayed += len(rows)
+        return replayed
+
+    def stats(self):
+        segments = self._segments()
+        return {
+            "segments": len(segments),
+            "bytes": sum(os.path.getsize(p) for p in segments if os.path.exists(p))
+        }
+
+class WriteBehindWriter:
+    """
+    Decouples decisions from the database round trip.
+
+    submit() puts rows on a bounded in-memory queue; a background thread
+    flushes them through `insert_many` in multi-row batches once
+    `batch_size` rows are waiting or `flush_interval_ms` has passed. When
+    the insert fails (database slow to recover or down) the batch goes to
+    the local Spool instead, the database is retried every
+    `retry_interval_s`, and on success the spool is replayed in bulk.
+    A full queue also spills to the spool, so submit() never blocks.
+
+    Rows must be safe to insert twice (the transactions table dedupes on
+    (tx_id, request_hash)); a crash mid-replay re-sends the segment.
+    """
+
+    def __init__(self, insert_many, spool_dir, max_queue=10000, batch_size=500,
+                 flush_interval_ms=50, retry_interval_s=5.0, segment_bytes=64 * 1024 * 1024):
+        self.insert_many = insert_many
+        self.spool = Spool(spool_dir, segment_bytes)
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval_ms / 1000.0
+        self.retry_interval = retry_interval_s
+
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._stop = threading.Event()
+        self._thread = None
+        self._db_down_since = None
+        self._last_attempt = 0.0
+        self._last_error = None
+
+        self.flush_ms = Histogram(FLUSH_MS_BUCKETS)
+        self.flush_rows = Histogram(FLUSH_ROWS_BUCKETS)
+        self.rows_written = Counter()
+        self.rows_spooled = Counter()
+        self.rows_replayed = Counter()
+        self.queue_overflows = Counter()
+
+    @property
+    def queue_depth(self):
+        return self._queue.qsize()
+
+    @property
+    def running(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self):
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="write-behind", daemon=True)
+        self._thread.start()
+        # Rows spooled by a previous process are replayed on the first healthy flush
+        if self.spool.stats()["segments"]:
+            self._db_down_since = time.monotonic()
+        print("Write-behind persistence started.")
+
+    def stop(self):
+        """Flush everything still queued (to the DB or the spool) and stop."""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        self.spool.seal()
+
+    def submit(self, row):
+        try:
+            self._queue.put_nowait(row)
+        except queue.Full:
+            self.queue_overflows.inc()
+            self.spool.append([row])
+            self.rows_spooled.inc()
+
+    def _drain(self, deadline):
+        rows = []
+        while len(rows) < self.batch_size:
+            timeout = deadline - time.monotonic()
+            try:
+                rows.append(self._queue.get(timeout=max(timeout, 0)) if timeout > 0
+                            else self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return rows
+
+    def _run(self):
+        while not self._stop.is_set() or not self._queue.empty():
+            rows = self._drain(time.monotonic() + self.flush_interval)
+            if rows:
+                self._flush(rows)
+            elif self._db_down_since is not None:
+                self._flush([])   # idle: still retry the DB so the spool drains
+
+    def _flush(self, rows):
+        now = time.monotonic()
+        if self._db_down_since is not None and now - self._last_attempt < self.retry_interval:
+            self._to_spool(rows)
+            return
+
+        self._last_attempt = now
+        t0 = time.perf_counter()
+        inserted = False
+        try:
+            if rows:
+                self.insert_many(rows)
+                inserted = True
+            if self._db_down_since is not None:
+                replayed = self.spool.replay(self.insert_many, self.batch_size)
+                self.rows_replayed.inc(replayed)
+                print(f"Write-behind: database back, replayed {replayed} spooled rows.")
+                self._db_down_since = None
+        except Exception as e:
+            if self._db_down_since is None:
+                print(f"⚠️ Write-behind: database unavailable, spooling locally ({e})")
+                self._db_down_since = now
+            self._last_error = str(e)
+            if not inserted:
+                self._to_spool(rows)
+                return
+
+        if rows:
+            self.flush_ms.observe((time.perf_counter() - t0) * 1000.0)
+            self.flush_rows.observe(len(rows))
+            self.rows_written.inc(len(rows))
+
+    def _to_spool(self, rows):
+        if rows:
+            self.spool.append(rows)
+            self.rows_spooled.inc(len(rows))
+
+    def stats(self):
+        return {
+            "enabled": True,
+            "running": self.running,
+            "queue_depth": self._queue.qsize(),
+            "queue_capacity": self._queue.maxsize,
+            "db_available": self._db_down_since is None,
+            "last_error": self._last_error,
+            "rows_written": self.rows_written.value,
+            "rows_spooled": self.rows_spooled.value,
+            "rows_replayed": self.rows_replayed.value,
+            "queue_overflows": self.queue_overflows.value,
+            "flush_ms": self.flush_ms.snapshot(),
+            "flush_rows": self.flush_rows.snapshot(),
+            "spool": self.spool.stats()
+        }
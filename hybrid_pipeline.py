@@ -4,123 +4,182 @@ import xgboost as xgb
 from sklearn.metrics import average_precision_score
 import time
 import os
-
-print("Hybrid pipeline started...")
+import sys
 
 # --- Configuration ---
 base_path = "elliptic_bitcoin_dataset/"
 file_features = os.path.join(base_path, "elliptic_txs_features.csv")
 file_classes = os.path.join(base_path, "elliptic_txs_classes.csv")
-
-# --- 0. Data Validation ---
-if not os.path.exists(file_features) or not os.path.exists(file_classes):
-    print(f"Error: Data files not found in directory '{base_path}'")
-    exit()
-
-# --- 1. Load and Preprocess Data ---
-print("Loading data...")
-col_names = ['txId', 'time_step'] + [f'feat_{i}' for i in range(165)]
-df_features = pd.read_csv(file_features, header=None, names=col_names)
-df_classes = pd.read_csv(file_classes)
-df_merged = df_features.merge(df_classes, on='txId', how='left')
-df_labeled = df_merged[df_merged['class'] != 'unknown'].copy()
-df_labeled['class'] = df_labeled['class'].map({'1': 1, '2': 0})
-print("Data loading and preprocessing complete.")
+file_edges = os.path.join(base_path, "elliptic_txs_edgelist.csv")
+# Parsed, typed copies of the CSVs above, keyed by their content hash (frame_cache.py)
+cache_dir = os.path.join(base_path, "cache")
 
 # --- 2. Phase 1: Rule Engine (Feature Generation) ---
-def rule_engine_feature_generation(df):
-    # Thresholds (Used for Training)
-    TH_HIGH_VALUE = 50000.0
-    TH_ZERO_FEE = 0.0
-    TH_EARLY_STEP = 5
-    TH_LOW_VALUE = 50.0
-    TH_AGGREGATE = 0.8
-    TH_VELOCITY = 10.0
-    TH_STRUCTURAL = 2.0
-
-    # R1: High-Value Outflow
-    df['R1_Fired'] = np.where(df['feat_3'] > TH_HIGH_VALUE, 1, 0)
-
-    # R2: Zero-Fee
-    df['R2_Fired'] = np.where(df['feat_4'] <= TH_ZERO_FEE, 1, 0)
-
-    # R3: Initial Activity
-    df['R3_Fired'] = np.where(df['time_step'] <= TH_EARLY_STEP, 1, 0)
+# Rule definitions are shared with the backend (backend/rules.yaml)
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "backend"))
+from rule_spec import load_rules
+from model_registry import ModelRegistry
+from tx_graph import TxGraph, LICIT, ILLICIT, UNLABELED
+from frame_cache import cached_frame, write_frame
+RULES = load_rules()
+REGISTRY_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "backend", "model_registry")
+
+def rule_engine_feature_generation(df, ruleset=None):
+    ruleset = ruleset or RULES
+    scores, masks = ruleset.evaluate(df)
+
+    # R1..R7_Fired (0/1) and the aggregate score meta-feature for training context
+    fired = ruleset.mask_to_columns(masks)
+    for bit, name in enumerate(ruleset.names):
+        df[f'{name}_Fired'] = fired[:, bit].astype(int)
+    df['Total_Rule_Score'] = scores
 
-    # R4: Low Value Structuring
-    df['R4_Fired'] = np.where((df['feat_3'] < TH_LOW_VALUE) & (df['R1_Fired'] == 0), 1, 0)
-
-    # R5: Neighbor Aggregation
-    df['R5_Fired'] = np.where(df['feat_100'] > TH_AGGREGATE, 1, 0)
-
-    # R6: High Velocity
-    df['R6_Fired'] = np.where(df['feat_10'] > TH_VELOCITY, 1, 0)
-
-    # R7: Structural Anomaly
-    df['R7_Fired'] = np.where(df['feat_15'] / (df['feat_20'] + 1e-6) > TH_STRUCTURAL, 1, 0)
-
-    # Create Aggregate Score Meta-Feature for training context
-    df['Total_Rule_Score'] = (df['R1_Fired'] * 15 + df['R2_Fired'] * 10 + 
-                              df['R3_Fired'] * 5 + df['R4_Fired'] * 10 + 
-                              df['R5_Fired'] * 15 + df['R6_Fired'] * 5 + 
-                              df['R7_Fired'] * 10)
+    return df
 
+# --- Data Ingestion (cached, frame_cache.py) ---
+FEATURE_COLUMNS = [f'feat_{i}' for i in range(165)]
+# Rule inputs stay float64: serving compares the request's float64 values
+# with the rules.yaml thresholds, so float32-rounded training values could
+# fire rules differently near a threshold
+RULE_INPUT_COLUMNS = [c for c in RULES.inputs if c in FEATURE_COLUMNS]
+
+def ingest_elliptic():
+    """
+    One parse of the features and classes CSVs into typed columns:
+    float32 features (float64 for RULE_INPUT_COLUMNS), int64 txId, int16
+    time_step and an int8 class (ILLICIT / LICIT / UNLABELED), in
+    features-file order.
+    """
+    col_names = ['txId', 'time_step'] + FEATURE_COLUMNS
+    dtypes = {name: np.float32 for name in FEATURE_COLUMNS}
+    dtypes.update({name: np.float64 for name in RULE_INPUT_COLUMNS})
+    dtypes.update(txId=np.int64, time_step=np.int16)
+    df = pd.read_csv(file_features, header=None, names=col_names, dtype=dtypes)
+    classes = pd.read_csv(file_classes, dtype={'txId': np.int64, 'class': str})
+    labels = classes['class'].map({'1': ILLICIT, '2': LICIT}).fillna(UNLABELED)
+    df['class'] = df['txId'].map(pd.Series(labels.to_numpy(), index=classes['txId'])).fillna(UNLABELED).astype(np.int8)
     return df
 
-print("Generating meta-features...")
-df_augmented = rule_engine_feature_generation(df_labeled)
-
-# --- 3. Creating Train/Test Splits ---
-split_time_step = 34
-train_indices = df_augmented[df_augmented['time_step'] <= split_time_step].index
-test_indices = df_augmented[df_augmented['time_step'] > split_time_step].index
-
-y_train = df_augmented['class'].loc[train_indices]
-y_test = df_augmented['class'].loc[test_indices]
-
-# Hybrid Data (Includes Rules + Anon Features)
-X_augmented = df_augmented.drop(columns=['txId', 'time_step', 'class'])
-X_train_hybrid = X_augmented.loc[train_indices]
-X_test_hybrid = X_augmented.loc[test_indices]
-
-scale_pos_weight = (y_train == 0).sum() / (y_train == 1).sum()
-
-# --- 4. Training Hybrid Model ---
-print(f"\nTraining Hybrid XGBoost Model (Scale Weight: {scale_pos_weight:.2f})...")
-model = xgb.XGBClassifier(
-    objective='binary:logistic',
-    eval_metric='aucpr',
-    scale_pos_weight=scale_pos_weight,
-    n_estimators=200,
-    learning_rate=0.1,
-    max_depth=5,
-    use_label_encoder=False,
-    tree_method='hist'
-)
-
-model.fit(X_train_hybrid, y_train, eval_set=[(X_test_hybrid, y_test)], verbose=False)
-model.save_model("elliptic_xgb_hybrid_model.json")
-print("Model saved.")
-
-# --- 5. PREPARE DATA FOR REAL-TIME APP (CRITICAL FIX) ---
-print("\nGenerating Simulation Data for Streamlit App...")
-
-# Get the "Base Confidence" from the ML model
-y_probs = model.predict_proba(X_test_hybrid)[:, 1]
-
-# Identify specific feature columns needed for the app sliders
-# These correspond to the features used in rule_engine_feature_generation
-required_features = ['feat_3', 'feat_4', 'time_step', 'feat_100', 'feat_10', 'feat_15', 'feat_20']
-
-# Select ONLY the test set rows
-df_test_data = df_augmented.loc[test_indices].copy()
-
-# Create the lightweight dataframe
-# We save the RAW features so the App can recalculate rules dynamically
-simulation_data = df_test_data[required_features].copy()
-simulation_data['Hybrid_Confidence'] = y_probs
-simulation_data['True_Label'] = y_test.values
-
-# Save to CSV
-simulation_data.to_csv("simulation_data.csv", index=False)
-print("Success! 'simulation_data.csv' saved with RAW features (feat_3, etc.) for the dashboard.")
\ No newline at end of file
+def load_elliptic():
+    return cached_frame([file_features, file_classes], ingest_elliptic, cache_dir,
+                        version="float64:" + ",".join(RULE_INPUT_COLUMNS))
+
+def load_edges():
+    return cached_frame([file_edges], lambda: pd.read_csv(file_edges, dtype=np.int64), cache_dir)
+
+# --- 2b. Graph Neighbor Features (elliptic_txs_edgelist.csv) ---
+# Parent (in-neighbor) mean/max of the rule inputs, in-degree and the illicit share
+# of training-labeled parents (tx_graph.py)
+GRAPH_COLUMNS = ['feat_3', 'feat_4', 'feat_10', 'feat_15', 'feat_20', 'feat_100']
+
+def graph_feature_generation(df, edges, split_time_step):
+    """
+    Adds the nbr_* columns for every transaction in `df` (labeled or not,
+    so neighbors are complete). Labels after split_time_step are hidden
+    from the illicit ratio. Returns (df, graph).
+    """
+    labels = np.where(df['time_step'].to_numpy() > split_time_step, UNLABELED, df['class'].to_numpy())
+    graph = TxGraph.from_edgelist(
+        edges, df['txId'].to_numpy(), df[GRAPH_COLUMNS].to_numpy(), GRAPH_COLUMNS, labels
+    )
+    neighbor_df = pd.DataFrame(graph.neighbor_features(), columns=graph.names, index=df.index)
+    return pd.concat([df, neighbor_df], axis=1), graph
+
+def main():
+    print("Hybrid pipeline started...")
+
+    # --- 0. Data Validation ---
+    if not os.path.exists(file_features) or not os.path.exists(file_classes):
+        print(f"Error: Data files not found in directory '{base_path}'")
+        exit()
+
+    # --- 1. Load and Preprocess Data ---
+    # Memory-mapped columns from the cache; only rows that are selected
+    # below are copied
+    print("Loading data...")
+    t0 = time.time()
+    df_merged = load_elliptic()
+    print(f"Loaded {len(df_merged)} transactions in {time.time() - t0:.2f}s.")
+    split_time_step = 34
+
+    if os.path.exists(file_edges):
+        print("Building transaction graph...")
+        df_merged, graph = graph_feature_generation(df_merged, load_edges(), split_time_step)
+        graph.save("elliptic_tx_graph.npz")
+        print(f"Graph: {graph.stats()['nodes']} nodes, {graph.stats()['edges']} edges; "
+              "saved to 'elliptic_tx_graph.npz' (GRAPH_PATH for the backend).")
+    else:
+        print(f"Warning: '{file_edges}' not found; training without graph neighbor features.")
+
+    # class is already 1 (illicit) / 0 (licit); take() copies the labeled rows once
+    df_labeled = df_merged.take(np.flatnonzero(df_merged['class'].to_numpy() != UNLABELED))
+    print("Data loading and preprocessing complete.")
+
+    print("Generating meta-features...")
+    df_augmented = rule_engine_feature_generation(df_labeled)
+
+    # --- 3. Creating Train/Test Splits ---
+    train_mask = (df_augmented['time_step'] <= split_time_step).to_numpy()
+    test_mask = ~train_mask
+
+    y_train = df_augmented['class'][train_mask]
+    y_test = df_augmented['class'][test_mask]
+
+    # Hybrid Data (Includes Rules + Anon Features), one copy per split
+    feature_columns = [c for c in df_augmented.columns if c not in ('txId', 'time_step', 'class')]
+    X_train_hybrid = df_augmented.loc[train_mask, feature_columns]
+    X_test_hybrid = df_augmented.loc[test_mask, feature_columns]
+
+    scale_pos_weight = (y_train == 0).sum() / (y_train == 1).sum()
+
+    # --- 4. Training Hybrid Model ---
+    print(f"\nTraining Hybrid XGBoost Model (Scale Weight: {scale_pos_weight:.2f})...")
+    model = xgb.XGBClassifier(
+        objective='binary:logistic',
+        eval_metric='aucpr',
+        scale_pos_weight=scale_pos_weight,
+        n_estimators=200,
+        learning_rate=0.1,
+        max_depth=5,
+        use_label_encoder=False,
+        tree_method='hist'
+    )
+
+    model.fit(X_train_hybrid, y_train, eval_set=[(X_test_hybrid, y_test)], verbose=False)
+    model.save_model("elliptic_xgb_hybrid_model.json")
+    print("Model saved.")
+
+    # --- 5. PREPARE DATA FOR REAL-TIME APP (CRITICAL FIX) ---
+    print("\nGenerating Simulation Data for Streamlit App...")
+
+    # Get the "Base Confidence" from the ML model
+    y_probs = model.predict_proba(X_test_hybrid)[:, 1]
+
+    # Identify specific feature columns needed for the app sliders
+    # These correspond to the features used in rule_engine_feature_generation
+    required_features = ['feat_3', 'feat_4', 'time_step', 'feat_100', 'feat_10', 'feat_15', 'feat_20']
+
+    # Create the lightweight dataframe from ONLY the test set rows
+    # We save the RAW features so the App can recalculate rules dynamically
+    simulation_data = df_augmented.loc[test_mask, required_features].assign(
+        Hybrid_Confidence=y_probs.astype(np.float32),
+        True_Label=y_test.to_numpy()
+    )
+
+    # Save to CSV (dashboard) and as memory-mapped columns (loadtest.py, tree_model.py)
+    simulation_data.to_csv("simulation_data.csv", index=False)
+    write_frame("simulation_data", simulation_data)
+    print("Success! 'simulation_data.csv' and 'simulation_data/' saved with RAW features (feat_3, etc.) for the dashboard.")
+
+    # --- 6. Register the model version for the backend ---
+    meta = ModelRegistry(REGISTRY_DIR).register(
+        "elliptic_xgb_hybrid_model.json",
+        train_split=split_time_step,
+        metrics={"test_auprc": float(average_precision_score(y_test, y_probs))},
+        notes=f"rules {RULES.version}",
+        feature_names=list(X_train_hybrid.columns)
+    )
+    print(f"Serve it with: POST /admin/model/swap {{\"version\": \"{meta['version']}\"}}")
+
+if __name__ == "__main__":
+    main()
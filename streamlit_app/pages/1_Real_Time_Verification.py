@@ -166,7 +166,12 @@ if st.button("🔍 ANALYZE TRANSACTION", use_container_width=True):
             
             # Metrics
             m1, m2, m3 = st.columns(3)
-            m1.metric("ML Probability", f"{result.get('ml_probability', 0):.2%}")
+            ml_prob = result.get('ml_probability')
+            if ml_prob is None:
+                # Cascade mode: the rule tier decided without running the model
+                m1.metric("ML Probability", "Skipped", help=f"Decided by: {result.get('decided_by', 'rules')}")
+            else:
+                m1.metric("ML Probability", f"{ml_prob:.2%}")
             m2.metric("Rule Score", f"{result.get('rule_score', 0):.1f}")
             m3.metric("Status", result.get('status', 'UNKNOWN'))
             
@@ -4,9 +4,14 @@ import numpy as np
 import plotly.express as px
 import plotly.graph_objects as go
 import os
+import sys
 from sklearn.metrics import confusion_matrix, f1_score, recall_score, precision_score
 from components.theme_toggle import render_theme_toggle, render_animated_background
 
+# Rule definitions are shared with the backend (backend/rules.yaml)
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "backend"))
+from rule_spec import load_rules
+
 st.set_page_config(
     page_title="Risk Appetite Tuner | Fraud Detection",
     layout="wide",
@@ -80,6 +85,9 @@ df = load_data()
 if df.empty:
     st.stop()
 
+RULES = load_rules()
+weights = dict(zip(RULES.names, RULES.weights.tolist()))
+
 # -------------------------------------------------------------------
 # TUNING SIDEBAR
 # -------------------------------------------------------------------
@@ -92,46 +100,42 @@ with st.sidebar:
     
     st.markdown("---")
     st.subheader("Rule Definitions")
-    th_high_val = st.number_input("R1: High Value (> $)", value=50000)
-    th_agg = st.slider("R5: Aggregation >", 0.0, 5.0, 0.8)
-    th_vel = st.slider("R6: Velocity >", 0.0, 50.0, 10.0)
+    th_high_val = st.number_input("R1: High Value (> $)", value=RULES.thresholds["R1"])
+    th_agg = st.slider("R5: Aggregation >", 0.0, 5.0, float(RULES.thresholds["R5"]))
+    th_vel = st.slider("R6: Velocity >", 0.0, 50.0, float(RULES.thresholds["R6"]))
     
     st.markdown("---")
     st.subheader("Weights")
-    w_r1 = st.slider("W1 (High Value)", 0, 20, 15)
-    w_r2 = st.slider("W2 (Zero Fee)", 0, 20, 10)
-    w_r5 = st.slider("W5 (Aggregation)", 0, 20, 15)
-    w_r6 = st.slider("W6 (Velocity)", 0, 20, 5)
+    w_r1 = st.slider("W1 (High Value)", 0, 20, weights["R1"])
+    w_r2 = st.slider("W2 (Zero Fee)", 0, 20, weights["R2"])
+    w_r5 = st.slider("W5 (Aggregation)", 0, 20, weights["R5"])
+    w_r6 = st.slider("W6 (Velocity)", 0, 20, weights["R6"])
     
-    # Constants for untuned rules
-    w_r3, w_r4, w_r7 = 5, 10, 10
+    # Untuned rules keep their rules.yaml thresholds and weights
 
 # -------------------------------------------------------------------
 # LOGIC ENGINE
 # -------------------------------------------------------------------
-def apply_logic(row):
-    # Re-calculate rules based on new sliders
-    r1 = 1 if row['feat_3'] > th_high_val else 0
-    r2 = 1 if row['feat_4'] <= 0.0 else 0
-    r5 = 1 if row['feat_100'] > th_agg else 0
-    r6 = 1 if row['feat_10'] > th_vel else 0
-    
-    # Keep others static for demo simplicity (or add sliders for them too)
-    r3 = 1 if row['time_step'] <= 5 else 0
-    r4 = 1 if (row['feat_3'] < 50 and r1 == 0) else 0
-    r7 = 1 if (row['feat_15'] / (row['feat_20'] + 1e-6)) > 2.0 else 0
-    
-    score = (r1*w_r1) + (r2*w_r2) + (r3*w_r3) + (r4*w_r4) + (r5*w_r5) + (r6*w_r6) + (r7*w_r7)
+def apply_logic(df):
+    # Re-calculate rules based on new sliders, with the backend's compiled rules
+    tuned = RULES.with_overrides(
+        thresholds={"R1": th_high_val, "R5": th_agg, "R6": th_vel},
+        weights={"R1": w_r1, "R2": w_r2, "R5": w_r5, "R6": w_r6}
+    )
+    score, masks = tuned.evaluate(df)
+    fired = tuned.mask_to_columns(masks).astype(int)
     
     # Hybrid Decision
-    ml_fraud = row['Hybrid_Confidence'] >= th_ml
+    ml_fraud = df['Hybrid_Confidence'] >= th_ml
     rule_fraud = score >= th_rules
     
-    return pd.Series([score, int(ml_fraud or rule_fraud), r1, r2, r3, r4, r5, r6, r7])
+    results = pd.DataFrame(fired, columns=[f'{name}_Fired' for name in tuned.names], index=df.index)
+    results.insert(0, 'Score', score)
+    results.insert(1, 'Pred_Label', (ml_fraud | rule_fraud).astype(int))
+    return results
 
-# Apply to sample
-results = df.apply(apply_logic, axis=1)
-results.columns = ['Score', 'Pred_Label', 'R1_Fired', 'R2_Fired', 'R3_Fired', 'R4_Fired', 'R5_Fired', 'R6_Fired', 'R7_Fired']
+# Apply to sample (vectorized over all rows)
+results = apply_logic(df)
 df_final = pd.concat([df, results], axis=1)
 
 # -------------------------------------------------------------------
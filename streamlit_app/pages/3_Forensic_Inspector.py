@@ -3,9 +3,14 @@ import pandas as pd
 import numpy as np
 import plotly.graph_objects as go
 import os
+import sys
 
 from components.theme_toggle import render_theme_toggle, render_animated_background
 
+# Rule definitions are shared with the backend (backend/rules.yaml)
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "backend"))
+from rule_spec import load_rules
+
 st.set_page_config(
     page_title="Forensic Inspector | Fraud Detection",
     layout="wide",
@@ -87,14 +92,10 @@ row = filtered_df.loc[case_id]
 # ---------------------------
 # ANALYSIS VIEW
 # ---------------------------
-# Simulate Rule Firing (Hardcoded logic for viz, ideally matches backend)
-w_r1, w_r2, w_r3, w_r4, w_r5, w_r6, w_r7 = 15, 10, 5, 10, 15, 5, 10
-
-# Calculate firings locally for inspection
-r1 = 1 if row['feat_3'] > 50000 else 0
-r2 = 1 if row['feat_4'] <= 0 else 0
-r5 = 1 if row['feat_100'] > 0.8 else 0
-# ... (simplified for viz)
+# Rule firing for this case, with the same compiled rules as the backend
+RULES = load_rules()
+score, rule_mask = RULES.evaluate_row(row, row['time_step'])
+fired = RULES.mask_to_fired(rule_mask)
 
 with col_info:
     col1, col2 = st.columns([1, 2])
@@ -103,9 +104,7 @@ with col_info:
         st.markdown("<div class='panel'>", unsafe_allow_html=True)
         st.subheader("Overview")
         
-        score = (r1*w_r1 + r2*w_r2 + r5*w_r5) # Partial sum for demo
-        
-        st.metric("Rule Score (Est)", f"{score}")
+        st.metric("Rule Score", f"{score}")
         st.metric("ML Probability", f"{row['Hybrid_Confidence']:.1%}")
         st.markdown(f"**Actual:** {'🔴 Illicit' if row['True_Label']==1 else '🟢 Licit'}")
         st.markdown("</div>", unsafe_allow_html=True)
@@ -114,11 +113,10 @@ with col_info:
         st.markdown("<div class='panel'>", unsafe_allow_html=True)
         st.subheader("Rule Contribution")
         
-        # Mock data for the graph
         contrib_data = {
-            'Rule': ["High Val (R1)", "Zero Fee (R2)", "Agg (R5)"],
-            'Contribution': [r1*w_r1, r2*w_r2, r5*w_r5],
-            'Fired': [r1, r2, r5]
+            'Rule': [f"{label} ({name})" for name, label in zip(RULES.names, RULES.labels)],
+            'Contribution': [fired[name] * int(w) for name, w in zip(RULES.names, RULES.weights)],
+            'Fired': [fired[name] for name in RULES.names]
         }
         
         colors = ['#FF6B6B' if x == 1 else '#7A8191' for x in contrib_data['Fired']]